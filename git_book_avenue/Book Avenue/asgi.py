@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'books_avenue.settings')
+# Use the async versions of the read-heavy views (see ASYNC_VIEWS in settings)
+os.environ.setdefault('BOOK_AVENUE_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
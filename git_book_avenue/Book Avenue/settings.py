@@ -43,6 +43,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Per-view latency / SQL / template metrics, served at /metrics/
+    'store.middleware.PerformanceMiddleware',
+    # Read-replica routing and read-your-writes pinning (store/replicas.py)
+    'store.middleware.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -64,6 +68,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'store.context_processors.cart_badge',
             ],
         },
     },
@@ -75,13 +80,59 @@ WSGI_APPLICATION = 'books_avenue.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Run on every new SQLite connection. WAL lets pages keep reading while an
+# order is written; synchronous=NORMAL is still crash-safe in WAL mode and
+# skips an fsync per commit; the rest keeps more of the file in memory.
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL;'
+    'PRAGMA synchronous=NORMAL;'
+    'PRAGMA cache_size=-20000;'  # KiB, per connection
+    'PRAGMA temp_store=MEMORY;'
+    'PRAGMA mmap_size=134217728;'
+)
+
+# Keep connections open between requests (checked before reuse). Django
+# advises against persistent connections under ASGI, so asgi.py gets 0.
+DB_CONN_MAX_AGE = 0 if os.environ.get('BOOK_AVENUE_ASYNC_VIEWS', '') == '1' else 600
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': SQLITE_PRAGMAS,
+            # Take the write lock at BEGIN, so concurrent checkouts wait
+            # for each other instead of failing with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas: SQLite files separated by os.pathsep, e.g.
+#   BOOK_AVENUE_DB_REPLICAS=/srv/replica1.sqlite3:/srv/replica2.sqlite3
+# Views marked @read_from_replica (store/replicas.py) read from one of them;
+# "manage.py sync_replicas" copies the primary into them for local testing.
+DATABASE_REPLICAS = []
+for _number, _path in enumerate(filter(None, os.environ.get('BOOK_AVENUE_DB_REPLICAS', '').split(os.pathsep)), 1):
+    DATABASES[f'replica{_number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': _path,
+        'OPTIONS': {'init_command': SQLITE_PRAGMAS + 'PRAGMA query_only=ON;', 'timeout': 20},
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        # Tests read the replicas' data from the test primary
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{_number}')
+
+DATABASE_ROUTERS = ['store.replicas.PrimaryReplicaRouter']
+
+# How long a browser reads from the primary after it wrote something
+DATABASE_REPLICA_PIN_SECONDS = 15
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,9 +178,42 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+# "manage.py build_assets" collects, minifies, hashes and precompresses
+# everything here; served with far-future cache headers (store/assets.py)
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'store.assets.AssetStorage'},
+}
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 LOGIN_REDIRECT_URL = 'home'
-LOGOUT_REDIRECT_URL = 'home'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'home'
+
+# Sessions (and with them anonymous carts) live in a signed cookie, so
+# browsing and filling a cart never writes to the database; logged-in carts
+# are stored in Cart/CartItem. 'django.contrib.sessions.backends.cache'
+# works too, given a cache shared by every worker.
+SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+
+# Full-text book search (store/search). Unset = pick a backend for the
+# database in use: FTS5 on SQLite, plain icontains matching elsewhere.
+# BOOK_SEARCH_BACKEND = 'store.search.backends.SQLiteFTS5Backend'
+
+# Resized cover images (store/images.py, needs Pillow). Threads used to
+# resize uploads in the background; 0 = resize inline after the upload.
+BOOK_IMAGE_WORKERS = 2
+
+# Publisher catalog uploads (store/catalog_import.py) are imported by this
+# many background threads; 0 = import inline after the upload.
+BOOK_IMPORT_WORKERS = 1
+
+# /metrics/ is open to staff, or to scrapers sending this as a bearer token
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Serve home, book_detail, cart_view and profile from store/async_views.py.
+# asgi.py switches this on; under WSGI the sync views are used.
+ASYNC_VIEWS = os.environ.get('BOOK_AVENUE_ASYNC_VIEWS', '') == '1'
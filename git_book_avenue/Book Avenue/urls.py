@@ -1,7 +1,10 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+
+from store.assets import serve_media, serve_static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -12,4 +15,8 @@ urlpatterns = [
     # 2. LOAD YOUR STORE URLS SECOND (So your custom logout takes priority)
     path('', include('store.urls')),
 
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # 3. STATIC FILES AND UPLOADS, with long-lived cache headers. Under
+    # runserver with DEBUG on, /static/ is served from the app folders instead.
+    re_path(r'^%s(?P<path>.+)$' % re.escape(settings.STATIC_URL.lstrip('/')), serve_static),
+    re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media),
+]
\ No newline at end of file
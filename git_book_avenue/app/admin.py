@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Book, Order, OrderItem, Review, UserProfile
+from .models import Category, Book, Cart, CartItem, ImportJob, Order, OrderItem, Review, UserProfile
 
 # 1. NEW: Publisher Approval System
 @admin.register(UserProfile)
@@ -35,4 +35,20 @@ class OrderAdmin(admin.ModelAdmin):
 # 5. Existing Review Admin
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
-    list_display = ['user', 'book', 'rating', 'created_at']
\ No newline at end of file
+    list_display = ['user', 'book', 'rating', 'created_at']
+
+# 6. Stored carts of logged-in users
+class CartItemInline(admin.TabularInline):
+    model = CartItem
+    raw_id_fields = ['book']
+
+@admin.register(Cart)
+class CartAdmin(admin.ModelAdmin):
+    list_display = ['user', 'created_at']
+    inlines = [CartItemInline]
+
+# 7. Background catalog imports
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'publisher', 'status', 'rows', 'created', 'updated', 'failed', 'created_at']
+    list_filter = ['status']
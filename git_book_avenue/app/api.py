@@ -0,0 +1,252 @@
+from functools import wraps
+
+from django.core.files.storage import default_storage
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_safe
+
+from . import read_model
+from .conditional import book_state, catalog_books_state, categories_state, conditional_page
+from .models import Book, Review
+from .pagination import InvalidCursor, KeysetPaginator, cursor_querystring
+from .replicas import read_from_replica
+from .search import search_books
+from .views import CATALOG_ORDERINGS
+
+# Read-only JSON over the catalog, for the mobile app and partners, so they
+# don't have to scrape the HTML pages. Everything lives under /api/v1/.
+API_PAGE_SIZE = 24
+API_MAX_PAGE_SIZE = 100
+# No spaces, and UTF-8 instead of \u escapes: smaller responses
+JSON_PARAMS = {'separators': (',', ':'), 'ensure_ascii': False}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# --- 1. FIELDS ---
+# Every field a client can ask for with ?fields=a,b,c: the columns it needs
+# (for only()), the relation to join (for select_related()) and how to get
+# its value. Columns nobody asked for are never loaded.
+
+def _image(book):
+    if not book.image:
+        return None
+    image = {'url': book.image.url}
+    variants = book.image_variants or {}
+    if variants.get('source') == book.image.name and variants.get('jpeg'):
+        # Resized copies from images.py, by width
+        for kind in ('jpeg', 'webp'):
+            image[kind] = {width: default_storage.url(name) for width, name in variants.get(kind, {}).items()}
+        image['width'], image['height'] = variants['width'], variants['height']
+    return image
+
+
+def _category(category):
+    return {'id': category.pk, 'slug': category.slug, 'name': category.name}
+
+
+BOOK_FIELDS = {
+    'id': ((), None, lambda book: book.pk),
+    'title': (('title',), None, lambda book: book.title),
+    'author': (('author',), None, lambda book: book.author),
+    'isbn': (('isbn',), None, lambda book: book.isbn),
+    'description': (('description',), None, lambda book: book.description),
+    'price': (('price',), None, lambda book: book.price),
+    'in_stock': (('stock',), None, lambda book: book.stock > 0),
+    'is_bestseller': (('is_bestseller',), None, lambda book: book.is_bestseller),
+    'rating': (('rating_avg', 'rating_count'), None,
+               lambda book: {'average': book.average_rating, 'count': book.rating_count}),
+    'category': (('category__slug', 'category__name'), 'category', lambda book: _category(book.category)),
+    'image': (('image', 'image_variants'), None, _image),
+    'created_at': (('created_at',), None, lambda book: book.created_at),
+    'updated_at': (('updated_at',), None, lambda book: book.updated_at),
+    'url': ((), None, lambda book: reverse('book_detail', args=[book.pk])),
+}
+# What list responses carry without ?fields; detail responses carry everything
+BOOK_LIST_FIELDS = ('id', 'title', 'author', 'price', 'rating', 'category', 'image', 'url')
+
+CATEGORY_FIELDS = {
+    'id': ((), None, lambda category: category.pk),
+    'slug': ((), None, lambda category: category.slug),
+    'name': ((), None, lambda category: category.name),
+    'updated_at': ((), None, lambda category: category.updated_at),
+    'books': ((), None, lambda category: reverse('api_book_list') + '?category=' + category.slug),
+}
+
+REVIEW_FIELDS = {
+    'id': ((), None, lambda review: review.pk),
+    'rating': (('rating',), None, lambda review: review.rating),
+    'comment': (('comment',), None, lambda review: review.comment),
+    'user': (('user__username',), 'user', lambda review: review.user.username),
+    'created_at': (('created_at',), None, lambda review: review.created_at),
+}
+
+
+def _requested_fields(request, spec, default=None):
+    fields = request.GET.get('fields')
+    if not fields:
+        return list(default or spec)
+    names = list(dict.fromkeys(name.strip() for name in fields.split(',') if name.strip()))
+    unknown = [name for name in names if name not in spec]
+    if unknown:
+        raise ApiError("Unknown field(s): %s. Available: %s" % (', '.join(unknown), ', '.join(spec)))
+    return names
+
+
+def _shape(queryset, spec, names, ordering=()):
+    # only() the requested columns plus the primary key and the sort key
+    # (the cursor is built from it), joining only the relations asked for
+    columns = {'id'} | {name.lstrip('-') for name in ordering}
+    related = set()
+    for name in names:
+        needed, relation, _ = spec[name]
+        columns.update(needed)
+        if relation:
+            related.add(relation)
+            columns.add(relation)
+    if related:
+        queryset = queryset.select_related(*sorted(related))
+    return queryset.only(*sorted(columns))
+
+
+def _serialize(objects, spec, names):
+    getters = [(name, spec[name][2]) for name in names]
+    return [{name: get(obj) for name, get in getters} for obj in objects]
+
+
+# --- 2. PAGING ---
+
+def _page_size(request):
+    try:
+        size = int(request.GET.get('limit') or API_PAGE_SIZE)
+    except ValueError:
+        raise ApiError("limit must be a number")
+    return max(1, min(size, API_MAX_PAGE_SIZE))
+
+
+def _keyset_page(request, queryset, ordering):
+    # (rows, next query string, previous query string)
+    paginator = KeysetPaginator(queryset, ordering=ordering, per_page=_page_size(request))
+    try:
+        page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        # Unlike the HTML pages, don't quietly start over: a client would loop
+        raise ApiError("Invalid cursor")
+    next_query = cursor_querystring(request, after=page.next_cursor) if page.has_next else None
+    previous_query = cursor_querystring(request, before=page.previous_cursor) if page.has_previous else None
+    return page.object_list, next_query, previous_query
+
+
+def _link(request, query):
+    return f'{request.path}?{query}' if query else None
+
+
+# --- 3. VIEWS ---
+
+def api_view(view):
+    """GET/HEAD only; errors come back as {"error": "..."} instead of HTML pages."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            payload = view(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'error': str(error)}, status=error.status, json_dumps_params=JSON_PARAMS)
+        except Http404 as error:
+            return JsonResponse({'error': str(error) or "Not found"}, status=404, json_dumps_params=JSON_PARAMS)
+        return JsonResponse(payload, encoder=DjangoJSONEncoder, json_dumps_params=JSON_PARAMS)
+    return require_safe(wrapper)
+
+
+@conditional_page(catalog_books_state, 'books', 'categories', 'reviews')
+@api_view
+@read_from_replica
+def book_list(request):
+    """
+    /api/v1/books/?category=<slug>&sort=newest|rating&q=<search>&fields=...&limit=...
+
+    Paged by cursor (follow "next" / "previous"), except search results,
+    which are ranked and paged by number like the HTML catalog.
+    """
+    names = _requested_fields(request, BOOK_FIELDS, BOOK_LIST_FIELDS)
+    query = (request.GET.get('q') or '').strip()
+    category = None
+    if request.GET.get('category'):
+        category = read_model.category_by_slug(request.GET['category'])
+        if category is None:
+            raise Http404("No such category")
+
+    if query:
+        books = _shape(Book.objects.all(), BOOK_FIELDS, names)
+        paginator = Paginator(search_books(query, category=category, queryset=books), _page_size(request))
+        try:
+            page = paginator.page(request.GET.get('page') or 1)
+        except (EmptyPage, PageNotAnInteger):
+            raise ApiError("Invalid page")
+        rows = page.object_list
+        next_query = cursor_querystring(request, page=page.next_page_number()) if page.has_next() else None
+        previous_query = cursor_querystring(request, page=page.previous_page_number()) if page.has_previous() else None
+    else:
+        ordering = CATALOG_ORDERINGS.get(request.GET.get('sort'), CATALOG_ORDERINGS['newest'])
+        books = Book.objects.filter(category=category) if category else Book.objects.all()
+        rows, next_query, previous_query = _keyset_page(
+            request, _shape(books, BOOK_FIELDS, names, ordering), ordering,
+        )
+
+    return {
+        'results': _serialize(rows, BOOK_FIELDS, names),
+        'next': _link(request, next_query),
+        'previous': _link(request, previous_query),
+    }
+
+
+@conditional_page(book_state, 'books', 'categories', 'reviews')
+@api_view
+@read_from_replica
+def book_detail(request, pk):
+    # From read_model, like the book page: usually no query at all
+    book = read_model.get_book(pk)
+    if book is None:
+        raise Http404("No such book")
+    return _serialize([book], BOOK_FIELDS, _requested_fields(request, BOOK_FIELDS))[0]
+
+
+@conditional_page(book_state, 'books', 'categories', 'reviews')
+@api_view
+@read_from_replica
+def review_list(request, pk):
+    """/api/v1/books/<id>/reviews/, newest first, paged by cursor."""
+    if read_model.get_book(pk) is None:
+        raise Http404("No such book")
+    names = _requested_fields(request, REVIEW_FIELDS)
+    ordering = ('-created_at', '-id')
+    reviews = _shape(Review.objects.filter(book_id=pk), REVIEW_FIELDS, names, ordering)
+    rows, next_query, previous_query = _keyset_page(request, reviews, ordering)
+    return {
+        'results': _serialize(rows, REVIEW_FIELDS, names),
+        'next': _link(request, next_query),
+        'previous': _link(request, previous_query),
+    }
+
+
+@conditional_page(categories_state, 'categories')
+@api_view
+def category_list(request):
+    # A handful of rows from read_model: no paging, no query
+    names = _requested_fields(request, CATEGORY_FIELDS)
+    categories = sorted(read_model.categories(), key=lambda category: category.name)
+    return {'results': _serialize(categories, CATEGORY_FIELDS, names)}
+
+
+@conditional_page(categories_state, 'categories')
+@api_view
+def category_detail(request, slug):
+    category = read_model.category_by_slug(slug)
+    if category is None:
+        raise Http404("No such category")
+    return _serialize([category], CATEGORY_FIELDS, _requested_fields(request, CATEGORY_FIELDS))[0]
@@ -0,0 +1,165 @@
+import gzip
+import posixpath
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.http import Http404
+from django.utils.cache import patch_vary_headers
+from django.views.static import serve
+
+# Only our own assets (static/css, static/js) are minified; files that apps
+# ship (admin/...) are copied as they are
+MINIFY_PREFIXES = ('css/', 'js/')
+# Text files that get .gz / .br siblings from build_assets
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.xml', '.html', '.map')
+# Compressing tiny files gains nothing once headers are counted
+MIN_COMPRESS_SIZE = 256
+
+# Hashed names never change content, so browsers can keep them for a year
+# without asking again. Names without a hash get a short max-age.
+IMMUTABLE = 'public, max-age=31536000, immutable'
+UNHASHED_MAX_AGE = 60 * 60
+_HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+# Image variants (images.variant_name) carry a hash of their bytes too;
+# storage may add "_<7 chars>" when the same file is saved twice
+_HASHED_VARIANT = re.compile(r'^variants/.+\.[0-9a-f]{12}(?:_[A-Za-z0-9]{7})?\.[^./]+$')
+
+
+# --- 1. MINIFYING ---
+# rcssmin / rjsmin are used when installed. The fallbacks only remove what
+# is always safe to remove: comments and whitespace in CSS, indentation,
+# blank lines and whole-line comments in JS.
+
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_SPACE = re.compile(r'\s+')
+_CSS_AROUND = re.compile(r'\s*([{};,>])\s*')
+_CSS_COLON = re.compile(r'([{;])([\w-]+)\s*:\s*')
+
+
+def minify_css(css):
+    try:
+        import rcssmin
+    except ImportError:
+        css = _CSS_COMMENT.sub('', css)
+        css = _CSS_SPACE.sub(' ', css)
+        css = _CSS_AROUND.sub(r'\1', css)
+        # "color : red" -> "color:red", but not "a :hover" in selectors
+        css = _CSS_COLON.sub(r'\1\2:', css)
+        return css.replace(';}', '}').strip() + '\n'
+    return rcssmin.cssmin(css)
+
+
+def minify_js(js):
+    try:
+        import rjsmin
+    except ImportError:
+        lines = (line.strip() for line in js.splitlines())
+        return '\n'.join(line for line in lines if line and not line.startswith('//')) + '\n'
+    return rjsmin.jsmin(js)
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+# --- 2. STORAGE ---
+
+class AssetStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage (content-hashed names, staticfiles.json)
+    that minifies CSS and JS as collectstatic copies them in, so the hash
+    is that of the minified file.
+
+    Until build_assets / collectstatic has written a manifest, {% static %}
+    gives the plain names instead of failing, so a fresh checkout and the
+    tests run without a build.
+    """
+
+    def _save(self, name, content):
+        minify = MINIFIERS.get(posixpath.splitext(name)[1])
+        if minify and name.startswith(MINIFY_PREFIXES) and not name.endswith(('.min.css', '.min.js')):
+            # chunks() starts from the top: the file may have been read for its hash
+            source = b''.join(content.chunks()).decode('utf-8')
+            content = ContentFile(minify(source).encode('utf-8'))
+        return super()._save(name, content)
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+
+def precompress(path):
+    """
+    Write path.gz (and path.br if the brotli package is installed) next to
+    the file, when that makes it smaller. Returns {encoding: size}.
+    """
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    sizes = {}
+    if len(data) < MIN_COMPRESS_SIZE:
+        return sizes
+    compressors = [('gzip', '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        compressors.append(('br', '.br', lambda data: brotli.compress(data, quality=11)))
+    for encoding, suffix, compress in compressors:
+        compressed = compress(data)
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as fh:
+                fh.write(compressed)
+            sizes[encoding] = len(compressed)
+    return sizes
+
+
+# --- 3. SERVING ---
+# For deployments where Django serves its own files (no nginx / CDN in
+# front). Precompressed siblings are sent to browsers that accept them.
+
+def _accepted_encodings(request):
+    return {
+        part.split(';')[0].strip()
+        for part in request.headers.get('Accept-Encoding', '').split(',')
+    }
+
+
+def _serve_file(request, path, document_root, cache_control):
+    response = None
+    if path.endswith(COMPRESSIBLE):
+        accepted = _accepted_encodings(request)
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if encoding in accepted:
+                try:
+                    # serve() sets Content-Encoding from the .br / .gz suffix
+                    response = serve(request, path + suffix, document_root=document_root)
+                except Http404:
+                    continue
+                break
+    if response is None:
+        response = serve(request, path, document_root=document_root)
+    if path.endswith(COMPRESSIBLE):
+        patch_vary_headers(response, ['Accept-Encoding'])
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def serve_static(request, path):
+    """Collected static files (STATIC_ROOT), built by build_assets."""
+    immutable = _HASHED_NAME.search(path)
+    cache_control = IMMUTABLE if immutable else f'public, max-age={UNHASHED_MAX_AGE}'
+    return _serve_file(request, path, settings.STATIC_ROOT, cache_control)
+
+
+def serve_media(request, path):
+    """
+    Uploaded files. Only image variants have content-hashed names; an
+    upload's name can come back with other bytes once the old file is
+    deleted, so those get the short max-age.
+    """
+    immutable = _HASHED_VARIANT.search(path)
+    cache_control = IMMUTABLE if immutable else f'public, max-age={UNHASHED_MAX_AGE}'
+    return _serve_file(request, path, settings.MEDIA_ROOT, cache_control)
@@ -0,0 +1,133 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.db.models import Prefetch
+from django.http import Http404
+from django.shortcuts import render
+
+from . import read_model, views
+from .cart import Cart
+from .conditional import book_state, catalog_state, conditional_page
+from .models import Book, Order, OrderItem
+from .page_cache import anonymous_page_cache
+from .pagination import KeysetPaginator, InvalidCursor, cursor_querystring
+from .recommendations import recommended_books_for
+from .replicas import read_from_replica
+from .sampling import random_books
+
+# Async versions of the busiest read pages, used instead of the ones in
+# views.py when the site runs under ASGI (see asgi.py and ASYNC_VIEWS in
+# settings). Same templates, same context, same caching.
+#
+# Queries that don't depend on each other are started together with
+# asyncio.gather(). Helpers that are plain sync code (read model, search,
+# keyset pages, sessions) go through sync_to_async; rendering does too,
+# because the context processors read request.user and the session.
+
+ASYNC_VIEW_NAMES = ('home', 'book_detail', 'cart_view', 'profile')
+
+
+async def _list(queryset):
+    return [obj async for obj in queryset]
+
+
+async def _render(request, template_name, context):
+    return await sync_to_async(render)(request, template_name, context)
+
+
+# --- 1. HOME & BROWSING ---
+
+async def _recommendations(user):
+    if not user.is_authenticated:
+        return []
+    return await sync_to_async(recommended_books_for)(user)
+
+
+@conditional_page(catalog_state, 'books', 'categories', 'reviews')
+@anonymous_page_cache('books', 'categories', 'reviews')
+@read_from_replica
+async def home(request):
+    user = await request.auser()
+    catalog, categories, recommended_books, footer_recommendations = await asyncio.gather(
+        sync_to_async(views._catalog_page)(request),
+        sync_to_async(read_model.categories)(),
+        _recommendations(user),
+        sync_to_async(random_books)(4),
+    )
+    return await _render(request, 'home.html', {
+        **catalog,
+        'categories': categories,
+        'recommended_books': recommended_books,
+        'footer_recommendations': footer_recommendations,
+    })
+
+
+async def _can_review(user, book):
+    # Verified purchase: a PAID order containing this book
+    if not user.is_authenticated:
+        return False
+    return await OrderItem.objects.filter(order__user=user, order__paid=True, book=book).aexists()
+
+
+@conditional_page(book_state, 'books', 'categories', 'reviews')
+@anonymous_page_cache('books', 'categories', 'reviews')
+@read_from_replica
+async def book_detail(request, pk):
+    if request.method == 'POST':
+        # Posting a review is a write + redirect; the sync view handles it
+        return await sync_to_async(views.book_detail)(request, pk)
+
+    book = await sync_to_async(read_model.get_book)(pk)
+    if book is None:
+        raise Http404("No such book")
+
+    user = await request.auser()
+    reviews, related_books, can_review = await asyncio.gather(
+        _list(book.reviews.select_related('user').order_by('-created_at')),
+        _list(Book.objects.filter(category=book.category_id).exclude(pk=pk)[:4]),
+        _can_review(user, book),
+    )
+    return await _render(request, 'book_detail.html', {
+        'book': book,
+        'related_books': related_books,
+        'reviews': reviews,
+        'avg_rating': book.average_rating,
+        'form': views.ReviewForm(),
+        'can_review': can_review,
+    })
+
+
+# --- 2. CART ---
+
+async def cart_view(request):
+    cart = Cart(request)
+    # Loads the session and resolves every line with one in_bulk() query;
+    # the total is then worked out from the loaded lines
+    cart_items = await sync_to_async(cart.lines)()
+    return await _render(request, 'cart.html', {'cart_items': cart_items, 'total_price': cart.total()})
+
+
+# --- 3. PROFILE ---
+
+def _orders_page(user, after, before):
+    orders = Order.objects.filter(user=user).prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('book'))
+    )
+    paginator = KeysetPaginator(orders, ordering=('-created_at', '-id'), per_page=views.ORDERS_PER_PAGE)
+    try:
+        return paginator.page(after=after, before=before)
+    except InvalidCursor:
+        return paginator.page()
+
+
+@login_required
+async def profile(request):
+    user = await request.auser()
+    page = await sync_to_async(_orders_page)(user, request.GET.get('after'), request.GET.get('before'))
+    return await _render(request, 'profile.html', {
+        'orders': page.object_list,
+        'page': page,
+        'next_query': cursor_querystring(request, after=page.next_cursor),
+        'previous_query': cursor_querystring(request, before=page.previous_cursor),
+    })
@@ -0,0 +1,378 @@
+import asyncio
+import csv
+import io
+import json
+import platform
+import statistics
+import subprocess
+import threading
+import time
+import types
+
+import django
+from asgiref.sync import ThreadSensitiveContext
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import include, path, reverse
+from django.utils import timezone
+
+from . import async_views, views
+from .models import Book, Category, Order, UserProfile
+from .read_model import invalidate_categories
+
+
+# Dataset sizes are given as a number of books; everything else scales
+# with it the way a real store would
+
+def dataset_for(books):
+    return {
+        'books': books,
+        'categories': max(5, min(60, books // 100)),
+        'users': max(20, books // 5),
+        'publishers': max(2, books // 200),
+        'orders': books * 2,
+        'reviews': books,
+    }
+
+
+# --- 1. SCENARIOS ---
+# One per view in app/urls.py (plus a few variants). "role" picks the
+# client: anonymous, customer, publisher or staff. "prepare" runs untimed
+# before every request, e.g. to put something in the cart; "data" may be a
+# function too, for uploads (a file can only be sent once).
+
+def scenarios(fixtures):
+    book, category, cheap_book = fixtures['book'], fixtures['category'], fixtures['cheap_book']
+
+    def fill_cart(client):
+        client.get(reverse('add_to_cart', args=[cheap_book.pk]))
+
+    def relogin(role):
+        return lambda client: client.force_login(fixtures[role])
+
+    def import_upload():
+        # A fresh file every time (the last request read the old one); it
+        # updates the publisher's books by ISBN, so no cover images needed
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(['isbn', 'title', 'author', 'category', 'description', 'price', 'stock'])
+        for book in fixtures['import_books']:
+            writer.writerow([book.isbn, book.title, book.author, book.category.slug, book.description,
+                             book.price, book.stock])
+        return {'file': SimpleUploadedFile('books.csv', out.getvalue().encode(), content_type='text/csv')}
+
+    checkout_form = {'full_name': 'Bench Mark', 'address': '1 Main St', 'city': 'Pune', 'zip_code': '411001'}
+    api_book = reverse('api_book_detail', args=[book.pk])
+    return [
+        {'name': 'home', 'url': reverse('home')},
+        {'name': 'home_category', 'url': reverse('home') + f'?category={category.slug}'},
+        {'name': 'home_top_rated', 'url': reverse('home') + '?sort=rating'},
+        {'name': 'home_search', 'url': reverse('home') + '?q=shadow'},
+        {'name': 'home_books_fragment', 'url': reverse('home_books_fragment')},
+        {'name': 'book_detail', 'url': reverse('book_detail', args=[book.pk])},
+        {'name': 'signup', 'url': reverse('signup')},
+        {'name': 'about', 'url': reverse('about')},
+        {'name': 'student_offer', 'url': reverse('student_offer')},
+        {'name': 'home_logged_in', 'url': reverse('home'), 'role': 'customer'},
+        {'name': 'book_detail_logged_in', 'url': reverse('book_detail', args=[book.pk]), 'role': 'customer'},
+        {'name': 'add_to_cart', 'url': reverse('add_to_cart', args=[cheap_book.pk]), 'role': 'customer'},
+        {'name': 'remove_from_cart', 'url': reverse('remove_from_cart', args=[cheap_book.pk]), 'role': 'customer',
+         'prepare': fill_cart},
+        {'name': 'cart_view', 'url': reverse('cart_view'), 'role': 'customer', 'prepare': fill_cart},
+        {'name': 'checkout', 'url': reverse('checkout'), 'role': 'customer', 'prepare': fill_cart},
+        {'name': 'checkout_post', 'url': reverse('checkout'), 'role': 'customer', 'prepare': fill_cart,
+         'method': 'post', 'data': checkout_form},
+        {'name': 'profile', 'url': reverse('profile'), 'role': 'customer'},
+        {'name': 'logout', 'url': reverse('logout'), 'role': 'customer', 'prepare': relogin('customer')},
+        {'name': 'publisher_dashboard', 'url': reverse('publisher_dashboard'), 'role': 'publisher'},
+        {'name': 'add_book', 'url': reverse('add_book'), 'role': 'publisher'},
+        {'name': 'edit_book', 'url': reverse('edit_book', args=[fixtures['publisher_book'].pk]), 'role': 'publisher'},
+        {'name': 'import_books', 'url': reverse('import_books'), 'role': 'publisher'},
+        # The import itself, not just queuing it: inline instead of in a worker
+        {'name': 'import_books_post', 'url': reverse('import_books'), 'role': 'publisher', 'method': 'post',
+         'data': import_upload, 'settings': {'BOOK_IMPORT_WORKERS': 0}},
+        {'name': 'export_order_items', 'url': reverse('export_data', args=['order_items']), 'role': 'staff'},
+        {'name': 'export_daily_sales', 'url': reverse('export_data', args=['daily_sales']), 'role': 'publisher'},
+        {'name': 'manager_dashboard', 'url': reverse('manager_dashboard'), 'role': 'staff'},
+        {'name': 'metrics', 'url': reverse('metrics'), 'role': 'staff'},
+        {'name': 'api_book_list', 'url': reverse('api_book_list')},
+        {'name': 'api_book_list_fields', 'url': reverse('api_book_list') + '?fields=category,image'},
+        {'name': 'api_book_list_category', 'url': reverse('api_book_list') + f'?category={category.slug}&sort=rating'},
+        {'name': 'api_book_search', 'url': reverse('api_book_list') + '?q=shadow'},
+        {'name': 'api_book_detail', 'url': api_book},
+        {'name': 'api_review_list', 'url': reverse('api_review_list', args=[book.pk])},
+        {'name': 'api_category_list', 'url': reverse('api_category_list')},
+    ]
+
+
+def pick_fixtures():
+    """The users and books the scenarios use, chosen from the generated data."""
+    publisher_profile = (
+        UserProfile.objects.filter(is_publisher=True, is_approved=True)
+        .annotate(n=Count('user__book')).order_by('-n').select_related('user').first()
+    )
+    customer_id = (
+        Order.objects.values('user').annotate(n=Count('id')).order_by('-n').values_list('user', flat=True).first()
+    )
+    staff, _ = User.objects.get_or_create(
+        username='bench-staff', defaults={'is_staff': True},
+    )
+    # Generated books have no ISBN; import_books_post updates these by theirs
+    import_books = list(
+        Book.objects.filter(publisher=publisher_profile.user).select_related('category').order_by('id')[:100]
+    )
+    for book in import_books:
+        book.isbn = book.isbn or '979%010d' % book.pk
+    Book.objects.bulk_update(import_books, ['isbn'])
+    return {
+        'customer': User.objects.get(pk=customer_id),
+        'publisher': publisher_profile.user,
+        'staff': staff,
+        # Most-reviewed book: the heaviest detail page
+        'book': Book.objects.order_by('-rating_count', 'id').first(),
+        'category': Category.objects.annotate(n=Count('books')).order_by('-n').first(),
+        'cheap_book': Book.objects.filter(stock__gt=0).order_by('price', 'id').first(),
+        'publisher_book': Book.objects.filter(publisher=publisher_profile.user).first(),
+        'import_books': import_books,
+    }
+
+
+# --- 2. MEASURING ---
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, round(fraction * (len(values) - 1)))]
+
+
+def run_scenario(scenario, clients, repeat=10, warmup=2, cold=False):
+    # cold=True empties every cache before each request (worst case)
+    client = clients[scenario.get('role', 'anonymous')]
+    method = getattr(client, scenario.get('method', 'get'))
+    prepare = scenario.get('prepare')
+    data = scenario.get('data')
+
+    timings, queries, statuses, cache_results = [], 0, set(), set()
+    # Some scenarios need a setting changed, e.g. to run background work inline
+    with override_settings(**scenario.get('settings', {})):
+        for n in range(warmup + repeat):
+            if prepare:
+                prepare(client)
+            if cold:
+                cache.clear()
+                invalidate_categories()
+            payload = (data() if callable(data) else data) or {}
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = method(scenario['url'], payload)
+                if response.streaming:
+                    # Exports: the work happens while the body is read
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - start
+            if n >= warmup:
+                timings.append(elapsed * 1000)
+                queries = max(queries, len(captured))
+                statuses.add(response.status_code)
+                cache_results.add(response.get('X-Cache', '-'))
+
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'p95_ms': round(_percentile(timings, 0.95), 3),
+        'min_ms': round(min(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'max_queries': queries,
+        'status': sorted(statuses),
+        'x_cache': sorted(cache_results),
+    }
+
+
+def make_clients(fixtures):
+    clients = {'anonymous': Client()}
+    for role in ('customer', 'publisher', 'staff'):
+        clients[role] = Client()
+        clients[role].force_login(fixtures[role])
+    return clients
+
+
+def run_benchmarks(repeat=10, warmup=2, only=None, cold=False, log=lambda message: None):
+    fixtures = pick_fixtures()
+    clients = make_clients(fixtures)
+    results = {}
+    for scenario in scenarios(fixtures):
+        if only and scenario['name'] not in only:
+            continue
+        results[scenario['name']] = run_scenario(scenario, clients, repeat=repeat, warmup=warmup, cold=cold)
+        log("  %-24s median %8.2f ms   p95 %8.2f ms   %3d queries" % (
+            scenario['name'], results[scenario['name']]['median_ms'],
+            results[scenario['name']]['p95_ms'], results[scenario['name']]['max_queries'],
+        ))
+    return results
+
+
+# --- 3. RESULT FILES ---
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata():
+    return {
+        'commit': _git_commit(),
+        'created': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+    }
+
+
+def compare(old, new):
+    """Lines describing the median change of every view between two result files."""
+    lines = []
+    for size, views in new['results'].items():
+        previous = old.get('results', {}).get(size, {})
+        for name, result in views.items():
+            if name not in previous:
+                continue
+            before, after = previous[name]['median_ms'], result['median_ms']
+            change = (after - before) / before * 100 if before else 0
+            lines.append("%7s  %-24s %8.2f -> %8.2f ms  (%+6.1f%%)  queries %d -> %d" % (
+                size, name, before, after, change, previous[name]['max_queries'], result['max_queries'],
+            ))
+    return lines
+
+
+def load(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+# --- 4. ASGI vs WSGI THROUGHPUT ---
+# The same requests through the WSGI handler (one thread per concurrent
+# client, like a threaded WSGI server) and through the ASGI handler (one
+# coroutine per client on a single event loop, each request in its own
+# ThreadSensitiveContext the way Django's ASGI handler runs it). The URLconf
+# is swapped per run so the first uses views.py and the second the async
+# views, whatever ASYNC_VIEWS says.
+
+THROUGHPUT_SCENARIOS = ('home', 'home_logged_in', 'book_detail', 'book_detail_logged_in', 'cart_view', 'profile')
+
+
+def read_urlconf(use_async):
+    """A root URLconf like the site's, with the sync or the async read views."""
+    from . import urls as store_urls
+
+    source = async_views if use_async else views
+    patterns = [
+        path(str(pattern.pattern), getattr(source, pattern.name), name=pattern.name)
+        if pattern.name in async_views.ASYNC_VIEW_NAMES else pattern
+        for pattern in store_urls.urlpatterns
+    ]
+    module = types.ModuleType('benchmark_urls_%s' % ('async' if use_async else 'sync'))
+    module.urlpatterns = [
+        path('accounts/', include('django.contrib.auth.urls')),
+        path('', include(patterns)),
+    ]
+    return module
+
+
+def _clone_clients(client, client_class, n):
+    # Every concurrent client shares the logged-in session (and its cart);
+    # nothing in these views writes to it
+    clones = []
+    for _ in range(n):
+        clone = client_class()
+        clone.cookies.update(client.cookies)
+        clones.append(clone)
+    return clones
+
+
+def _throughput(latencies, statuses, elapsed):
+    return {
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'median_ms': round(statistics.median(latencies) * 1000, 3),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 3),
+        'status': sorted(statuses),
+    }
+
+
+def _run_wsgi(url, clients, requests):
+    remaining = iter(range(requests))
+    lock = threading.Lock()
+    latencies, statuses = [], set()
+
+    def worker(client):
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            response = client.get(url)
+            latencies.append(time.perf_counter() - start)
+            statuses.add(response.status_code)
+
+    threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return _throughput(latencies, statuses, time.perf_counter() - start)
+
+
+async def _run_asgi(url, clients, requests):
+    remaining = iter(range(requests))
+    latencies, statuses = [], set()
+
+    async def worker(client):
+        while next(remaining, None) is not None:
+            async with ThreadSensitiveContext():
+                start = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - start)
+                statuses.add(response.status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(client) for client in clients))
+    return _throughput(latencies, statuses, time.perf_counter() - start)
+
+
+def run_throughput(requests=200, concurrency=16, warmup=10, only=None, log=lambda message: None):
+    fixtures = pick_fixtures()
+    logged_in = make_clients(fixtures)
+    logged_in['customer'].get(reverse('add_to_cart', args=[fixtures['cheap_book'].pk]))
+
+    results = {}
+    for scenario in scenarios(fixtures):
+        name = scenario['name']
+        if name not in THROUGHPUT_SCENARIOS or (only and name not in only):
+            continue
+        base = logged_in[scenario.get('role', 'anonymous')]
+        results[name] = {}
+
+        with override_settings(ROOT_URLCONF=read_urlconf(use_async=False)):
+            clients = _clone_clients(base, Client, concurrency)
+            _run_wsgi(scenario['url'], clients, warmup)
+            results[name]['wsgi'] = _run_wsgi(scenario['url'], clients, requests)
+
+        with override_settings(ROOT_URLCONF=read_urlconf(use_async=True)):
+            clients = _clone_clients(base, AsyncClient, concurrency)
+            asyncio.run(_run_asgi(scenario['url'], clients, warmup))
+            results[name]['asgi'] = asyncio.run(_run_asgi(scenario['url'], clients, requests))
+
+        wsgi, asgi = results[name]['wsgi'], results[name]['asgi']
+        results[name]['speedup'] = round(asgi['requests_per_second'] / wsgi['requests_per_second'], 2)
+        log("  %-24s WSGI %8.1f req/s   ASGI %8.1f req/s   (x%.2f)" % (
+            name, wsgi['requests_per_second'], asgi['requests_per_second'], results[name]['speedup'],
+        ))
+    return results
@@ -0,0 +1,275 @@
+from django.core.cache import cache
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F
+
+from .models import Book, Cart as StoredCart, CartItem
+
+# The navbar badge count is cached; rows deleted behind the cart's back
+# (a book delete cascading, the admin) also clear it via signals.py, and
+# anything missed there still corrects itself after this long
+CART_COUNT_TIMEOUT = 10 * 60
+
+
+class CartLine:
+    def __init__(self, book_id, quantity, book=None):
+        self.book_id = book_id
+        self.quantity = quantity
+        self.book = book  # None if the book was deleted since it was added
+
+    @property
+    def is_missing(self):
+        return self.book is None
+
+    @property
+    def is_out_of_stock(self):
+        return self.book is not None and self.book.stock < self.quantity
+
+    @property
+    def is_available(self):
+        return not self.is_missing and not self.is_out_of_stock
+
+    @property
+    def unit_price(self):
+        return self.book.price if self.book is not None else 0
+
+    @property
+    def total(self):
+        return self.unit_price * self.quantity
+
+
+# --- 1. STORAGE BACKENDS ---
+# Anonymous carts live in the session; with SESSION_ENGINE set to signed
+# cookies (settings.py) that is a cookie, so visitors and bots browsing
+# around never write to the database. Logged-in carts are CartItem rows,
+# one per book, so adding a book is one upsert instead of a session rewrite.
+
+class SessionCartStorage:
+    """
+    {"<book id>": quantity} in the session. Older sessions may hold
+    {"<book id>": {"quantity": n}}; both are read, only ints are written.
+    """
+
+    SESSION_KEY = 'cart'
+
+    def __init__(self, session):
+        self.session = session
+
+    def quantities(self):
+        quantities = {}
+        for book_id, value in self.session.get(self.SESSION_KEY, {}).items():
+            try:
+                quantity = value.get('quantity') if isinstance(value, dict) else value
+                quantities[int(book_id)] = int(quantity)
+            except (TypeError, ValueError):
+                continue
+        return quantities
+
+    def _save(self, quantities):
+        self.session[self.SESSION_KEY] = {str(book_id): qty for book_id, qty in quantities.items()}
+
+    def add(self, book_id, quantity):
+        quantities = self.quantities()
+        quantities[book_id] = quantities.get(book_id, 0) + quantity
+        self._save(quantities)
+
+    def remove(self, book_id):
+        quantities = self.quantities()
+        quantities.pop(book_id, None)
+        self._save(quantities)
+
+    def retain(self, book_ids):
+        self._save({book_id: qty for book_id, qty in self.quantities().items() if book_id in book_ids})
+
+    def clear(self):
+        self._save({})
+
+    def pop_all(self):
+        # Everything in the cart, which is then emptied (merging on login)
+        quantities = self.quantities()
+        if quantities:
+            del self.session[self.SESSION_KEY]
+        return quantities
+
+    def count(self):
+        return len(self.quantities())
+
+    def lines(self):
+        # All books in one in_bulk() query; deleted books come back missing
+        quantities = self.quantities()
+        books = Book.objects.in_bulk(list(quantities))
+        return [CartLine(book_id, quantity, books.get(book_id)) for book_id, quantity in quantities.items()]
+
+
+def _upsert_sql(connection, rows):
+    # INSERT, or add to the quantity already there, in one statement
+    table = connection.ops.quote_name(CartItem._meta.db_table)
+    values = ', '.join(['(%s, %s, %s)'] * rows)
+    insert = f'INSERT INTO {table} (cart_id, book_id, quantity) VALUES {values}'
+    if connection.vendor == 'mysql':
+        return f'{insert} ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)'
+    if connection.vendor in ('sqlite', 'postgresql'):
+        return f'{insert} ON CONFLICT (cart_id, book_id) DO UPDATE SET quantity = {table}.quantity + excluded.quantity'
+    return None
+
+
+def _count_key(cart_id):
+    return f'cart:count:{cart_id}'
+
+
+def forget_count(cart_id):
+    cache.delete(_count_key(cart_id))
+
+
+class DatabaseCartStorage:
+    """CartItem rows of a logged-in user's Cart (its primary key is the user's)."""
+
+    def __init__(self, user_id):
+        self.cart_id = user_id
+
+    @property
+    def items(self):
+        return CartItem.objects.filter(cart_id=self.cart_id)
+
+    def _changed(self):
+        forget_count(self.cart_id)
+
+    def quantities(self):
+        return dict(self.items.order_by('id').values_list('book_id', 'quantity'))
+
+    def _upsert(self, quantities):
+        using = router.db_for_write(CartItem)
+        connection = connections[using]
+        sql = _upsert_sql(connection, len(quantities))
+        with transaction.atomic(using=using):
+            if sql:
+                params = [value for book_id, qty in quantities.items() for value in (self.cart_id, book_id, qty)]
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, params)
+                return
+            for book_id, qty in quantities.items():
+                if not self.items.filter(book_id=book_id).update(quantity=F('quantity') + qty):
+                    CartItem.objects.create(cart_id=self.cart_id, book_id=book_id, quantity=qty)
+
+    def add_many(self, quantities):
+        """Add {book_id: quantity} to the cart; books that don't exist are skipped."""
+        quantities = {book_id: qty for book_id, qty in quantities.items() if qty > 0}
+        if not quantities:
+            return
+        try:
+            self._upsert(quantities)
+        except IntegrityError:
+            # No cart row yet (they're made on login), or a book was deleted
+            # (or an id made up) since the link was rendered
+            StoredCart.objects.get_or_create(pk=self.cart_id)
+            existing = set(Book.objects.filter(pk__in=quantities).values_list('pk', flat=True))
+            quantities = {book_id: qty for book_id, qty in quantities.items() if book_id in existing}
+            if quantities:
+                self._upsert(quantities)
+        self._changed()
+
+    def add(self, book_id, quantity):
+        self.add_many({book_id: quantity})
+
+    def remove(self, book_id):
+        self.items.filter(book_id=book_id).delete()
+        self._changed()
+
+    def retain(self, book_ids):
+        self.items.exclude(book_id__in=book_ids).delete()
+        self._changed()
+
+    def clear(self):
+        self.items.delete()
+        self._changed()
+
+    def count(self):
+        # Shown on the navbar of every page, so kept in the cache
+        return cache.get_or_set(_count_key(self.cart_id), self.items.count, CART_COUNT_TIMEOUT)
+
+    def lines(self):
+        return [
+            CartLine(item.book_id, item.quantity, item.book)
+            for item in self.items.select_related('book').order_by('id')
+        ]
+
+
+def merge_session_cart(request, user):
+    """
+    Move what an anonymous visitor put in their cart into their stored cart
+    when they log in (quantities of books in both are added up).
+    """
+    StoredCart.objects.get_or_create(user=user)
+    session = getattr(request, 'session', None)
+    if session is not None:
+        DatabaseCartStorage(user.pk).add_many(SessionCartStorage(session).pop_all())
+
+
+# --- 2. THE CART ---
+
+class Cart:
+    """
+    The shopping cart of the current request, in the session for anonymous
+    visitors and in the database for logged-in users (see above). The
+    storage is picked on first use, so building a Cart costs nothing.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self._storage = None
+        self._lines = None
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            user = self.request.user
+            if user.is_authenticated:
+                self._storage = DatabaseCartStorage(user.pk)
+            else:
+                self._storage = SessionCartStorage(self.request.session)
+        return self._storage
+
+    # --- RAW QUANTITIES ---
+
+    def quantities(self):
+        return self.storage.quantities()
+
+    def add(self, book_id, quantity=1):
+        self.storage.add(int(book_id), quantity)
+        self._lines = None
+
+    def remove(self, book_id):
+        self.storage.remove(int(book_id))
+        self._lines = None
+
+    def retain(self, book_ids):
+        # Drop every line except these (e.g. what checkout couldn't sell)
+        self.storage.retain(set(book_ids))
+        self._lines = None
+
+    def clear(self):
+        self.storage.clear()
+        self._lines = None
+
+    def count(self):
+        # Number of different books, as shown on the navbar badge
+        return self.storage.count()
+
+    def __len__(self):
+        return self.count()
+
+    # --- RESOLVED LINES (one query) ---
+
+    def lines(self):
+        if self._lines is None:
+            self._lines = self.storage.lines()
+        return self._lines
+
+    def available_lines(self):
+        return [line for line in self.lines() if line.is_available]
+
+    def unavailable_lines(self):
+        return [line for line in self.lines() if not line.is_available]
+
+    def total(self):
+        # Only what can actually be bought counts towards the order total
+        return sum((line.total for line in self.available_lines()), 0)
@@ -0,0 +1,377 @@
+import csv
+import io
+import json
+import logging
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from django import forms
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import fragments, images, page_cache, publisher_stats, read_model, sampling, search
+from .forms import BookForm
+from .models import Book, ImportJob
+
+logger = logging.getLogger(__name__)
+
+# Rows are read one at a time and written IMPORT_BATCH_SIZE at a time, so
+# memory stays flat whatever the size of the file
+IMPORT_BATCH_SIZE = 500
+# Only the first errors are kept for the report (all of them are counted)
+MAX_REPORTED_ERRORS = 1000
+# ...and fewer still on an ImportJob, which is rewritten after every batch
+JOB_REPORTED_ERRORS = 100
+
+COLUMNS = ('isbn', 'title', 'author', 'category', 'description', 'price', 'stock', 'image')
+# What an import may change on a book that already exists (matched by ISBN)
+UPDATE_FIELDS = ['category', 'title', 'author', 'description', 'price', 'stock', 'updated_at']
+
+
+class InvalidImportFile(Exception):
+    pass
+
+
+# --- 1. READING ROWS ---
+# CSV needs a header line with (some of) COLUMNS; JSONL is one object per
+# line with the same keys. Uploaded files are bytes, so they're decoded as
+# they're read.
+
+def detect_format(name):
+    return 'jsonl' if name.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def _text(fh):
+    if isinstance(fh, io.TextIOBase):
+        return fh
+    return io.TextIOWrapper(fh, encoding='utf-8-sig', newline='')
+
+
+def read_rows(fh, format='csv'):
+    """Yield (line number, {column: value}) for every row of the file."""
+    fh = _text(fh)
+    if format == 'jsonl':
+        for number, line in enumerate(fh, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield number, e
+                continue
+            yield number, row if isinstance(row, dict) else ValueError("Expected a JSON object")
+        return
+
+    reader = csv.DictReader(fh)
+    missing = {'title', 'author', 'category', 'price'} - set(reader.fieldnames or ())
+    if missing:
+        raise InvalidImportFile("CSV header is missing: %s" % ', '.join(sorted(missing)))
+    for row in reader:
+        yield reader.line_num, row
+
+
+# --- 2. COVER IMAGES ---
+
+class ImageSource:
+    """Cover images named in the "image" column, from a directory or a zip archive."""
+
+    def __init__(self, path_or_file):
+        self.archive = None
+        self.root = None
+        if isinstance(path_or_file, str) and os.path.isdir(path_or_file):
+            self.root = os.path.realpath(path_or_file)
+        else:
+            try:
+                self.archive = zipfile.ZipFile(path_or_file)
+            except (OSError, zipfile.BadZipFile):
+                raise InvalidImportFile("Images must be a directory or a zip archive")
+            self.names = set(self.archive.namelist())
+
+    def exists(self, name):
+        if self.archive is not None:
+            return name in self.names
+        path = os.path.realpath(os.path.join(self.root, name))
+        # No "../../etc/passwd" out of the images directory
+        return path.startswith(self.root + os.sep) and os.path.isfile(path)
+
+    def save(self, name):
+        """Copy the image into media storage; returns the stored name."""
+        opened = self.archive.open(name) if self.archive is not None else open(os.path.join(self.root, name), 'rb')
+        with opened as fh:
+            return default_storage.save(f'books/{os.path.basename(name)}', File(fh))
+
+
+# --- 3. VALIDATING A ROW ---
+
+class BookImportForm(BookForm):
+    """
+    BookForm's rules for one imported row. The category is given by slug
+    and resolved from the read model (no query per row); the image is a
+    file name in the ImageSource, only required for new books. Both are
+    set on the book by import_books(), not by the form.
+    """
+    category = forms.CharField()
+    image = forms.CharField(required=False)
+
+    class Meta(BookForm.Meta):
+        # Keeps model validation from checking the category with a query
+        exclude = BookForm.Meta.exclude + ['category', 'image']
+
+    def __init__(self, data, image_source=None):
+        super().__init__(data)
+        self.image_source = image_source
+
+    def clean_category(self):
+        slug = self.cleaned_data['category'].strip()
+        category = read_model.category_by_slug(slug)
+        if category is None:
+            raise forms.ValidationError(f"Unknown category '{slug}'.")
+        return category
+
+    def clean_image(self):
+        name = (self.cleaned_data.get('image') or '').strip()
+        if name and (self.image_source is None or not self.image_source.exists(name)):
+            raise forms.ValidationError(f"Image '{name}' not found.")
+        return name
+
+    def validate_unique(self):
+        # An existing ISBN is an update, not an error; and checking would
+        # cost a query per row. import_books() handles it per batch.
+        pass
+
+
+def _error_text(form):
+    return '; '.join(
+        f'{field}: {" ".join(messages)}' if field != '__all__' else ' '.join(messages)
+        for field, messages in form.errors.items()
+    )
+
+
+# --- 4. IMPORTING ---
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []  # (line, message), the first MAX_REPORTED_ERRORS
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self):
+        return {'rows': self.rows, 'created': self.created, 'updated': self.updated, 'failed': self.failed}
+
+
+def import_books(rows, publisher=None, image_source=None, batch_size=IMPORT_BATCH_SIZE, dry_run=False,
+                 progress=lambda result: None):
+    """
+    Validate and write the rows from read_rows(). Books with an ISBN are
+    upserted on it (bulk_create with update_conflicts); without one they are
+    always new. A publisher may only update their own books; publisher=None
+    (admin imports) may update any and keeps their owner. Each batch is
+    its own transaction and progress(result) is called after each one.
+
+    Bulk writes skip the Book signals, so the search index, caches and
+    image variants are refreshed here, per batch.
+    """
+    result = ImportResult()
+    batch = {}  # ISBN (or a per-row key) -> (line, book, image name)
+    touched_publishers = set()
+
+    for line, row in rows:
+        result.rows += 1
+        if isinstance(row, Exception):
+            result.error(line, str(row))
+            continue
+        form = BookImportForm(
+            {column: '' if row.get(column) is None else str(row.get(column)) for column in COLUMNS},
+            image_source=image_source,
+        )
+        if not form.is_valid():
+            result.error(line, _error_text(form))
+            continue
+        book = form.save(commit=False)
+        book.category = form.cleaned_data['category']
+        book.publisher = publisher
+        key = book.isbn or ('row', line)
+        # A repeated ISBN: the later row wins, keeping an earlier row's image
+        image_name = form.cleaned_data['image'] or batch.get(key, (None, None, ''))[2]
+        batch[key] = (line, book, image_name)
+
+        if len(batch) >= batch_size:
+            _write_batch(batch, publisher, image_source, dry_run, result, touched_publishers)
+            batch = {}
+            progress(result)
+
+    if batch:
+        _write_batch(batch, publisher, image_source, dry_run, result, touched_publishers)
+        progress(result)
+
+    if not dry_run and (result.created or result.updated):
+        if result.created:
+            sampling.bump_generation()
+        page_cache.bump_tags('books')
+        publisher_stats.invalidate(touched_publishers)
+    return result
+
+
+def _write_batch(batch, publisher, image_source, dry_run, result, touched_publishers):
+    isbns = [key for key in batch if isinstance(key, str)]
+    owners = dict(Book.objects.filter(isbn__in=isbns).values_list('isbn', 'publisher_id'))
+
+    new_books, updates, updates_with_image, to_copy = [], [], [], []
+    for key, (line, book, image_name) in batch.items():
+        exists = key in owners
+        if exists and publisher is not None and owners[key] != publisher.pk:
+            result.error(line, f"ISBN {key} belongs to another publisher's book.")
+            continue
+        if not exists and not image_name:
+            result.error(line, "image: A cover image is required for new books.")
+            continue
+        if dry_run:
+            image_name = None
+        if not exists:
+            new_books.append(book)
+        else:
+            if publisher is None:
+                book.publisher_id = owners[key]
+            (updates_with_image if image_name else updates).append(book)
+        if image_name:
+            to_copy.append((book, image_name))
+
+    if dry_run:
+        result.created += len(new_books)
+        result.updated += len(updates) + len(updates_with_image)
+        return
+
+    # Covers are copied just before the batch is written; if the batch
+    # fails they're deleted again instead of being left with no book
+    copied = []
+    try:
+        for book, image_name in to_copy:
+            book.image = image_source.save(image_name)
+            copied.append(book.image.name)
+        _write_books(new_books, updates, updates_with_image)
+    except Exception:
+        for name in copied:
+            default_storage.delete(name)
+        raise
+    result.created += len(new_books)
+    result.updated += len(updates) + len(updates_with_image)
+
+    written = list(
+        Book.objects.filter(isbn__in=[book.isbn for book in new_books + updates + updates_with_image if book.isbn])
+        | Book.objects.filter(pk__in=[book.pk for book in new_books if not book.isbn and book.pk])
+    )
+    _refresh(written)
+    touched_publishers.update(book.publisher_id for book in written)
+
+
+def _write_books(new_books, updates, updates_with_image):
+    with transaction.atomic():
+        # New books with an ISBN go through the upsert as well, in case a
+        # concurrent import added the same one since we looked
+        Book.objects.bulk_create(
+            [book for book in new_books if book.isbn] + updates,
+            update_conflicts=True, unique_fields=['isbn'], update_fields=UPDATE_FIELDS,
+        )
+        Book.objects.bulk_create(
+            updates_with_image, update_conflicts=True, unique_fields=['isbn'], update_fields=UPDATE_FIELDS + ['image'],
+        )
+        Book.objects.bulk_create([book for book in new_books if not book.isbn])
+
+
+def _refresh(books):
+    # What the post_save signals would have done for each book
+    book_ids = [book.pk for book in books]
+    search.index_books(Book.objects.filter(pk__in=book_ids).select_related('category'))
+    fragments.bump_versions(book_ids)
+    read_model.invalidate_books(book_ids)
+    for book in books:
+        images.schedule_variants(book)
+
+
+# --- 5. BACKGROUND JOBS ---
+# A 20k-row file takes minutes, far longer than a web request should. The
+# upload is stored, an ImportJob row tracks it, and a worker thread runs
+# import_books() on it after the transaction commits, writing its progress
+# to the job after every batch. BOOK_IMPORT_WORKERS = 0 imports inline.
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, 'BOOK_IMPORT_WORKERS', 1)
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='book-imports')
+    return _executor
+
+
+def start_import(publisher, upload, archive=None):
+    """Store the uploaded file (and cover archive) and queue an ImportJob for them."""
+    job = ImportJob.objects.create(
+        publisher=publisher,
+        file=default_storage.save(f'imports/{os.path.basename(upload.name)}', upload),
+        file_format=detect_format(upload.name),
+        images=default_storage.save(f'imports/{os.path.basename(archive.name)}', archive) if archive else '',
+    )
+    job_id = job.pk
+
+    def submit():
+        if getattr(settings, 'BOOK_IMPORT_WORKERS', 1) == 0:
+            run_import(job_id)
+        else:
+            _get_executor().submit(_run_in_worker, job_id)
+
+    transaction.on_commit(submit)
+    return job
+
+
+def _save_progress(job_id, result, **fields):
+    ImportJob.objects.filter(pk=job_id).update(
+        rows=result.rows, created=result.created, updated=result.updated, failed=result.failed,
+        errors=result.errors[:JOB_REPORTED_ERRORS], **fields,
+    )
+
+
+def run_import(job_id):
+    job = ImportJob.objects.select_related('publisher').get(pk=job_id)
+    ImportJob.objects.filter(pk=job_id).update(status='running')
+    try:
+        archive = default_storage.open(job.images, 'rb') if job.images else nullcontext()
+        with default_storage.open(job.file, 'rb') as fh, archive:
+            result = import_books(
+                read_rows(fh, job.file_format), publisher=job.publisher,
+                image_source=ImageSource(archive) if job.images else None, batch_size=IMPORT_BATCH_SIZE,
+                progress=lambda result: _save_progress(job_id, result),
+            )
+    except (InvalidImportFile, UnicodeDecodeError, csv.Error) as e:
+        ImportJob.objects.filter(pk=job_id).update(status='failed', message=str(e), finished_at=timezone.now())
+    except Exception:
+        logger.exception("Import job %s failed", job_id)
+        ImportJob.objects.filter(pk=job_id).update(
+            status='failed', message="The import stopped on an unexpected error.", finished_at=timezone.now(),
+        )
+    else:
+        _save_progress(job_id, result, status='done', finished_at=timezone.now())
+    finally:
+        for name in filter(None, [job.file, job.images]):
+            default_storage.delete(name)
+
+
+def _run_in_worker(job_id):
+    try:
+        run_import(job_id)
+    finally:
+        # Worker threads get their own connections; don't leak them
+        connections.close_all()
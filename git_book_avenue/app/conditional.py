@@ -0,0 +1,140 @@
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from . import read_model
+from .models import Book
+from .page_cache import PAGE_CACHE_TIMEOUT, cacheable_request, page_cache_key
+
+# "NEW RELEASE" badges come off with time, not with an update; ETags
+# change every this many seconds so revalidating browsers notice
+ETAG_TIME_BUCKET = 60 * 60
+
+
+# --- 1. VALIDATORS ---
+# What a page shows, summed up without rendering it: how many books are in
+# scope and when the latest of them changed (a deleted book lowers the
+# count, any other change moves updated_at), plus the categories. Each
+# function returns that state, which goes into the ETag.
+#
+# There is no Last-Modified: no single timestamp covers a deleted book or
+# the "NEW RELEASE" badges expiring, so If-Modified-Since alone would get
+# a 304 for a page that changed. Browsers send If-None-Match anyway.
+
+def _books(category_id=None):
+    books = Book.objects.order_by()
+    if category_id is not None:
+        books = books.filter(category_id=category_id)
+    return books.aggregate(count=Count('id'), last=Max('updated_at'))
+
+
+def _catalog_books(request):
+    category_id = None
+    if not request.GET.get('q') and request.GET.get('category'):
+        # Unknown slugs fall back to the whole catalog, which covers them too
+        category_id = read_model.category_id_for_slug(request.GET['category'])
+    return _books(category_id)
+
+
+def catalog_books_state(request):
+    """The "load more" fragment: just the filtered books."""
+    books = _catalog_books(request)
+    return books['count'], books['last']
+
+
+def catalog_state(request):
+    """home: the filtered books and the category bar."""
+    books = _catalog_books(request)
+    categories = read_model.categories()
+    categories_changed = max((category.updated_at for category in categories), default=None)
+    return books['count'], books['last'], len(categories), categories_changed
+
+
+def categories_state(request, *args, **kwargs):
+    """The category list (and one category by slug): the categories only."""
+    categories = read_model.categories()
+    return len(categories), max((category.updated_at for category in categories), default=None)
+
+
+def book_state(request, pk):
+    """book_detail: the book, its reviews (they touch the book) and its related books."""
+    book = read_model.get_book(pk)
+    if book is None:
+        return None
+    books = _books(book.category_id)
+    return book.pk, books['count'], books['last'], book.category.updated_at
+
+
+# --- 2. THE DECORATOR ---
+
+def _etag(request, state_func, tags, args, kwargs):
+    # The state is cached alongside the page itself so a page-cache hit
+    # still costs no queries; tag versions retire both
+    key = 'etag:' + page_cache_key(request, tags)
+    found = cache.get(key)
+    if found is None:
+        found = (state_func(request, *args, **kwargs),)
+        cache.set(key, found, PAGE_CACHE_TIMEOUT)
+    state = found[0]
+    if state is None:
+        return None
+    # A deploy with new CSS/JS changes the page too
+    parts = (state, int(time.time() // ETAG_TIME_BUCKET), getattr(staticfiles_storage, 'manifest_hash', ''))
+    return 'W/"%s"' % hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def _check(request, state_func, tags, args, kwargs):
+    # (304 response or None, etag)
+    if not cacheable_request(request):
+        return None, None
+    etag = _etag(request, state_func, tags, args, kwargs)
+    if etag is None:
+        return None, None
+    return get_conditional_response(request, etag=etag), etag
+
+
+def _finish(response, etag):
+    if etag is not None and response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        # Browsers and CDNs may keep it, but have to ask before reusing it
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def conditional_page(state_func, *tags):
+    """
+    An ETag for an anonymous page, and 304 Not Modified without running
+    the view when the client's copy is current.
+
+        @conditional_page(book_state, 'books', 'categories', 'reviews')
+        @anonymous_page_cache('books', 'categories', 'reviews')
+        def book_detail(request, pk): ...
+
+    Like the page cache, only for anonymous GET/HEAD requests: logged-in
+    pages carry the cart and per-user forms. Works on async views too
+    (django's condition() would query from the event loop).
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                response, etag = await sync_to_async(_check)(request, state_func, tags, args, kwargs)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(response, etag)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response, etag = _check(request, state_func, tags, args, kwargs)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _finish(response, etag)
+        return wrapper
+    return decorator
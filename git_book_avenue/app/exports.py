@@ -0,0 +1,174 @@
+import csv
+import datetime
+import json
+from decimal import Decimal
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.utils import timezone
+
+from .models import DailyBookSales, Order, OrderItem
+
+# Rows are fetched EXPORT_CHUNK_SIZE at a time with .iterator() and written
+# out as they come, so an export of a year of orders needs the same memory
+# as one of a day. Rows are tuples from values_list(): no model instances.
+EXPORT_CHUNK_SIZE = 2000
+FORMATS = ('csv', 'jsonl')
+# Under ASGI, lines are handed from the worker thread to the event loop
+# this many at a time
+STREAM_LINES = 500
+# Spreadsheets run a cell starting with one of these as a formula (think
+# "=HYPERLINK(...)" typed in as a delivery address); a leading quote keeps
+# it plain text
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+# --- 1. DATASETS ---
+# Each is (header, values_list() fields) over a queryset that filter() below
+# narrows down. "orders" has customer addresses, so it's for staff only,
+# and an order can hold several publishers' books, so it can't be limited
+# to one; the other two can.
+
+def _datetime_bounds(field, start, end):
+    # Whole days in the current timezone, as datetimes so indexes still apply
+    tz = timezone.get_current_timezone()
+    bounds = {}
+    if start:
+        bounds[f'{field}__gte'] = datetime.datetime.combine(start, datetime.time.min, tz)
+    if end and end < datetime.date.max:
+        # (the last representable day has no next day: no upper bound then)
+        bounds[f'{field}__lt'] = datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min, tz)
+    return bounds
+
+
+def _orders(start, end, publisher):
+    return Order.objects.filter(**_datetime_bounds('created_at', start, end)).order_by('created_at', 'id')
+
+
+def _order_items(start, end, publisher):
+    items = OrderItem.objects.filter(**_datetime_bounds('order__created_at', start, end))
+    if publisher is not None:
+        items = items.filter(book__publisher=publisher)
+    return items.annotate(
+        line_total=ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+    ).order_by('order__created_at', 'order_id', 'id')
+
+
+def _daily_sales(start, end, publisher):
+    sales = DailyBookSales.objects.all()
+    if start:
+        sales = sales.filter(date__gte=start)
+    if end:
+        sales = sales.filter(date__lte=end)
+    if publisher is not None:
+        sales = sales.filter(book__publisher=publisher)
+    return sales.order_by('date', 'book_id')
+
+
+DATASETS = {
+    'orders': {
+        'queryset': _orders,
+        'columns': [
+            ('order_id', 'id'), ('created_at', 'created_at'), ('username', 'user__username'),
+            ('full_name', 'full_name'), ('address', 'address'), ('city', 'city'), ('zip_code', 'zip_code'),
+            ('paid', 'paid'), ('total_price', 'total_price'),
+        ],
+        'staff_only': True,
+        'per_publisher': False,
+    },
+    'order_items': {
+        'queryset': _order_items,
+        'columns': [
+            ('order_id', 'order_id'), ('ordered_at', 'order__created_at'), ('paid', 'order__paid'),
+            ('book_id', 'book_id'), ('isbn', 'book__isbn'), ('title', 'book__title'),
+            ('publisher', 'book__publisher__username'), ('quantity', 'quantity'),
+            ('unit_price', 'price'), ('line_total', 'line_total'),
+        ],
+        'staff_only': False,
+        'per_publisher': True,
+    },
+    'daily_sales': {
+        'queryset': _daily_sales,
+        'columns': [
+            ('date', 'date'), ('book_id', 'book_id'), ('isbn', 'book__isbn'), ('title', 'book__title'),
+            ('publisher', 'book__publisher__username'), ('orders', 'orders'), ('units', 'units'),
+            ('revenue', 'revenue'),
+        ],
+        'staff_only': False,
+        'per_publisher': True,
+    },
+}
+
+
+def rows(dataset, start=None, end=None, publisher=None):
+    """The header, then one tuple per row, streamed from the database."""
+    spec = DATASETS[dataset]
+    yield tuple(name for name, _ in spec['columns'])
+    queryset = spec['queryset'](start, end, publisher)
+    yield from queryset.values_list(*(field for _, field in spec['columns'])).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+# --- 2. FORMATS ---
+
+class _Echo:
+    # csv.writer wants a file; this one hands each line straight back
+    def write(self, value):
+        return value
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _csv_value(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def as_csv(rows):
+    writer = csv.writer(_Echo())
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def as_jsonl(rows):
+    rows = iter(rows)
+    header = next(rows)
+    for row in rows:
+        yield json.dumps({name: _json_value(value) for name, value in zip(header, row)}) + '\n'
+
+
+def export(dataset, file_format='csv', start=None, end=None, publisher=None):
+    """Lines of text for a StreamingHttpResponse, or to write to a file."""
+    formatter = as_jsonl if file_format == 'jsonl' else as_csv
+    return formatter(rows(dataset, start, end, publisher))
+
+
+def _next_lines(lines):
+    return ''.join(islice(lines, STREAM_LINES))
+
+
+async def aiter_export(lines):
+    """
+    export() for a StreamingHttpResponse under ASGI. Given a plain iterator
+    there, Django reads all of it with sync_to_async(list) before sending a
+    byte; this pulls STREAM_LINES lines at a time in the worker thread.
+    """
+    lines = iter(lines)
+    while chunk := await sync_to_async(_next_lines)(lines):
+        yield chunk
+
+
+def filename(dataset, file_format, start=None, end=None, publisher=None):
+    parts = [dataset]
+    if publisher is not None:
+        parts.append(publisher.username)
+    if start or end:
+        parts.append(f'{start or "start"}_to_{end or "today"}')
+    return '-'.join(parts) + '.' + file_format
@@ -1,3 +1,6 @@
+import re
+import zipfile
+
 from django import forms
 from django.contrib.auth.models import User
 from .models import Review, Book  # Added Book to imports
@@ -38,11 +41,20 @@ class PublisherSignUpForm(forms.ModelForm):
 
 # 3. NEW: ADD BOOK FORM (For Publishers)
 class BookForm(forms.ModelForm):
+    # Longer than the column so "978-0-14-044913-6" fits; stored without dashes
+    isbn = forms.CharField(
+        label="ISBN", required=False, max_length=17,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Optional, 10 or 13 digits'}),
+    )
+
     class Meta:
         model = Book
         # We exclude 'publisher' because we will fill that automatically in the view
         # We exclude 'created_at'/updated_at as they are automatic
-        exclude = ['publisher', 'created_at', 'updated_at', 'is_bestseller'] 
+        # and the rating_* columns, which only reviews may change
+        # (image_variants is generated from the uploaded image)
+        exclude = ['publisher', 'created_at', 'updated_at', 'is_bestseller',
+                   'rating_count', 'rating_sum', 'rating_avg', 'image_variants']
         
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control'}),
@@ -52,4 +64,36 @@ class BookForm(forms.ModelForm):
             'stock': forms.NumberInput(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
             # Image widget usually handles itself, but you can add class if needed
-        }
\ No newline at end of file
+        }
+
+    def clean_isbn(self):
+        # Stored without dashes or spaces; blank becomes NULL (not unique)
+        isbn = re.sub(r'[\s-]', '', self.cleaned_data.get('isbn') or '').upper()
+        if not isbn:
+            return None
+        if not re.fullmatch(r'\d{9}[\dX]|\d{13}', isbn):
+            raise forms.ValidationError("Enter a 10 or 13 digit ISBN.")
+        return isbn
+
+# 4. BULK IMPORT (For Publishers; see catalog_import.py)
+class BookImportUploadForm(forms.Form):
+    file = forms.FileField(
+        help_text="CSV with a header row (isbn, title, author, category, description, price, stock, image) "
+                  "or JSON Lines (.jsonl) with the same keys. Categories are given by slug.",
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv,.jsonl,.ndjson'}),
+    )
+    images = forms.FileField(
+        required=False,
+        help_text="Optional zip archive with the cover images named in the image column.",
+        widget=forms.ClearableFileInput(attrs={'accept': '.zip'}),
+    )
+
+    def clean_images(self):
+        # Checked here: the import itself runs later, in the background
+        archive = self.cleaned_data.get('images')
+        if archive:
+            valid = zipfile.is_zipfile(archive)
+            archive.seek(0)
+            if not valid:
+                raise forms.ValidationError("Images must be a zip archive.")
+        return archive
@@ -0,0 +1,75 @@
+import uuid
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .metrics import registry
+
+CARD_CACHE_TIMEOUT = 24 * 60 * 60
+CARD_TEMPLATES = {
+    'card': 'partials/book_card.html',        # catalog, search, recommendations
+    'related': 'partials/related_card.html',  # "You might also like"
+}
+
+
+# --- 1. PER-BOOK VERSIONS ---
+# Each book has a version token in the cache. Rendered cards are stored
+# under a key containing it, so changing a book (or its reviews) only needs
+# a new token; the old cards are never read again and simply expire.
+
+def _version_key(book_id):
+    return f'card:version:{book_id}'
+
+
+def bump_versions(book_ids):
+    cache.set_many({_version_key(book_id): uuid.uuid4().hex for book_id in set(book_ids)}, None)
+
+
+def _versions(book_ids):
+    keys = {book_id: _version_key(book_id) for book_id in book_ids}
+    found = cache.get_many(keys.values())
+    missing = {key: uuid.uuid4().hex for key in keys.values() if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {book_id: found[key] for book_id, key in keys.items()}
+
+
+# --- 2. RENDERING ---
+
+def _card_key(variant, book, version):
+    # is_new is part of the key so the "NEW RELEASE" badge disappears on
+    # time without anyone having to invalidate the card
+    return f'card:{variant}:{book.pk}:{version}:{int(book.is_new)}'
+
+
+def render_cards(books, variant='card'):
+    """
+    HTML for a list of book cards, in order. A grid costs two cache
+    get_many() calls; only cards missing from the cache are rendered (and
+    stored with one set_many()).
+
+    Cards carrying per-request data (search snippets) are always rendered.
+    """
+    template_name = CARD_TEMPLATES[variant]
+    books = list(books)
+    cacheable = [book for book in books if not getattr(book, 'search_snippet', None)]
+
+    versions = _versions([book.pk for book in cacheable]) if cacheable else {}
+    keys = {book.pk: _card_key(variant, book, versions[book.pk]) for book in cacheable}
+    cached = cache.get_many(keys.values()) if keys else {}
+
+    html, fresh = [], {}
+    for book in books:
+        key = keys.get(book.pk)
+        card = cached.get(key) if key else None
+        if card is None:
+            card = render_to_string(template_name, {'book': book})
+            if key:
+                fresh[key] = card
+        html.append(card)
+
+    if fresh:
+        cache.set_many(fresh, CARD_CACHE_TIMEOUT)
+    registry.record_cache('fragments', hits=len(keys) - len(fresh), misses=len(fresh))
+    return ''.join(html)
@@ -0,0 +1,181 @@
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .fragments import bump_versions
+from .page_cache import bump_tags
+from .read_model import invalidate_books
+from .models import Book
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (160, 320, 640, 960)
+VARIANT_FORMATS = {
+    # format: (Pillow name, extension, save options)
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+VARIANT_DIR = 'variants'
+
+
+# --- 1. GENERATING VARIANTS ---
+# Book.image_variants looks like:
+#   {"source": "books/cover.jpg", "width": 1200, "height": 1800,
+#    "webp": {"160": "variants/books/cover.jpg-160.3f2a9c81d0e4.webp", ...},
+#    "jpeg": {"160": "variants/books/cover.jpg-160.77b0c1e25a9f.jpg", ...}}
+# "source" is the image the variants were made from, so a re-upload (new
+# file name) is noticed and an unchanged image is never processed twice.
+# Variant names carry the whole source name (cover.jpg and cover.png are
+# different books) and a hash of their own bytes, and existing files are
+# never overwritten, so a variant URL always means the same image.
+# A file that can't be read as an image gets {"source": ..., "failed": true}
+# instead, so it isn't queued again on every save; re-uploading retries it.
+
+def variant_name(source, width, extension, data):
+    digest = hashlib.md5(data, usedforsecurity=False).hexdigest()[:12]
+    return f'{VARIANT_DIR}/{source}-{width}.{digest}.{extension}'
+
+
+def generate_variants(source, storage=None):
+    """
+    Resize one uploaded image to every width in VARIANT_WIDTHS (never
+    upscaling) in WebP and JPEG. Returns the image_variants dict (a failed
+    marker if the file can't be read as an image), or None if Pillow isn't
+    installed.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        logger.warning("Pillow is not installed; skipping image variants for %s", source)
+        return None
+
+    storage = storage or default_storage
+    try:
+        with storage.open(source, 'rb') as fh:
+            original = Image.open(fh)
+            original.load()
+    except (OSError, Image.DecompressionBombError) as exc:
+        logger.warning("Could not read %s as an image: %s", source, exc)
+        return {'source': source, 'failed': True}
+
+    # Phone photos are often stored sideways with an EXIF rotation flag
+    original = ImageOps.exif_transpose(original)
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+
+    widths = [width for width in VARIANT_WIDTHS if width < original.width]
+    if original.width < VARIANT_WIDTHS[-1]:
+        # Small originals: also keep a copy at full size for 2x screens
+        widths.append(original.width)
+    variants = {'source': source, 'width': original.width, 'height': original.height}
+    for key, (pil_format, extension, options) in VARIANT_FORMATS.items():
+        variants[key] = {}
+        for width in widths:
+            height = round(original.height * width / original.width)
+            resized = original.resize((width, height), Image.LANCZOS)
+            if pil_format == 'JPEG' and resized.mode != 'RGB':
+                # JPEG has no alpha channel; flatten onto white
+                background = Image.new('RGB', resized.size, 'white')
+                background.paste(resized, mask=resized.getchannel('A'))
+                resized = background
+
+            buffer = io.BytesIO()
+            resized.save(buffer, pil_format, **options)
+            data = buffer.getvalue()
+            # save() picks a free name if this one is taken, e.g. by the
+            # previous run's files that are still in use until we're done
+            variants[key][str(width)] = storage.save(variant_name(source, width, extension, data), ContentFile(data))
+    return variants
+
+
+def delete_variants(variants, storage=None):
+    storage = storage or default_storage
+    for key in VARIANT_FORMATS:
+        for name in (variants or {}).get(key, {}).values():
+            storage.delete(name)
+
+
+def needs_variants(book):
+    return bool(book.image) and (book.image_variants or {}).get('source') != book.image.name
+
+
+def process_book_image(book_id, force=False):
+    """
+    Build the variants of a book's cover and switch the book over to them.
+    force=True rebuilds them even if they look up to date. Returns True if
+    the book got new variants.
+    """
+    book = Book.objects.filter(pk=book_id).only('id', 'image', 'image_variants').first()
+    if book is None or not book.image or not (force or needs_variants(book)):
+        return False
+
+    variants = generate_variants(book.image.name)
+    if variants is None:
+        return False
+
+    # Plain UPDATE: no signals, and it's a no-op if the image was replaced
+    # again while we were resizing (that upload has its own job queued)
+    updated = Book.objects.filter(pk=book_id, image=book.image.name).update(image_variants=variants, updated_at=timezone.now())
+    if not updated:
+        delete_variants(variants)
+        return False
+    # Cached cards still point at the original or the old variants, which
+    # are only deleted once nothing new refers to them
+    bump_versions([book_id])
+    bump_tags('books')
+    invalidate_books([book_id])
+    delete_variants(book.image_variants)
+    return not variants.get('failed')
+
+
+# --- 2. BACKGROUND WORKERS ---
+# Resizing a large photo takes a second or more, so uploads (add_book,
+# edit_book, imports) hand the work to a small thread pool after the
+# transaction commits. Templates fall back to the original file until the
+# variants exist. BOOK_IMAGE_WORKERS = 0 processes inline instead.
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, 'BOOK_IMAGE_WORKERS', 2)
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='book-images')
+    return _executor
+
+
+def _run(book_id):
+    try:
+        process_book_image(book_id)
+    except Exception:
+        logger.exception("Generating image variants for book %s failed", book_id)
+
+
+def _run_in_worker(book_id):
+    try:
+        _run(book_id)
+    finally:
+        # Worker threads get their own connections; don't leak them
+        connections.close_all()
+
+
+def schedule_variants(book):
+    if not needs_variants(book):
+        return
+    book_id = book.pk
+
+    def submit():
+        if getattr(settings, 'BOOK_IMAGE_WORKERS', 2) == 0:
+            _run(book_id)
+        else:
+            _get_executor().submit(_run_in_worker, book_id)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from ... import benchmark, synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests per second of home, book_detail, cart_view and "
+        "profile under WSGI (sync views, a thread per client) and ASGI "
+        "(async views, a coroutine per client), in process, against a "
+        "throwaway test database filled by the synthetic data generator."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000, help="Dataset size, in books.")
+        parser.add_argument('--requests', type=int, default=200, help="Timed requests per view and mode.")
+        parser.add_argument('--concurrency', type=int, default=16, help="Clients sending requests at once.")
+        parser.add_argument('--warmup', type=int, default=10, help="Untimed requests per view and mode first.")
+        parser.add_argument('--only', help="Comma-separated scenario names to run.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='benchmark_asgi.json', help="Where to write the JSON results.")
+
+    def handle(self, *args, **options):
+        only = set(options['only'].split(',')) if options['only'] else None
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.stdout.write("Dataset with %d books..." % options['books'])
+            synthetic.generate(seed=options['seed'], **benchmark.dataset_for(options['books']))
+            results = benchmark.run_throughput(
+                requests=options['requests'], concurrency=options['concurrency'],
+                warmup=options['warmup'], only=only, log=self.stdout.write,
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {**benchmark.metadata(), 'books': options['books'], 'concurrency': options['concurrency']},
+            'results': results,
+        }
+        with open(options['output'], 'w') as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS("Wrote %s" % options['output']))
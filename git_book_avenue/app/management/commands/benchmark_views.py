@@ -0,0 +1,62 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from ... import benchmark, synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every view in app/urls.py through the test client at several "
+        "dataset sizes and write the results as JSON. Runs against a "
+        "throwaway test database filled by the synthetic data generator, so "
+        "the real database is never touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='200,2000',
+                            help="Comma-separated dataset sizes, in books (default 200,2000).")
+        parser.add_argument('--repeat', type=int, default=10, help="Timed requests per view.")
+        parser.add_argument('--warmup', type=int, default=2, help="Untimed requests per view first.")
+        parser.add_argument('--cold', action='store_true',
+                            help="Clear all caches before every request (worst case).")
+        parser.add_argument('--only', help="Comma-separated scenario names to run.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='benchmark.json', help="Where to write the JSON results.")
+        parser.add_argument('--compare', help="A previous results file to compare medians against.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers")
+        only = set(options['only'].split(',')) if options['only'] else None
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = {}
+            for size in sizes:
+                call_command('flush', interactive=False, verbosity=0)
+                self.stdout.write("Dataset with %d books..." % size)
+                synthetic.generate(seed=options['seed'], **benchmark.dataset_for(size))
+                results[str(size)] = benchmark.run_benchmarks(
+                    repeat=options['repeat'], warmup=options['warmup'], only=only, cold=options['cold'],
+                    log=self.stdout.write,
+                )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        report = {'meta': {**benchmark.metadata(), 'cold': options['cold']}, 'results': results}
+        with open(options['output'], 'w') as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS("Wrote %s" % options['output']))
+
+        if options['compare']:
+            for line in benchmark.compare(benchmark.load(options['compare']), report):
+                self.stdout.write(line)
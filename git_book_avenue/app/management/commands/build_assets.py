@@ -0,0 +1,45 @@
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import assets
+
+
+class Command(BaseCommand):
+    help = (
+        "Build STATIC_ROOT for deployment: collectstatic with minified CSS/JS "
+        "and content-hashed names (staticfiles.json), then .gz and .br "
+        "(if brotli is installed) copies of every text file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true',
+                            help="Delete STATIC_ROOT first. Without it, files from earlier builds stay, "
+                                 "for pages still referring to them.")
+
+    def handle(self, *args, **options):
+        if not settings.STATIC_ROOT:
+            raise CommandError("Set STATIC_ROOT first.")
+        call_command('collectstatic', interactive=False, clear=options['clear'], verbosity=0)
+        manifest, _ = staticfiles_storage.load_manifest()
+
+        compressed = 0
+        for root, _, files in os.walk(settings.STATIC_ROOT):
+            for name in files:
+                if name.endswith(assets.COMPRESSIBLE):
+                    compressed += bool(assets.precompress(os.path.join(root, name)))
+
+        for name in sorted(manifest):
+            if name.startswith(assets.MINIFY_PREFIXES):
+                path = staticfiles_storage.path(manifest[name])
+                variants = ', '.join(
+                    f'{suffix} {os.path.getsize(path + suffix):,}'
+                    for suffix in ('.gz', '.br') if os.path.exists(path + suffix)
+                )
+                self.stdout.write(f"  {manifest[name]}: {os.path.getsize(path):,} bytes" + (f" ({variants})" if variants else ""))
+        self.stdout.write(self.style.SUCCESS(
+            "%d files in %s, %d precompressed" % (len(manifest), settings.STATIC_ROOT, compressed)
+        ))
@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from ...images import needs_variants, process_book_image
+from ...models import Book
+
+
+def _process(book_id, force=False):
+    try:
+        return process_book_image(book_id, force=force)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the resized WebP/JPEG variants of every book cover that "
+        "doesn't have up-to-date ones yet (e.g. images uploaded before the "
+        "variant pipeline existed)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Regenerate variants even if they look up to date.")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Images resized in parallel (default 4).")
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(image='').only('id', 'image', 'image_variants')
+        if options['force']:
+            # Each book keeps its current variants until its new ones are in
+            book_ids = list(books.values_list('id', flat=True))
+        else:
+            book_ids = [book.id for book in books.iterator() if needs_variants(book)]
+
+        self.stdout.write("Resizing %d image(s)..." % len(book_ids))
+        if options['workers'] <= 1:
+            # One at a time on this thread and its connection
+            done = sum(process_book_image(book_id, force=options['force']) for book_id in book_ids)
+        else:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                done = sum(pool.map(partial(_process, force=options['force']), book_ids))
+
+        skipped = len(book_ids) - done
+        self.stdout.write(self.style.SUCCESS(
+            "Built variants for %d book(s)%s." % (done, ", %d skipped (unreadable or missing)" % skipped if skipped else "")
+        ))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...recommendations import build_similarity
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the co-purchase similarity table behind 'Recommended For You' "
+        "from paid orders. Needs numpy and scipy; run it nightly (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, default=20,
+                            help="Neighbours kept per book (default 20).")
+        parser.add_argument('--min-score', type=float, default=0.0,
+                            help="Drop pairs with a cosine score at or below this.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            written = build_similarity(top_n=options['top_n'], min_score=options['min_score'])
+        except ImportError as exc:
+            raise CommandError("build_recommendations needs numpy and scipy (%s)." % exc)
+
+        self.stdout.write(self.style.SUCCESS(
+            "Stored %d book neighbours in %.1fs." % (written, time.monotonic() - started)
+        ))
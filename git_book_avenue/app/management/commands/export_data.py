@@ -0,0 +1,57 @@
+import datetime
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ... import exports
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError("Dates look like 2024-01-31, not %r" % value)
+
+
+class Command(BaseCommand):
+    help = (
+        "Write orders, order items or daily per-book sales as CSV or JSON Lines, "
+        "streamed from the database in chunks (constant memory), e.g. for "
+        "scheduled dumps from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(exports.DATASETS))
+        parser.add_argument('--format', choices=exports.FORMATS, default='csv')
+        parser.add_argument('--start', type=_date, help="First day to include (YYYY-MM-DD).")
+        parser.add_argument('--end', type=_date, help="Last day to include (YYYY-MM-DD).")
+        parser.add_argument('--yesterday', action='store_true', help="Shortcut for --start and --end yesterday.")
+        parser.add_argument('--publisher', help="Only this publisher's books (username).")
+        parser.add_argument('--output', '-o', help="File to write; default stdout.")
+
+    def handle(self, *args, **options):
+        start, end = options['start'], options['end']
+        if options['yesterday']:
+            start = end = timezone.localdate() - datetime.timedelta(days=1)
+
+        publisher = None
+        if options['publisher']:
+            if not exports.DATASETS[options['dataset']]['per_publisher']:
+                raise CommandError("%s can't be limited to one publisher" % options['dataset'])
+            try:
+                publisher = User.objects.get(username=options['publisher'])
+            except User.DoesNotExist:
+                raise CommandError("No user named %r" % options['publisher'])
+
+        lines = exports.export(options['dataset'], options['format'], start, end, publisher)
+        if not options['output']:
+            sys.stdout.writelines(lines)
+            return
+        count = -1 if options['format'] == 'csv' else 0  # minus the header
+        with open(options['output'], 'w', newline='', encoding='utf-8') as fh:
+            for line in lines:
+                fh.write(line)
+                count += 1
+        self.stderr.write(self.style.SUCCESS("Wrote %d rows to %s" % (count, options['output'])))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from ... import synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic store for load testing: categories, "
+        "books, customers, publishers, and orders/reviews with a realistic skew "
+        "(a few bestsellers, a long tail). Generated users can log in with the "
+        "password '%s'." % synthetic.PASSWORD
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--books', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=200, help="Customers.")
+        parser.add_argument('--publishers', type=int, default=10)
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--reviews', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=180, help="Spread orders over this many days.")
+        parser.add_argument('--seed', type=int, default=0, help="Same seed, same data.")
+        parser.add_argument('--clear', action='store_true',
+                            help="Delete previously generated data first (real data is kept).")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            synthetic.clear()
+            self.stdout.write("Removed previous synthetic data.")
+
+        counts = synthetic.generate(
+            categories=options['categories'], books=options['books'], users=options['users'],
+            publishers=options['publishers'], orders=options['orders'], reviews=options['reviews'],
+            days=options['days'], seed=options['seed'],
+            log=lambda message: self.stdout.write("  " + message),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "Generated " + ", ".join("%d %s" % (n, name) for name, n in counts.items()) + "."
+        ))
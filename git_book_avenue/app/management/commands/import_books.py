@@ -0,0 +1,66 @@
+import csv
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import catalog_import
+
+
+class Command(BaseCommand):
+    help = (
+        "Import books from a CSV file (with a header row) or JSON Lines, "
+        "streamed and written in batches. Rows are validated with the same "
+        "rules as the add-book form, categories are given by slug, and books "
+        "with an ISBN are updated if it already exists."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file, or - for stdin.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Default: from the file extension (csv for stdin).")
+        parser.add_argument('--publisher', help="Username of the publisher the books belong to.")
+        parser.add_argument('--images', help="Directory or zip archive with the files named in the image column.")
+        parser.add_argument('--batch-size', type=int, default=catalog_import.IMPORT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Validate every row, write nothing.")
+        parser.add_argument('--show-errors', type=int, default=20, help="How many row errors to print.")
+
+    def handle(self, *args, **options):
+        publisher = None
+        if options['publisher']:
+            try:
+                publisher = User.objects.get(username=options['publisher'])
+            except User.DoesNotExist:
+                raise CommandError("No user named %r" % options['publisher'])
+
+        try:
+            image_source = catalog_import.ImageSource(options['images']) if options['images'] else None
+        except catalog_import.InvalidImportFile as e:
+            raise CommandError(e)
+
+        path = options['path']
+        file_format = options['format'] or ('csv' if path == '-' else catalog_import.detect_format(path))
+        fh = sys.stdin.buffer if path == '-' else open(path, 'rb')
+
+        def progress(result):
+            self.stdout.write("  %d rows: %d created, %d updated, %d failed" % (
+                result.rows, result.created, result.updated, result.failed,
+            ))
+
+        try:
+            result = catalog_import.import_books(
+                catalog_import.read_rows(fh, file_format), publisher=publisher, image_source=image_source,
+                batch_size=options['batch_size'], dry_run=options['dry_run'], progress=progress,
+            )
+        except (catalog_import.InvalidImportFile, UnicodeDecodeError, csv.Error) as e:
+            raise CommandError(e)
+        finally:
+            if fh is not sys.stdin.buffer:
+                fh.close()
+
+        for line, message in result.errors[:options['show_errors']]:
+            self.stderr.write("line %d: %s" % (line, message))
+        summary = "%s%d created, %d updated, %d failed" % (
+            "Dry run: " if options['dry_run'] else "", result.created, result.updated, result.failed,
+        )
+        self.stdout.write(self.style.SUCCESS(summary) if not result.failed else self.style.WARNING(summary))
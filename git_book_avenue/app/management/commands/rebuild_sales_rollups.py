@@ -0,0 +1,26 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily sales rollups (per day, per book, per category) "
+        "from paid orders. Use after editing orders in the admin or importing data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD). Default: all history.")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD). Default: today.")
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.date.fromisoformat(options['start']) if options['start'] else None
+            end = datetime.date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        days = rebuild_rollups(start=start, end=end)
+        self.stdout.write(self.style.SUCCESS("Rebuilt sales rollups for %d day(s) with sales." % days))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from ...search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Drop and rebuild the full-text book search index from the Book table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        self.stdout.write("Rebuilding search index with %s..." % type(backend).__name__)
+
+        def progress(done):
+            self.stdout.write("  %d books indexed" % done)
+
+        total = backend.rebuild(batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS("Indexed %d books." % total))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from ...ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill/repair Book.rating_count, rating_sum and rating_avg from the "
+        "Review table. Only books whose counters drifted are written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report drifted books without fixing them.")
+
+    def handle(self, *args, **options):
+        books = reconcile_ratings(dry_run=options['dry_run'])
+        for book in books:
+            self.stdout.write("  #%d %s: count %d -> %d, sum %d -> %d" % (
+                book.id, book.title, book.stored_count, book.real_count, book.stored_sum, book.real_sum,
+            ))
+        verb = "would fix" if options['dry_run'] else "fixed"
+        self.stdout.write(self.style.SUCCESS("%s %d book(s)." % (verb.capitalize(), len(books))))
@@ -0,0 +1,43 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into every read replica "
+        "(DATABASE_REPLICAS), with SQLite's online backup. Stands in for "
+        "real replication when trying replicas out locally; --every keeps "
+        "copying, which also gives them a realistic lag."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, metavar='SECONDS', help="Repeat until interrupted.")
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        replicas = [settings.DATABASES[alias] for alias in settings.DATABASE_REPLICAS]
+        if not replicas:
+            raise CommandError("No replicas configured; set BOOK_AVENUE_DB_REPLICAS.")
+        if any(db['ENGINE'] != 'django.db.backends.sqlite3' for db in [primary] + replicas):
+            raise CommandError("sync_replicas only copies SQLite databases.")
+
+        while True:
+            start = time.perf_counter()
+            source = sqlite3.connect(primary['NAME'])
+            try:
+                for replica in replicas:
+                    target = sqlite3.connect(replica['NAME'])
+                    try:
+                        source.backup(target)
+                    finally:
+                        target.close()
+            finally:
+                source.close()
+            self.stdout.write("Copied to %d replica(s) in %.2fs" % (len(replicas), time.perf_counter() - start))
+            if not options['every']:
+                break
+            time.sleep(options['every'])
@@ -0,0 +1,135 @@
+import bisect
+import re
+import threading
+from collections import defaultdict
+
+# In-process metrics registry, rendered in the Prometheus text format by
+# the /metrics/ view. Every worker process keeps its own numbers (that's
+# how Prometheus expects to scrape them); nothing here touches the
+# database or the cache, so recording a request costs a few dict updates.
+
+PREFIX = 'bookavenue'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.queries = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+            self.counters = defaultdict(int)
+
+    def record_request(self, view, method, status, duration, stats):
+        with self._lock:
+            self.latency[(view, method)].observe(duration)
+            self.queries[(view,)].observe(stats.query_count)
+            self.counters[('requests_total', view, method, f'{status // 100}xx')] += 1
+            self.counters[('sql_seconds_total', view)] += stats.query_time
+            self.counters[('template_seconds_total', view)] += stats.template_time
+            if stats.n_plus_one:
+                self.counters[('n_plus_one_suspects_total', view)] += 1
+
+    def record_cache(self, cache_name, hits=0, misses=0):
+        with self._lock:
+            if hits:
+                self.counters[('cache_hits_total', cache_name)] += hits
+            if misses:
+                self.counters[('cache_misses_total', cache_name)] += misses
+
+    def render(self, extra=()):
+        """
+        The Prometheus text exposition of everything recorded so far, plus
+        `extra` metrics read from elsewhere at scrape time, as
+        (name, kind, label_names, help, [(label_values, value), ...]).
+        """
+        with self._lock:
+            lines = []
+            _histograms(lines, 'request_duration_seconds', "Time spent in the view stack, per view.",
+                        ('view', 'method'), self.latency)
+            _histograms(lines, 'request_sql_queries', "SQL queries per request, per view.",
+                        ('view',), self.queries)
+            for name, labels, help_text in COUNTERS:
+                rows = [(key[1:], value) for key, value in self.counters.items() if key[0] == name]
+                _header(lines, name, 'counter', help_text)
+                for values, value in sorted(rows):
+                    lines.append(f'{PREFIX}_{name}{_labels(labels, values)} {_number(value)}')
+        for name, kind, labels, help_text, rows in extra:
+            _header(lines, name, kind, help_text)
+            for values, value in rows:
+                lines.append(f'{PREFIX}_{name}{_labels(labels, values)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+COUNTERS = [
+    ('requests_total', ('view', 'method', 'status'), "Requests handled, per view and status class."),
+    ('sql_seconds_total', ('view',), "Time spent in SQL, per view."),
+    ('template_seconds_total', ('view',), "Time spent rendering templates, per view."),
+    ('n_plus_one_suspects_total', ('view',), "Requests that repeated one SQL statement shape many times."),
+    ('cache_hits_total', ('cache',), "Cache hits, per cache layer."),
+    ('cache_misses_total', ('cache',), "Cache misses, per cache layer."),
+]
+
+
+def _header(lines, name, kind, help_text):
+    lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+    lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histograms(lines, name, help_text, label_names, histograms):
+    _header(lines, name, 'histogram', help_text)
+    for values, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+            cumulative += count
+            labels = _labels(label_names + ('le',), values + (bound,))
+            lines.append(f'{PREFIX}_{name}_bucket{labels} {cumulative}')
+        labels = _labels(label_names, values)
+        lines.append(f'{PREFIX}_{name}_sum{labels} {histogram.sum!r}')
+        lines.append(f'{PREFIX}_{name}_count{labels} {histogram.count}')
+
+
+registry = Registry()
+
+
+# --- SQL SHAPES (N+1 detection) ---
+# Django hands the wrapper SQL with %s placeholders, so the same ORM call in
+# a loop produces the exact same string; only IN (...) lists vary in length.
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def sql_shape(sql):
+    return _IN_LIST.sub('IN (...)', sql)
@@ -0,0 +1,183 @@
+import contextvars
+import logging
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import replicas
+from .metrics import registry, sql_shape
+
+logger = logging.getLogger(__name__)
+
+# A request running the same statement shape this many times is reported
+# as a suspected N+1 (a query inside a loop)
+N_PLUS_ONE_THRESHOLD = 10
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('query_count', 'query_time', 'template_time', 'template_depth', 'shapes', 'n_plus_one')
+
+    def __init__(self):
+        self.query_count = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.shapes = Counter()
+        self.n_plus_one = []
+
+    def check_n_plus_one(self, threshold):
+        self.n_plus_one = [(shape, n) for shape, n in self.shapes.items() if n >= threshold]
+
+
+def _record_sql(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.query_time += time.perf_counter() - start
+        stats.query_count += 1
+        stats.shapes[sql_shape(sql)] += 1
+
+
+def _install_recorder():
+    # _record_sql stays installed on each connection and only counts for
+    # the request in _current: under ASGI concurrent requests share the
+    # worker thread's connections, so per-request wrappers would pile up
+    for connection in connections.all():
+        if _record_sql not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_record_sql)
+
+
+_templates_instrumented = False
+
+
+def _instrument_templates():
+    # Time the outermost Template.render() of each request; cards rendered
+    # from inside a template (render_to_string in a tag) are nested calls
+    # and already included in their parent's time
+    global _templates_instrumented
+    if _templates_instrumented:
+        return
+    from django.template.backends.django import Template
+
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return original(self, context, request)
+        stats.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - start
+
+    Template.render = render
+    _templates_instrumented = True
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unresolved'
+
+
+class PerformanceMiddleware:
+    """
+    Records, per view: latency, SQL query count and time, template render
+    time and page-cache hits, into metrics.registry (served at /metrics/).
+    Requests that repeat one SQL shape N_PLUS_ONE_THRESHOLD times or more
+    are counted and logged as suspected N+1 patterns.
+
+    Put it near the top of MIDDLEWARE so the timing covers the rest.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD)
+        _instrument_templates()
+        # Under ASGI stay async, so async views aren't pushed into a thread
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            _install_recorder()
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        # The ORM runs async queries (and sync_to_async code) in a worker
+        # thread with its own connections; the stats travel there with the
+        # context
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            await sync_to_async(_install_recorder)()
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - start)
+
+    def _finish(self, request, response, stats, duration):
+        view = _view_name(request)
+        stats.check_n_plus_one(self.threshold)
+        registry.record_request(view, request.method, response.status_code, duration, stats)
+
+        page_cache = response.get('X-Cache')
+        if page_cache in ('HIT', 'MISS'):
+            registry.record_cache('page', hits=int(page_cache == 'HIT'), misses=int(page_cache == 'MISS'))
+
+        for shape, count in stats.n_plus_one:
+            logger.warning("Possible N+1 in %s: %d x %s", view, count, shape[:300])
+        return response
+
+
+class ReplicaPinMiddleware:
+    """
+    Sets up the read-replica routing for each request (see replicas.py):
+    views marked @read_from_replica read from a replica, and a request that
+    wrote to the database pins the browser to the primary for a while with
+    a short-lived cookie.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = replicas.start_request(request)
+        return replicas.finish_request(token, self.get_response(request))
+
+    async def __acall__(self, request):
+        token = replicas.start_request(request)
+        return replicas.finish_request(token, await self.get_response(request))
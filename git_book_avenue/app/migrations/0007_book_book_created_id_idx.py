@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_order_zip_code_alter_order_address_alter_order_city_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-created_at', '-id'], name='book_created_id_idx'),
+        ),
+    ]
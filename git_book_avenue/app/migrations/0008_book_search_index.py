@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # The FTS5 table backs store.search.backends.SQLiteFTS5Backend; other
+    # databases use their own backend and need nothing here.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS store_book_fts "
+        "USING fts5(title, author, description, category, "
+        "tokenize = 'porter unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO store_book_fts (rowid, title, author, description, category) "
+        "SELECT store_book.id, store_book.title, store_book.author, store_book.description, store_category.name "
+        "FROM store_book JOIN store_category ON store_category.id = store_book.category_id"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS store_book_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_book_book_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_book_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='store.book')),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbour_of', to='store.book')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['book', '-score'], name='similarity_book_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('book', 'neighbour'), name='unique_book_neighbour')],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    Book = apps.get_model('store', 'Book')
+    Review = apps.get_model('store', 'Review')
+
+    totals = Review.objects.values('book_id').annotate(count=Count('id'), total=Sum('rating'))
+    books = []
+    for row in totals:
+        books.append(Book(
+            id=row['book_id'],
+            rating_count=row['count'],
+            rating_sum=row['total'] or 0,
+            rating_avg=(row['total'] or 0) / row['count'],
+        ))
+    Book.objects.bulk_update(books, ['rating_count', 'rating_sum', 'rating_avg'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_booksimilarity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-rating_avg', '-id'], name='book_rating_id_idx'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
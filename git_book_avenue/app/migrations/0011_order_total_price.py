@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:43
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_order_totals(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+
+    line_total = ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=10, decimal_places=2))
+    totals = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .order_by().values('order')
+        .annotate(total=Sum(line_total)).values('total')
+    )
+    Order.objects.update(total_price=Coalesce(Subquery(totals), 0, output_field=DecimalField(max_digits=10, decimal_places=2)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_book_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
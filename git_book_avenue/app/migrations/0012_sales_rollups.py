@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_rollups(apps, schema_editor):
+    OrderItem = apps.get_model('store', 'OrderItem')
+    targets = [
+        (apps.get_model('store', 'DailySales'), {}),
+        (apps.get_model('store', 'DailyBookSales'), {'book_id': 'book_id'}),
+        (apps.get_model('store', 'DailyCategorySales'), {'category_id': 'book__category_id'}),
+    ]
+    items = OrderItem.objects.filter(order__paid=True).annotate(
+        day=TruncDate('order__created_at', tzinfo=timezone.get_current_timezone()),
+        line_total=ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+    ).order_by()
+    for model, fields in targets:
+        rows = items.values('day', *fields.values()).annotate(
+            n_orders=Count('order', distinct=True), n_units=Sum('quantity'), n_revenue=Sum('line_total'),
+        )
+        model.objects.bulk_create([
+            model(date=row['day'], orders=row['n_orders'], units=row['n_units'] or 0, revenue=row['n_revenue'] or 0,
+                  **{field: row[key] for field, key in fields.items()})
+            for row in rows
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_order_total_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyBookSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='store.book')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily book sales',
+                'constraints': [models.UniqueConstraint(fields=('date', 'book'), name='unique_daily_book_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='store.category')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily category sales',
+                'constraints': [models.UniqueConstraint(fields=('date', 'category'), name='unique_daily_category_sales')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
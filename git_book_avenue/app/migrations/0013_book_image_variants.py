@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
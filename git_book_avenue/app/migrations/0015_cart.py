@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_carts(apps, schema_editor):
+    # Users already logged in keep their session without logging in again,
+    # so give everyone a cart now (new logins create theirs)
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Cart = apps.get_model('store', 'Cart')
+    Cart.objects.bulk_create(
+        (Cart(user_id=user_id) for user_id in User.objects.values_list('pk', flat=True).iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('store', '0014_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cart',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='cart', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CartItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='store.book')),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='store.cart')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cart', 'book'), name='unique_cart_book')],
+            },
+        ),
+        migrations.RunPython(create_carts, migrations.RunPython.noop),
+    ]
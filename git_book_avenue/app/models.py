@@ -6,6 +6,7 @@ from datetime import timedelta
 class Category(models.Model):
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -17,13 +18,46 @@ class Book(models.Model):
     category = models.ForeignKey(Category, related_name='books', on_delete=models.CASCADE)
     title = models.CharField(max_length=200)
     author = models.CharField(max_length=200)
+    # Natural key for bulk imports (import_books upserts on it); optional,
+    # books without one are always added as new
+    isbn = models.CharField("ISBN", max_length=13, unique=True, null=True, blank=True)
     publisher = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.FileField(upload_to='books/')
+    # Resized WebP/JPEG copies of image, filled in by images.py after upload
+    image_variants = models.JSONField(default=dict, blank=True)
     stock = models.IntegerField(default=10) # Default 10 copies per book
     is_bestseller = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Anything shown on the book's page. auto_now only covers save(), so
+    # queryset updates (ratings, stock, image variants) set it themselves;
+    # ETags are built from it (conditional.py)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized review stats, kept up to date by the Review signals in
+    # signals.py (and "manage.py reconcile_ratings" if they ever drift)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_avg = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the catalog walks (created_at, id) newest first
+            models.Index(fields=['-created_at', '-id'], name='book_created_id_idx'),
+            # ... or (rating_avg, id) for "Top rated"
+            models.Index(fields=['-rating_avg', '-id'], name='book_rating_id_idx'),
+            # Category pages and "related books", newest first
+            models.Index(fields=['category', '-created_at', '-id'], name='book_category_created_idx'),
+            # Publisher dashboard
+            models.Index(fields=['publisher', '-created_at'], name='book_publisher_created_idx'),
+            # Count and latest updated_at per category, for ETags (index only)
+            models.Index(fields=['category', 'updated_at'], name='book_category_updated_idx'),
+        ]
+
+    @property
+    def average_rating(self):
+        return round(self.rating_avg, 1)
+
     @property
     def is_new(self):
         # Returns True if the book was added in the last 72 hours (3 days)
@@ -44,6 +78,17 @@ class Order(models.Model):
     address = models.TextField(default="")
     city = models.CharField(max_length=100, default="")
     zip_code = models.CharField(max_length=20, default="")
+    # Stored when the order is placed, so listings don't re-add the items
+    total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            # Order history (profile), keyset-paginated newest first
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            # "Has this user bought ..." checks (reviews, recommendations)
+            models.Index(fields=['user', 'paid'], name='order_user_paid_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
     def get_total_cost(self):
@@ -55,9 +100,41 @@ class OrderItem(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        indexes = [
+            # Purchases of a book, joined to their order (verified-buyer check,
+            # publisher stats)
+            models.Index(fields=['book', 'order'], name='orderitem_book_order_idx'),
+        ]
+
     def get_cost(self):
         return self.price * self.quantity
     
+class Cart(models.Model):
+    """
+    A logged-in user's shopping cart (store/cart.py). Keyed by the user, so
+    the cart of a request is known without looking it up; created on login.
+    """
+    user = models.OneToOneField(User, primary_key=True, related_name='cart', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Cart of {self.user.username}"
+
+class CartItem(models.Model):
+    cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            # One row per book, so adding a book again is an upsert
+            models.UniqueConstraint(fields=['cart', 'book'], name='unique_cart_book'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.book_id} in cart {self.cart_id}"
+
 # --- Add this at the bottom of store/models.py ---
 
 class Review(models.Model):
@@ -67,9 +144,107 @@ class Review(models.Model):
     comment = models.TextField(max_length=500, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # A book's reviews, newest first (book_detail)
+            models.Index(fields=['book', '-created_at'], name='review_book_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.book.title} ({self.rating})"
 
+class BookSimilarity(models.Model):
+    # Item-item co-purchase neighbours, rebuilt in batch by
+    # "manage.py build_recommendations" (top N per book, highest score first)
+    book = models.ForeignKey(Book, related_name='neighbours', on_delete=models.CASCADE)
+    neighbour = models.ForeignKey(Book, related_name='neighbour_of', on_delete=models.CASCADE)
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'neighbour'], name='unique_book_neighbour'),
+        ]
+        indexes = [
+            models.Index(fields=['book', '-score'], name='similarity_book_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} -> {self.neighbour_id} ({self.score:.3f})"
+
+# --- Sales rollups: one row per day (and per book / category per day) ---
+# Updated by rollups.record_order() when an order is paid, rebuilt with
+# "manage.py rebuild_sales_rollups". The manager dashboard reads only these.
+
+class DailySales(models.Model):
+    date = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily sales"
+
+    def __str__(self):
+        return f"{self.date}: {self.orders} orders, ₹{self.revenue}"
+
+class DailyBookSales(models.Model):
+    date = models.DateField()
+    book = models.ForeignKey(Book, related_name='daily_sales', on_delete=models.CASCADE)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily book sales"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'book'], name='unique_daily_book_sales'),
+        ]
+
+class DailyCategorySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, related_name='daily_sales', on_delete=models.CASCADE)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily category sales"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='unique_daily_category_sales'),
+        ]
+
+# --- Catalog imports run in the background (catalog_import.start_import) ---
+
+class ImportJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    publisher = models.ForeignKey(User, related_name='import_jobs', on_delete=models.CASCADE)
+    # Storage names of the upload and the cover archive, deleted when done
+    file = models.CharField(max_length=255)
+    file_format = models.CharField(max_length=10, default='csv')
+    images = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # Progress so far, updated after every batch
+    rows = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)  # [[line, message], ...], the first few
+    message = models.TextField(blank=True)  # why the whole file was rejected
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def __str__(self):
+        return f"Import {self.pk} by {self.publisher.username} ({self.status})"
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     is_publisher = models.BooleanField(default=False)
@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Book, Order, OrderItem
+from . import page_cache, publisher_stats, read_model, rollups
+
+
+def place_order(user, cart, **shipping):
+    """
+    Turn the cart into a paid Order in one transaction.
+
+    Stock is reserved with a conditional UPDATE per book
+    ("stock = stock - n WHERE stock >= n"), so two customers racing for the
+    last copy can't both get it: the database decides, and the loser's
+    line simply comes back in `failed`. Items are written with one
+    bulk_create(), and the daily sales rollups are bumped in the same
+    transaction. Lines are locked in book id order so concurrent orders
+    on row-locking databases can't deadlock.
+
+    Returns (order, failed_lines); order is None if nothing could be bought,
+    in which case nothing was written.
+    """
+    reserved, failed = [], []
+
+    with transaction.atomic():
+        for line in sorted(cart.lines(), key=lambda line: line.book_id):
+            if line.is_missing:
+                failed.append(line)
+                continue
+            updated = Book.objects.filter(
+                pk=line.book_id, stock__gte=line.quantity
+            ).update(stock=F('stock') - line.quantity, updated_at=timezone.now())
+            if updated:
+                reserved.append(line)
+            else:
+                failed.append(line)
+
+        if not reserved:
+            return None, failed
+
+        order = Order.objects.create(
+            user=user,
+            paid=True,
+            total_price=sum(line.total for line in reserved),
+            **shipping
+        )
+        items = OrderItem.objects.bulk_create([
+            OrderItem(order=order, book=line.book, price=line.unit_price, quantity=line.quantity)
+            for line in reserved
+        ])
+        rollups.record_order(order, items)
+
+        # Sales figures on these publishers' dashboards are now stale
+        publishers = {line.book.publisher_id for line in reserved}
+        transaction.on_commit(lambda: publisher_stats.invalidate(publishers))
+        # Stock counts shown on book pages changed
+        transaction.on_commit(lambda: page_cache.bump_tags('books'))
+        reserved_ids = [line.book_id for line in reserved]
+        transaction.on_commit(lambda: read_model.invalidate_books(reserved_ids))
+
+    return order, failed
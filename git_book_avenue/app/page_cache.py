@@ -0,0 +1,130 @@
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+
+PAGE_CACHE_TIMEOUT = 5 * 60
+# Query parameters that change what the catalog pages show; anything else
+# (utm_*, fbclid, ...) is ignored so it can't fragment the cache
+PAGE_CACHE_PARAMS = ('q', 'category', 'sort', 'page', 'after', 'before')
+CACHE_HEADER = 'X-Cache'
+
+
+# --- 1. DEPENDENCY TAGS ---
+# Every cached page lists the tags it depends on ("books", "categories",
+# "reviews"). Each tag has a version in the cache that is part of the page
+# key, so bumping a tag (see signals.py) retires every page built on it.
+
+def _tag_key(tag):
+    return f'page:tag:{tag}'
+
+
+def bump_tags(*tags):
+    for tag in tags:
+        try:
+            cache.incr(_tag_key(tag))
+        except ValueError:
+            cache.set(_tag_key(tag), 2, None)
+
+
+def _tag_versions(tags):
+    keys = [_tag_key(tag) for tag in tags]
+    found = cache.get_many(keys)
+    missing = {key: 1 for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return '.'.join(str(found[key]) for key in keys)
+
+
+# --- 2. THE DECORATOR ---
+
+def page_cache_key(request, tags):
+    params = sorted(
+        (name, value)
+        for name in PAGE_CACHE_PARAMS
+        for value in request.GET.getlist(name)
+        if value
+    )
+    query = hashlib.md5(urlencode(params).encode()).hexdigest()
+    return f'page:{request.path}:{query}:{_tag_versions(tags)}'
+
+
+def cacheable_request(request):
+    # Logged-in pages show the cart, recommendations and review forms;
+    # a pending flash message is meant for this visitor only
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def _cacheable_response(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not response.has_header('Cache-Control')
+    )
+
+
+def _lookup(request, tags):
+    # (key, cached response); key is None when this request can't be cached
+    if not cacheable_request(request):
+        return None, None
+    key = page_cache_key(request, tags)
+    cached = cache.get(key)
+    if cached is None:
+        return key, None
+    content, content_type = cached
+    response = HttpResponse(content, content_type=content_type)
+    response[CACHE_HEADER] = 'HIT'
+    return key, response
+
+
+def _store(key, response, timeout):
+    if key is not None and _cacheable_response(response):
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+        cache.set(key, (response.content, response['Content-Type']), timeout)
+        response[CACHE_HEADER] = 'MISS'
+    else:
+        response[CACHE_HEADER] = 'BYPASS'
+    return response
+
+
+def anonymous_page_cache(*tags, timeout=PAGE_CACHE_TIMEOUT):
+    """
+    Cache the whole response of a view for anonymous visitors.
+
+        @anonymous_page_cache('books', 'categories')
+        def home(request): ...
+
+    Responses carry "X-Cache: HIT", "MISS" or "BYPASS" (not cacheable,
+    e.g. logged in) so the hit rate can be read from access logs. Works on
+    async views too; the cache and session lookups then run in a thread.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                key, response = await sync_to_async(_lookup)(request, tags)
+                if response is not None:
+                    return response
+                response = await view(request, *args, **kwargs)
+                return await sync_to_async(_store)(key, response, timeout)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key, response = _lookup(request, tags)
+            if response is not None:
+                return response
+            return _store(key, view(request, *args, **kwargs), timeout)
+        return wrapper
+    return decorator
@@ -0,0 +1,159 @@
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder drops microseconds past milliseconds, which would make
+    # the cursor skip rows created within the same millisecond.
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Cursor ("keyset") pagination over a fixed, unique ordering.
+
+    Instead of OFFSET, every page remembers the sort key of its first and
+    last row and the next query starts right after it:
+
+        WHERE created_at <= :c AND (created_at < :c OR id < :id)
+        ORDER BY created_at DESC, id DESC LIMIT 25
+
+    With an index on the ordering columns page 5000 costs the same as page 1.
+    The last ordering field must be unique (normally the primary key).
+    """
+
+    def __init__(self, queryset, ordering=('-created_at', '-id'), per_page=24):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        opts = queryset.model._meta
+        self.fields = [opts.get_field(name.lstrip('-')) for name in self.ordering]
+        self.descending = [name.startswith('-') for name in self.ordering]
+
+    # --- CURSOR ENCODING ---
+
+    def encode_cursor(self, obj):
+        values = [field.value_from_object(obj) for field in self.fields]
+        raw = json.dumps(values, cls=CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (ValueError, TypeError):
+            raise InvalidCursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor(cursor)
+        try:
+            return [field.to_python(value) for field, value in zip(self.fields, values)]
+        except ValidationError:
+            raise InvalidCursor(cursor)
+
+    # --- FILTERING ---
+
+    def _seek(self, values, forward):
+        # Rows that sort strictly after (forward) or before the cursor.
+        # The leading range condition lets the database seek straight into
+        # the index; the OR-chain then breaks ties on the following columns.
+        first = self.fields[0].attname
+        first_op = self._operator(0, forward)
+        condition = Q()
+        for i in range(len(self.fields)):
+            step = Q(**{self.fields[j].attname: values[j] for j in range(i)})
+            step &= Q(**{'%s__%s' % (self.fields[i].attname, self._operator(i, forward)): values[i]})
+            condition |= step
+        return Q(**{'%s__%se' % (first, first_op): values[0]}) & condition
+
+    def _operator(self, index, forward):
+        # Descending order + forward means "smaller than the cursor"
+        return 'lt' if self.descending[index] == forward else 'gt'
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else '-' + name for name in self.ordering]
+
+    # --- PAGES ---
+
+    def page(self, after=None, before=None):
+        if before:
+            return self._page_before(self.decode_cursor(before))
+
+        queryset = self.queryset.order_by(*self.ordering)
+        if after:
+            queryset = queryset.filter(self._seek(self.decode_cursor(after), forward=True))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        next_cursor = self.encode_cursor(rows[-1]) if has_more else None
+        previous_cursor = self.encode_cursor(rows[0]) if (after and rows) else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def _page_before(self, values):
+        queryset = self.queryset.order_by(*self._reversed_ordering())
+        queryset = queryset.filter(self._seek(values, forward=False))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+
+        # We came from a later page, so there is always something after us
+        next_cursor = self.encode_cursor(rows[-1]) if rows else None
+        previous_cursor = self.encode_cursor(rows[0]) if has_more else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def cursor_querystring(request, **params):
+    """
+    Current GET parameters (q, category, ...) with the paging cursors (or the
+    page number, for ranked search results) replaced.
+    """
+    query = request.GET.copy()
+    for key in ('after', 'before', 'page'):
+        query.pop(key, None)
+    for key, value in params.items():
+        if value:
+            query[key] = value
+    return query.urlencode()
@@ -0,0 +1,105 @@
+import datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Book
+
+STATS_CACHE_TIMEOUT = 15 * 60
+
+
+# --- 1. CACHE VERSIONING ---
+# Every publisher has a version number in the cache; cached stats embed it
+# in their key, so bumping the version drops all of that publisher's
+# windows at once without having to know which ones were cached.
+
+def _version_key(publisher_id):
+    return f'pubstats:version:{publisher_id}'
+
+
+def invalidate(publisher_ids):
+    for publisher_id in set(publisher_ids):
+        if publisher_id is None:
+            continue
+        try:
+            cache.incr(_version_key(publisher_id))
+        except ValueError:
+            cache.set(_version_key(publisher_id), 2, None)
+
+
+# --- 2. STATS ---
+
+def _window(start, end):
+    # Whole-day bounds in the current timezone, as datetimes so the
+    # order__created_at comparison can use an index
+    condition = Q(orderitem__order__paid=True)
+    tz = timezone.get_current_timezone()
+    if start:
+        condition &= Q(orderitem__order__created_at__gte=datetime.datetime.combine(start, datetime.time.min, tz))
+    if end:
+        condition &= Q(orderitem__order__created_at__lt=datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min, tz))
+    return condition
+
+
+def compute_stats(publisher, start=None, end=None):
+    """
+    Units sold and revenue per book for one publisher, from a single
+    annotated query. Only plain numbers, keyed by book id and only for books
+    that sold, so the cached value stays small for 20k-title catalogs.
+    """
+    sold = _window(start, end)
+    money = DecimalField(max_digits=14, decimal_places=2)
+    rows = (
+        Book.objects.filter(publisher=publisher)
+        .values('id')
+        .annotate(
+            units_sold=Coalesce(Sum('orderitem__quantity', filter=sold), 0),
+            revenue=Coalesce(
+                Sum(F('orderitem__price') * F('orderitem__quantity'), filter=sold, output_field=money),
+                Decimal(0), output_field=money,
+            ),
+        )
+        .filter(units_sold__gt=0)
+        .values_list('id', 'units_sold', 'revenue')
+    )
+    sales = {book_id: (units, revenue) for book_id, units, revenue in rows}
+    return {
+        'sales': sales,
+        'total_sales': sum(units for units, _ in sales.values()),
+        'total_revenue': sum((revenue for _, revenue in sales.values()), Decimal(0)),
+    }
+
+
+def publisher_stats(publisher, start=None, end=None):
+    """
+    The dashboard: the publisher's books, newest first, with units_sold and
+    revenue attached, plus the totals. The sales figures are cached; the
+    books themselves are one indexed query, so edits show up right away.
+    """
+    version = cache.get_or_set(_version_key(publisher.pk), 1, None)
+    key = f'pubstats:{publisher.pk}:{version}:{start}:{end}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_stats(publisher, start, end)
+        cache.set(key, stats, STATS_CACHE_TIMEOUT)
+
+    books = list(
+        Book.objects.filter(publisher=publisher)
+        .only('id', 'title', 'price', 'stock', 'rating_count', 'rating_sum', 'rating_avg', 'created_at')
+        .order_by('-created_at')
+    )
+    for book in books:
+        book.units_sold, book.revenue = stats['sales'].get(book.id, (0, Decimal(0)))
+
+    rating_sum = sum(book.rating_sum for book in books)
+    rating_count = sum(book.rating_count for book in books)
+    return {
+        'books': books,
+        'total_books': len(books),
+        'total_sales': stats['total_sales'],
+        'total_revenue': stats['total_revenue'],
+        'overall_rating': round(rating_sum / rating_count, 1) if rating_count else 0,
+    }
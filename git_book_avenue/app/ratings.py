@@ -0,0 +1,74 @@
+from django.db.models import Case, Count, F, FloatField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.utils import timezone
+
+from .fragments import bump_versions
+from .page_cache import bump_tags
+from .read_model import invalidate_books
+from .models import Book, Review
+
+
+def apply_rating_change(book_id, count_delta, sum_delta):
+    """
+    Shift a book's rating_count/rating_sum in a single UPDATE.
+
+    Everything on the right-hand side reads the row's current values inside
+    the database, so concurrent reviews can't overwrite each other. Never
+    goes below 0: counters that drifted (see reconcile_ratings) would
+    otherwise break the PositiveIntegerField CHECK on a plain delete.
+    """
+    new_count = Greatest(F('rating_count') + count_delta, 0)
+    new_sum = Greatest(F('rating_sum') + sum_delta, 0)
+    Book.objects.filter(pk=book_id).update(
+        rating_count=new_count,
+        rating_sum=new_sum,
+        rating_avg=Case(
+            When(rating_count__lte=-count_delta, then=Value(0.0)),
+            default=Cast(new_sum, FloatField()) / new_count,
+            output_field=FloatField(),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def _review_totals():
+    reviews = Review.objects.filter(book=OuterRef('pk')).order_by().values('book')
+    return {
+        'real_count': Coalesce(Subquery(reviews.annotate(n=Count('id')).values('n')), 0),
+        'real_sum': Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0),
+    }
+
+
+def drifted_books():
+    # Books whose stored counters disagree with their actual reviews
+    return (
+        Book.objects.annotate(**_review_totals())
+        .exclude(rating_count=F('real_count'), rating_sum=F('real_sum'))
+        .only('id', 'title', 'rating_count', 'rating_sum', 'rating_avg')
+    )
+
+
+def reconcile_ratings(batch_size=1000, dry_run=False):
+    """
+    Recompute the counters of every drifted book from its reviews.
+    Returns the drifted books, with stored_* (before) and real_* (after)
+    values attached.
+    """
+    fixed = list(drifted_books())
+    for book in fixed:
+        book.stored_count = book.rating_count
+        book.stored_sum = book.rating_sum
+    if dry_run:
+        return fixed
+
+    now = timezone.now()
+    for book in fixed:
+        book.updated_at = now
+        book.rating_count = book.real_count
+        book.rating_sum = book.real_sum
+        book.rating_avg = book.real_sum / book.real_count if book.real_count else 0
+    Book.objects.bulk_update(fixed, ['rating_count', 'rating_sum', 'rating_avg', 'updated_at'], batch_size=batch_size)
+    bump_versions([book.id for book in fixed])
+    bump_tags('books')
+    invalidate_books([book.id for book in fixed])
+    return fixed
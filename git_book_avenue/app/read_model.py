@@ -0,0 +1,180 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Book, Category
+
+READ_MODEL_TTL = 60              # seconds an entry lives in a process
+READ_MODEL_MAX_BOOKS = 2000      # per process, least recently used go first
+READ_MODEL_SHARED_TIMEOUT = 10 * 60
+
+_MISSING = object()
+# Entries are loaded from the primary even inside @read_from_replica views:
+# a replica that's behind would put the old row back right after a change
+# invalidated it, and keep it there for the TTL
+_DB = DEFAULT_DB_ALIAS
+
+
+# --- 1. IN-PROCESS LRU ---
+# A tiny dict-in-memory cache: no network round trip, no pickling. Each
+# process has its own copy, so invalidation from signals only reaches the
+# process that made the change; READ_MODEL_TTL bounds how stale the others
+# can get. With READ_MODEL_SHARED_CACHE = True misses fall through to
+# Django's cache (memcached/redis) before hitting the database.
+
+class LRUCache:
+    def __init__(self, name, max_entries, ttl):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+        }
+
+
+_categories = LRUCache('categories', 1, READ_MODEL_TTL)
+_books = LRUCache('books', READ_MODEL_MAX_BOOKS, READ_MODEL_TTL)
+
+
+def _use_shared_cache():
+    return getattr(settings, 'READ_MODEL_SHARED_CACHE', False)
+
+
+def stats():
+    return {region.name: region.stats() for region in (_categories, _books)}
+
+
+# --- 2. CATEGORIES ---
+
+def _load_categories():
+    if _use_shared_cache():
+        loaded = cache.get('readmodel:categories')
+        if loaded is not None:
+            return loaded
+    categories = list(Category.objects.using(_DB))
+    loaded = (categories, {category.slug: category.pk for category in categories})
+    if _use_shared_cache():
+        cache.set('readmodel:categories', loaded, READ_MODEL_SHARED_TIMEOUT)
+    return loaded
+
+
+def _category_data():
+    loaded = _categories.get('all')
+    if loaded is None:
+        loaded = _load_categories()
+        _categories.set('all', loaded)
+    return loaded
+
+
+def categories():
+    """Every category, as a fresh list (callers may reorder it)."""
+    return list(_category_data()[0])
+
+
+def category_id_for_slug(slug):
+    return _category_data()[1].get(slug)
+
+
+def category_by_slug(slug):
+    category_id = category_id_for_slug(slug)
+    if category_id is None:
+        return None
+    return next(category for category in _category_data()[0] if category.pk == category_id)
+
+
+def invalidate_categories():
+    _categories.clear()
+    if _use_shared_cache():
+        cache.delete('readmodel:categories')
+    # Cached books carry a copy of their category
+    invalidate_books()
+
+
+# --- 3. BOOKS BY ID ---
+
+def _book_key(book_id):
+    # The generation lets invalidate_books() drop every shared copy at once
+    generation = cache.get_or_set('readmodel:books:generation', 1, None)
+    return f'readmodel:book:{generation}:{book_id}'
+
+
+def get_book(book_id):
+    """
+    The book with this id (category loaded), or None. Returns a copy, so
+    callers can set attributes on it without affecting other requests.
+
+    Misses aren't cached: a book created in another process has no signal
+    reaching this one, and would 404 here until the entry expired.
+    """
+    book = _books.get(book_id)
+    if book is None:
+        key = _book_key(book_id) if _use_shared_cache() else None
+        book = cache.get(key) if key else None
+        if book is None:
+            book = Book.objects.using(_DB).select_related('category').filter(pk=book_id).first()
+            if book is None:
+                return None
+            if key:
+                cache.set(key, book, READ_MODEL_SHARED_TIMEOUT)
+        _books.set(book_id, book)
+    return copy.copy(book)
+
+
+def invalidate_books(book_ids=None):
+    """Forget some books, or every book when book_ids is None."""
+    if book_ids is None:
+        _books.clear()
+        if _use_shared_cache():
+            try:
+                cache.incr('readmodel:books:generation')
+            except ValueError:
+                pass
+        return
+
+    book_ids = set(book_ids)
+    for book_id in book_ids:
+        _books.delete(book_id)
+    if _use_shared_cache():
+        cache.delete_many([_book_key(book_id) for book_id in book_ids])
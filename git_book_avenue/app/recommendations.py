@@ -0,0 +1,183 @@
+import random
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Book, BookSimilarity, Category, OrderItem
+from .sampling import random_book_ids
+
+RECOMMENDATION_LIMIT = 8
+RECOMMENDATION_CACHE_TIMEOUT = 60 * 60  # 1 hour
+GENERATION_KEY = 'recs:generation'
+
+
+# --- 1. OFFLINE BUILD (manage.py build_recommendations) ---
+
+def build_similarity(top_n=20, min_score=0.0, batch_size=5000):
+    """
+    Rebuild BookSimilarity from paid orders.
+
+    Every customer is a row of a sparse customer x book matrix X (1 = bought).
+    X.T @ X counts, for every pair of books, how many customers bought both;
+    dividing by sqrt(buyers_i * buyers_j) turns that into cosine similarity.
+    Only the top_n neighbours of each book are stored.
+
+    Returns the number of (book, neighbour) rows written.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    pairs = (
+        OrderItem.objects.filter(order__paid=True)
+        .values_list('order__user_id', 'book_id')
+        .distinct()
+    )
+
+    user_index = {}
+    book_index = {}
+    rows, cols = [], []
+    for user_id, book_id in pairs.iterator(chunk_size=batch_size):
+        rows.append(user_index.setdefault(user_id, len(user_index)))
+        cols.append(book_index.setdefault(book_id, len(book_index)))
+
+    with transaction.atomic():
+        BookSimilarity.objects.all().delete()
+        if not rows:
+            transaction.on_commit(bump_generation)
+            return 0
+
+        purchases = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(len(user_index), len(book_index)),
+        )
+        co_purchases = (purchases.T @ purchases).tocsr()
+
+        buyers = np.sqrt(co_purchases.diagonal())
+        co_purchases.setdiag(0)
+        co_purchases.eliminate_zeros()
+
+        # Cosine normalisation without densifying: scale rows, then columns
+        inverse = sparse.diags(1.0 / buyers)
+        similarity = (inverse @ co_purchases @ inverse).tocsr()
+
+        book_ids = np.empty(len(book_index), dtype=np.int64)
+        for book_id, index in book_index.items():
+            book_ids[index] = book_id
+
+        batch = []
+        written = 0
+        for row in range(similarity.shape[0]):
+            start, end = similarity.indptr[row], similarity.indptr[row + 1]
+            if start == end:
+                continue
+            scores = similarity.data[start:end]
+            neighbours = similarity.indices[start:end]
+            if len(scores) > top_n:
+                best = np.argpartition(-scores, top_n)[:top_n]
+                scores, neighbours = scores[best], neighbours[best]
+
+            for neighbour, score in zip(neighbours, scores):
+                if score <= min_score:
+                    continue
+                batch.append(BookSimilarity(
+                    book_id=int(book_ids[row]),
+                    neighbour_id=int(book_ids[neighbour]),
+                    score=float(score),
+                ))
+            if len(batch) >= batch_size:
+                BookSimilarity.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+
+        if batch:
+            BookSimilarity.objects.bulk_create(batch)
+            written += len(batch)
+
+        # Old cached recommendations point at the previous matrix
+        transaction.on_commit(bump_generation)
+
+    return written
+
+
+def bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+# --- 2. SERVING ---
+
+def _cache_key(user):
+    generation = cache.get_or_set(GENERATION_KEY, 1, None)
+    return f'recs:user:{user.pk}:{generation}'
+
+
+def forget_user(user_id):
+    # Called when the user places an order (their purchases changed)
+    generation = cache.get(GENERATION_KEY, 1)
+    cache.delete(f'recs:user:{user_id}:{generation}')
+
+
+def _purchased_books(user):
+    return Book.objects.filter(
+        orderitem__order__user=user,
+        orderitem__order__paid=True,
+    ).values('id')
+
+
+def copurchase_recommendations(user, limit=RECOMMENDATION_LIMIT):
+    """
+    One query over the (book, -score) index: sum the neighbour scores of
+    everything the user bought, minus what they already own.
+    """
+    purchased = _purchased_books(user)
+    return list(
+        Book.objects.filter(neighbour_of__book__in=purchased)
+        .exclude(id__in=purchased)
+        .annotate(recommendation_score=Sum('neighbour_of__score'))
+        .order_by('-recommendation_score', 'id')[:limit]
+    )
+
+
+def category_recommendations(user, per_category=4):
+    # Cold-start fallback: a few random books from every category the user
+    # has bought from (the original "Recommended For You" logic)
+    purchased_categories = Category.objects.filter(
+        books__orderitem__order__user=user,
+        books__orderitem__order__paid=True
+    ).distinct()
+
+    purchased_book_ids = list(_purchased_books(user).values_list('id', flat=True))
+
+    # Sample ids per category from the cached pools, then load every pick
+    # with a single query
+    recommended_ids = []
+    for cat in purchased_categories:
+        recommended_ids.extend(random_book_ids(per_category, category=cat, exclude=purchased_book_ids))
+    found = Book.objects.in_bulk(recommended_ids)
+    recommended_books = [found[book_id] for book_id in recommended_ids if book_id in found]
+
+    # Shuffle the final mix so genres are mixed together
+    random.shuffle(recommended_books)
+    return recommended_books
+
+
+def recommended_books_for(user, limit=RECOMMENDATION_LIMIT):
+    key = _cache_key(user)
+    book_ids = cache.get(key)
+
+    if book_ids is None:
+        books = copurchase_recommendations(user, limit)
+        # Only the co-purchase result is cached; the fallback is random anyway
+        cache.set(key, [book.id for book in books], RECOMMENDATION_CACHE_TIMEOUT)
+    elif book_ids:
+        found = Book.objects.in_bulk(book_ids)
+        books = [found[book_id] for book_id in book_ids if book_id in found]
+    else:
+        books = []
+
+    if not books:
+        books = category_recommendations(user)
+    return books
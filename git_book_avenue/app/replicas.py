@@ -0,0 +1,122 @@
+import contextvars
+import random
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# After a request writes anything (an order, a review, the cart...) that
+# browser reads from the primary for this long, so the user sees their own
+# changes even while the replicas are catching up. That is on purpose for
+# every write, not just orders and reviews: the cart badge, a new account
+# and an edited book are "my own changes" too, and a few seconds on the
+# primary cost less than working out which writes a later page shows.
+REPLICA_PIN_SECONDS = 15
+PIN_COOKIE = 'db_primary'
+
+_routing = contextvars.ContextVar('db_routing', default=None)
+
+
+class RoutingState:
+    """Per request: which replica this view reads from, and whether it wrote."""
+    __slots__ = ('pinned', 'replica', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.replica = None
+        self.wrote = False
+
+
+def replica_aliases():
+    # Filled in settings.py from BOOK_AVENUE_DB_REPLICAS
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+# --- 1. THE ROUTER ---
+# Everything goes to the primary ("default") unless the running view is
+# marked with @read_from_replica. Writes always go to the primary.
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or state.replica is None or state.wrote:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            # Also called for get_or_create() and the like even when they
+            # only end up reading; pinning then is harmless, so no attempt
+            # is made to tell them apart
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get their schema from the primary, like their data
+        return db not in replica_aliases()
+
+
+# --- 2. PER REQUEST ---
+
+def start_request(request):
+    """Called by ReplicaPinMiddleware before the view runs."""
+    return _routing.set(RoutingState(pinned=PIN_COOKIE in request.COOKIES))
+
+
+def finish_request(token, response):
+    state = _routing.get()
+    _routing.reset(token)
+    if state is not None and state.wrote and replica_aliases():
+        response.set_cookie(
+            PIN_COOKIE, '1', max_age=getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', REPLICA_PIN_SECONDS),
+            httponly=True, samesite='Lax',
+        )
+    return response
+
+
+def _use_replica(request):
+    state = _routing.get()
+    aliases = replica_aliases()
+    if state is None or state.pinned or not aliases or request.method not in ('GET', 'HEAD'):
+        return None
+    # One replica for the whole request, so every query sees the same moment
+    state.replica = random.choice(aliases)
+    return state
+
+
+def read_from_replica(view):
+    """
+    GET and HEAD requests to this view read from a replica, unless the
+    visitor wrote something in the last REPLICA_PIN_SECONDS. For pages
+    that can be a second or two behind: the catalog, dashboards.
+
+    read_model still loads from the primary. publisher_stats doesn't: a
+    dashboard viewed within the replication lag of a new order can cache
+    figures without it until STATS_CACHE_TIMEOUT.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            state = _use_replica(request)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                if state is not None:
+                    state.replica = None
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _use_replica(request)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            if state is not None:
+                state.replica = None
+    return wrapper
@@ -0,0 +1,132 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyBookSales, DailyCategorySales, DailySales, OrderItem
+
+
+# --- 1. INCREMENTAL UPDATES ---
+
+def _increment(model, lookup, **deltas):
+    # UPDATE ... SET x = x + n; if the row doesn't exist yet, create it.
+    # Two checkouts creating the same day's row at once: the loser gets an
+    # IntegrityError inside its savepoint and just retries the UPDATE.
+    changes = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**lookup).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(**changes)
+
+
+def record_order(order, items):
+    """
+    Add a freshly paid order to the daily rollups. Call it inside the
+    transaction that creates the order; items need .book loaded.
+    """
+    day = timezone.localdate(order.created_at)
+
+    per_book = defaultdict(lambda: [0, Decimal(0)])
+    per_category = defaultdict(lambda: [0, Decimal(0)])
+    for item in items:
+        revenue = item.price * item.quantity
+        for bucket in (per_book[item.book_id], per_category[item.book.category_id]):
+            bucket[0] += item.quantity
+            bucket[1] += revenue
+
+    _increment(
+        DailySales, {'date': day},
+        orders=1,
+        units=sum(units for units, _ in per_book.values()),
+        revenue=sum((revenue for _, revenue in per_book.values()), Decimal(0)),
+    )
+    for book_id, (units, revenue) in per_book.items():
+        _increment(DailyBookSales, {'date': day, 'book_id': book_id}, orders=1, units=units, revenue=revenue)
+    for category_id, (units, revenue) in per_category.items():
+        _increment(DailyCategorySales, {'date': day, 'category_id': category_id}, orders=1, units=units, revenue=revenue)
+
+
+# --- 2. FULL REBUILD (manage.py rebuild_sales_rollups) ---
+
+def _paid_items(start=None, end=None):
+    items = OrderItem.objects.filter(order__paid=True).annotate(
+        day=TruncDate('order__created_at', tzinfo=timezone.get_current_timezone()),
+        line_total=ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+    )
+    if start:
+        items = items.filter(day__gte=start)
+    if end:
+        items = items.filter(day__lte=end)
+    return items.order_by()
+
+
+def _grouped(items, *keys):
+    return items.values('day', *keys).annotate(
+        n_orders=Count('order', distinct=True),
+        n_units=Sum('quantity'),
+        n_revenue=Sum('line_total'),
+    )
+
+
+def rebuild_rollups(start=None, end=None, batch_size=2000):
+    """
+    Recompute the rollups for [start, end] (whole history by default) from
+    paid order items. Returns the number of days rebuilt.
+    """
+    items = _paid_items(start, end)
+    targets = [
+        (DailySales, (), {}),
+        (DailyBookSales, ('book_id',), {'book_id': 'book_id'}),
+        (DailyCategorySales, ('book__category_id',), {'category_id': 'book__category_id'}),
+    ]
+
+    with transaction.atomic():
+        days = 0
+        for model, keys, fields in targets:
+            stale = model.objects.all()
+            if start:
+                stale = stale.filter(date__gte=start)
+            if end:
+                stale = stale.filter(date__lte=end)
+            stale.delete()
+
+            rows = [
+                model(
+                    date=row['day'],
+                    orders=row['n_orders'],
+                    units=row['n_units'] or 0,
+                    revenue=row['n_revenue'] or 0,
+                    **{field: row[key] for field, key in fields.items()}
+                )
+                for row in _grouped(items, *keys).iterator()
+            ]
+            model.objects.bulk_create(rows, batch_size=batch_size)
+            if model is DailySales:
+                days = len(rows)
+    return days
+
+
+# --- 3. READING (manager dashboard) ---
+
+def date_series(start, end):
+    """One dict per day in [start, end], zeros for days without sales."""
+    by_day = {row.date: row for row in DailySales.objects.filter(date__range=(start, end))}
+    series = []
+    day = start
+    while day <= end:
+        row = by_day.get(day)
+        series.append({
+            'date': day,
+            'orders': row.orders if row else 0,
+            'units': row.units if row else 0,
+            'revenue': row.revenue if row else Decimal(0),
+        })
+        day += datetime.timedelta(days=1)
+    return series
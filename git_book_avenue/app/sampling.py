@@ -0,0 +1,104 @@
+import random
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Min
+
+from .models import Book
+
+POOL_TIMEOUT = 5 * 60  # seconds before a pool is rebuilt from the database
+POOL_MAX_SIZE = 20000  # above this, the pool is a random subset (see _probe_ids)
+PROBE_BATCH = 500
+GENERATION_KEY = 'sample:generation'
+
+
+# --- 1. ID POOLS ---
+# Picking random rows with ORDER BY RANDOM() sorts the whole table on every
+# request. Instead we keep a pool of candidate ids per "name" in the cache,
+# rebuilt every few minutes (or when books change), and sample from it in
+# Python. A request then costs one cache get plus one primary-key lookup.
+
+def bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+def _probe_ids(queryset, size, rng):
+    # Id-range probing with rejection: draw random integers between the
+    # lowest and highest id and keep the ones that exist. Every existing id
+    # is equally likely to be hit, however gappy the id sequence is.
+    bounds = queryset.aggregate(low=Min('id'), high=Max('id'))
+    low, high = bounds['low'], bounds['high']
+    found = set()
+    for _ in range(20):
+        missing = size - len(found)
+        if missing <= 0:
+            break
+        candidates = list({rng.randint(low, high) for _ in range(missing * 2)} - found)
+        for start in range(0, len(candidates), PROBE_BATCH):
+            chunk = candidates[start:start + PROBE_BATCH]
+            found.update(queryset.filter(id__in=chunk).values_list('id', flat=True))
+    found = list(found)
+    if len(found) > size:
+        found = rng.sample(found, size)
+    return found
+
+
+def build_pool(queryset, size=None, rng=None):
+    size = size or POOL_MAX_SIZE
+    rng = rng or random
+    total = queryset.aggregate(total=Count('id'))['total']
+    if total <= size:
+        # values_list('id') walks an index; no sort, no row data
+        return list(queryset.values_list('id', flat=True))
+    return _probe_ids(queryset, size, rng)
+
+
+def id_pool(name, queryset, rng=None):
+    generation = cache.get_or_set(GENERATION_KEY, 1, None)
+    key = f'sample:pool:{name}:{generation}'
+    pool = cache.get(key)
+    if pool is None:
+        pool = build_pool(queryset, rng=rng)
+        cache.set(key, pool, POOL_TIMEOUT)
+    return pool
+
+
+# --- 2. SAMPLING ---
+
+def sample_ids(pool, k, exclude=(), rng=None):
+    """
+    k distinct ids drawn uniformly from pool, skipping anything in exclude.
+
+    Drawing k + len(exclude) ids and dropping the excluded ones keeps every
+    k-subset of the remaining ids equally likely.
+    """
+    rng = rng or random
+    exclude = set(exclude)
+    draws = rng.sample(pool, min(len(pool), k + len(exclude)))
+    return [book_id for book_id in draws if book_id not in exclude][:k]
+
+
+def random_book_ids(k, category=None, exclude=(), rng=None):
+    """
+    Ids of up to k random books (optionally from one category), in random
+    order. Lets callers sampling several categories load them in one go.
+    """
+    if category is not None:
+        name = f'books:category:{category.pk}'
+        queryset = Book.objects.filter(category=category)
+    else:
+        name = 'books'
+        queryset = Book.objects.all()
+
+    return sample_ids(id_pool(name, queryset, rng=rng), k, exclude=exclude, rng=rng)
+
+
+def random_books(k, category=None, exclude=(), rng=None):
+    """
+    Up to k random books (optionally from one category), in random order.
+    """
+    ids = random_book_ids(k, category=category, exclude=exclude, rng=rng)
+    books = Book.objects.in_bulk(ids)
+    return [books[book_id] for book_id in ids if book_id in books]
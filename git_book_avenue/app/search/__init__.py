@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .backends import DatabaseSearchBackend, SQLiteFTS5Backend, highlight
+
+_backend = None
+
+
+def get_search_backend():
+    """
+    The backend named by settings.BOOK_SEARCH_BACKEND, or the best one for
+    the current database if the setting is missing.
+    """
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'BOOK_SEARCH_BACKEND', None)
+        if path:
+            backend_class = import_string(path)
+        elif connection.vendor == 'sqlite':
+            backend_class = SQLiteFTS5Backend
+        else:
+            backend_class = DatabaseSearchBackend
+        _backend = backend_class()
+    return _backend
+
+
+class SearchResults:
+    """
+    Lazy, sliceable result set so the standard Paginator can page it:
+    len()/count() runs the COUNT query, slicing runs one ranked query and
+    fetches the matching books with a single in_bulk().
+    """
+
+    def __init__(self, query, category=None, backend=None, queryset=None):
+        self.query = query
+        # Loads the matching books; pass one with only() / select_related()
+        self.queryset = queryset
+        self.category_id = category.id if category is not None else None
+        self.backend = backend or get_search_backend()
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.query, self.category_id)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+
+        from ..models import Book
+
+        offset = index.start or 0
+        limit = (index.stop - offset) if index.stop is not None else self.count() - offset
+        hits = self.backend.search(self.query, self.category_id, offset=offset, limit=max(limit, 0))
+
+        queryset = self.queryset if self.queryset is not None else Book.objects.all()
+        books = queryset.in_bulk([hit.book_id for hit in hits])
+        results = []
+        for hit in hits:
+            book = books.get(hit.book_id)
+            if book is None:
+                continue
+            book.search_rank = hit.rank
+            book.search_snippet = highlight(hit.snippet)
+            results.append(book)
+        return results
+
+
+def search_books(query, category=None, queryset=None):
+    return SearchResults(query, category=category, queryset=queryset)
+
+
+def index_books(books):
+    get_search_backend().index_books(books)
+
+
+def remove_books(book_ids):
+    get_search_backend().remove_books(book_ids)
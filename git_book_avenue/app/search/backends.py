@@ -0,0 +1,206 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+
+# Markers the database wraps around matched terms in snippets. They cannot
+# appear in user text, so we can HTML-escape the snippet and then swap them
+# for <mark> tags safely.
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+
+class SearchHit:
+    def __init__(self, book_id, rank=None, snippet=''):
+        self.book_id = book_id
+        self.rank = rank
+        self.snippet = snippet
+
+
+def highlight(snippet):
+    html = escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+    return mark_safe(html)
+
+
+def query_terms(query):
+    # Plain words only: no FTS operators, quotes or column filters from users
+    return re.findall(r'\w+', (query or '').lower())
+
+
+class BaseSearchBackend:
+    """
+    A search backend keeps its own index of books and answers ranked queries.
+
+    Subclasses implement index_books(), remove_books(), clear(), count() and
+    search(). rebuild() is shared and simply re-feeds every book.
+    """
+
+    def index_books(self, books):
+        raise NotImplementedError
+
+    def remove_books(self, book_ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def count(self, query, category_id=None):
+        raise NotImplementedError
+
+    def search(self, query, category_id=None, offset=0, limit=24):
+        """Return a list of SearchHit, best match first."""
+        raise NotImplementedError
+
+    def rebuild(self, batch_size=1000, progress=None):
+        from ..models import Book
+
+        books = Book.objects.select_related('category').only(
+            'id', 'title', 'author', 'description', 'category__name'
+        ).order_by('id')
+
+        total = 0
+        with transaction.atomic():
+            self.clear()
+            batch = []
+            for book in books.iterator(chunk_size=batch_size):
+                batch.append(book)
+                if len(batch) >= batch_size:
+                    self.index_books(batch)
+                    total += len(batch)
+                    batch = []
+                    if progress:
+                        progress(total)
+            if batch:
+                self.index_books(batch)
+                total += len(batch)
+        return total
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """
+    Inverted index in an FTS5 virtual table (created by migration 0008),
+    one row per book with rowid = Book.id, ranked with BM25.
+    """
+
+    table = 'store_book_fts'
+
+    # bm25() column weights: a hit in the title beats one in the description
+    weights = (10.0, 6.0, 1.0, 3.0)  # title, author, description, category
+
+    def index_books(self, books):
+        rows = [
+            (book.id, book.title, book.author, book.description, book.category.name)
+            for book in books
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'DELETE FROM %s WHERE rowid = %%s' % self.table,
+                [(row[0],) for row in rows],
+            )
+            cursor.executemany(
+                'INSERT INTO %s (rowid, title, author, description, category) '
+                'VALUES (%%s, %%s, %%s, %%s, %%s)' % self.table,
+                rows,
+            )
+
+    def remove_books(self, book_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'DELETE FROM %s WHERE rowid = %%s' % self.table,
+                [(book_id,) for book_id in book_ids],
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s' % self.table)
+
+    def match_expression(self, query):
+        terms = query_terms(query)
+        if not terms:
+            return None
+        # Every word must match, as a prefix so half-typed words ("harr pott") work
+        return ' '.join('"%s"*' % term for term in terms)
+
+    def _where(self, match, category_id):
+        sql = 'WHERE {table} MATCH %s'.format(table=self.table)
+        params = [match]
+        if category_id is not None:
+            sql += ' AND store_book.category_id = %s'
+            params.append(category_id)
+        return sql, params
+
+    def count(self, query, category_id=None):
+        match = self.match_expression(query)
+        if match is None:
+            return 0
+        where, params = self._where(match, category_id)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT COUNT(*) FROM {table} '
+                'JOIN store_book ON store_book.id = {table}.rowid '.format(table=self.table) + where,
+                params,
+            )
+            return cursor.fetchone()[0]
+
+    def search(self, query, category_id=None, offset=0, limit=24):
+        match = self.match_expression(query)
+        if match is None:
+            return []
+        where, params = self._where(match, category_id)
+        sql = (
+            'SELECT {table}.rowid, bm25({table}, {weights}) AS rank, '
+            "snippet({table}, 2, %s, %s, '…', 16) "
+            'FROM {table} JOIN store_book ON store_book.id = {table}.rowid '
+            + where +
+            ' ORDER BY rank LIMIT %s OFFSET %s'
+        ).format(table=self.table, weights=', '.join(str(w) for w in self.weights))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [MATCH_START, MATCH_END] + params + [limit, offset])
+            return [SearchHit(book_id, rank, snippet) for book_id, rank, snippet in cursor.fetchall()]
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Fallback for databases without a full-text backend yet (e.g. Postgres
+    until a tsvector backend is written). Unranked icontains matching, no
+    separate index to maintain.
+    """
+
+    def index_books(self, books):
+        pass
+
+    def remove_books(self, book_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def _queryset(self, query, category_id):
+        from ..models import Book
+
+        books = Book.objects.all()
+        for term in query_terms(query):
+            books = books.filter(
+                Q(title__icontains=term) | Q(author__icontains=term) |
+                Q(description__icontains=term) | Q(category__name__icontains=term)
+            )
+        if category_id is not None:
+            books = books.filter(category_id=category_id)
+        return books
+
+    def count(self, query, category_id=None):
+        if not query_terms(query):
+            return 0
+        return self._queryset(query, category_id).count()
+
+    def search(self, query, category_id=None, offset=0, limit=24):
+        if not query_terms(query):
+            return []
+        rows = self._queryset(query, category_id).order_by('-created_at', '-id')
+        rows = rows.values_list('id', 'description')[offset:offset + limit]
+        return [SearchHit(book_id, None, Truncator(text).words(30)) for book_id, text in rows]
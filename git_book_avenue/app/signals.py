@@ -0,0 +1,190 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+
+from .models import Book, CartItem, Category, Order, Review
+from . import cart, fragments, images, page_cache, publisher_stats, ratings, read_model, recommendations, sampling, search
+
+# --- 1. SEARCH INDEX ---
+# Keep the full-text index in step with the catalog. Bulk queryset.update()
+# calls skip these, so run "manage.py rebuild_search_index" after those.
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_books([instance])
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    search.remove_books([instance.pk])
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created=False, raw=False, **kwargs):
+    # A renamed category changes what its books match on
+    if raw or created:
+        return
+    search.index_books(instance.books.select_related('category'))
+
+# --- 2. RECOMMENDATIONS ---
+
+@receiver(post_save, sender=Order)
+def refresh_recommendations(sender, instance, raw=False, **kwargs):
+    # New purchases change both what to suggest and what to exclude
+    if raw or not instance.paid:
+        return
+    recommendations.forget_user(instance.user_id)
+
+# --- 3. RANDOM SAMPLING POOLS ---
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def refresh_sampling_pools(sender, raw=False, created=True, **kwargs):
+    # New or removed books should show up in random picks right away
+    # (post_delete has no "created" flag, so it always refreshes)
+    if raw or not created:
+        return
+    sampling.bump_generation()
+
+# --- 4. RATING AGGREGATES ON BOOK ---
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, raw=False, **kwargs):
+    # Only admin edits change an existing review; note what it was before
+    instance._previous = None
+    if raw or instance.pk is None:
+        return
+    instance._previous = sender.objects.filter(pk=instance.pk).values('book_id', 'rating').first()
+
+@receiver(post_save, sender=Review)
+def add_review_rating(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    if previous and not created:
+        ratings.apply_rating_change(previous['book_id'], -1, -previous['rating'])
+    if created or previous:
+        ratings.apply_rating_change(instance.book_id, 1, instance.rating)
+
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, **kwargs):
+    ratings.apply_rating_change(instance.book_id, -1, -instance.rating)
+
+# --- 5. PUBLISHER DASHBOARD STATS ---
+# Orders invalidate from place_order(); here we cover catalog edits
+# (price, stock, new or removed books) and reviews.
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def refresh_publisher_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    publisher_stats.invalidate([instance.publisher_id])
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def refresh_publisher_ratings(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    publisher_ids = Book.objects.filter(pk=instance.book_id).values_list('publisher_id', flat=True)
+    publisher_stats.invalidate(publisher_ids)
+
+# --- 6. IMAGE VARIANTS ---
+
+@receiver(post_save, sender=Book)
+def resize_book_image(sender, instance, raw=False, **kwargs):
+    # New uploads (add_book, edit_book, imports) get resized in the
+    # background; images.needs_variants() skips unchanged images
+    if raw:
+        return
+    images.schedule_variants(instance)
+
+# --- 7. CACHED BOOK CARDS ---
+# Cards show the book's own fields and its rating, so both invalidate it.
+# After commit, like section 9: bumped any earlier, a concurrent request
+# could cache the old row under the new version
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def refresh_book_card(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    book_id = instance.pk
+    transaction.on_commit(lambda: fragments.bump_versions([book_id]))
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def refresh_reviewed_book_card(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    book_id = instance.book_id
+    transaction.on_commit(lambda: fragments.bump_versions([book_id]))
+
+# --- 8. ANONYMOUS PAGE CACHE ---
+# After commit too, or a stale page could be stored under the new tags
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def refresh_book_pages(sender, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: page_cache.bump_tags('books'))
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_category_pages(sender, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: page_cache.bump_tags('categories'))
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def refresh_review_pages(sender, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: page_cache.bump_tags('reviews'))
+
+# --- 9. IN-PROCESS READ MODEL ---
+# After commit, so a concurrent request can't re-cache the old row between
+# our invalidation and the commit
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def forget_cached_book(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    book_id = instance.pk
+    transaction.on_commit(lambda: read_model.invalidate_books([book_id]))
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def forget_reviewed_book(sender, instance, raw=False, **kwargs):
+    # The rating counters on the book changed
+    if raw:
+        return
+    book_id = instance.book_id
+    transaction.on_commit(lambda: read_model.invalidate_books([book_id]))
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def forget_cached_categories(sender, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(read_model.invalidate_categories)
+
+# --- 10. CART ---
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    # What they added while logged out joins their stored cart
+    cart.merge_session_cart(request, user)
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def forget_cart_count(sender, instance, raw=False, **kwargs):
+    # Admin edits and rows deleted along with their book; the cart's own
+    # add/remove clear it themselves
+    if raw:
+        return
+    cart.forget_count(instance.cart_id)
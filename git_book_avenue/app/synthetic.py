@@ -0,0 +1,193 @@
+import datetime
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import fragments, page_cache, publisher_stats, recommendations, sampling
+from .models import Book, Category, Order, OrderItem, Review, UserProfile
+from .ratings import reconcile_ratings
+from .read_model import invalidate_categories
+from .rollups import rebuild_rollups
+from .search import get_search_backend
+
+# Everything generated is tagged with this prefix (usernames, category
+# slugs), so it can be told apart from real data and removed again
+PREFIX = 'synth'
+PASSWORD = 'synthetic'
+
+WORDS = (
+    'shadow river garden silent empire winter letters midnight ocean forgotten '
+    'crown glass library summer stone secret city journey mountain fire light '
+    'house storm island memory dream wild quiet golden road star'
+).split()
+GENRES = (
+    'Fiction Mystery Fantasy Romance Thriller Biography History Science Poetry '
+    'Travel Cooking Business Children Horror Philosophy Art Comics Religion Sports Music'
+).split()
+
+
+def _zipf_weights(n, s=1.1):
+    # Popularity by rank: a few bestsellers, a long tail of rarely bought books
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def _title(rng):
+    return ' '.join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(2, 4)))
+
+
+def _refresh_caches(book_ids=(), publisher_ids=()):
+    # What the model signals would have invalidated. Only our own keys: the
+    # cache may hold sessions, or be shared with other sites
+    page_cache.bump_tags('books', 'categories', 'reviews')
+    fragments.bump_versions(book_ids)
+    publisher_stats.invalidate(publisher_ids)
+    recommendations.bump_generation()
+    sampling.bump_generation()
+    invalidate_categories()  # and the cached books with them
+
+
+def clear():
+    """
+    Delete everything generate() created (books go with their categories),
+    then rebuild the rollups, which keep no link to the deleted orders.
+    """
+    categories = Category.objects.filter(slug__startswith=f'{PREFIX}-')
+    users = User.objects.filter(username__startswith=f'{PREFIX}-')
+    with transaction.atomic():
+        book_ids = list(Book.objects.filter(category__in=categories).values_list('id', flat=True))
+        publisher_ids = list(users.values_list('id', flat=True))
+        categories.delete()
+        users.delete()
+    rebuild_rollups()
+    _refresh_caches(book_ids, publisher_ids)
+
+
+def generate(categories=10, books=1000, users=200, publishers=10, orders=2000, reviews=1000,
+             days=180, seed=0, batch_size=1000, log=lambda message: None):
+    """
+    Fill the database with a synthetic store. Sales follow a Zipf curve over
+    books and over customers, quantities are mostly 1, ratings lean towards
+    4-5 stars and only buyers review. Bulk inserts skip the model signals,
+    so the derived data (search index, rating counters, rollups, caches) is
+    rebuilt at the end.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    password = make_password(PASSWORD)
+    start = User.objects.filter(username__startswith=f'{PREFIX}-').count()
+
+    with transaction.atomic():
+        # --- people ---
+        usernames = [
+            f'{PREFIX}-{"publisher" if n < publishers else "user"}-{start + n}'
+            for n in range(publishers + users)
+        ]
+        User.objects.bulk_create([
+            User(username=username, email=f'{username}@example.com', password=password)
+            for username in usernames
+        ], batch_size=batch_size)
+        # Re-read for the ids (not every backend returns them from bulk inserts)
+        people = list(User.objects.filter(username__in=usernames).order_by('id'))
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, is_publisher=n < publishers, is_approved=n < publishers)
+            for n, user in enumerate(people)
+        ], batch_size=batch_size)
+        publisher_users, customers = people[:publishers], people[publishers:]
+        log("%d publishers, %d customers" % (len(publisher_users), len(customers)))
+
+        # --- catalog ---
+        Category.objects.bulk_create([
+            Category(name=f'{GENRES[n % len(GENRES)]} {n // len(GENRES) + 1}' if n >= len(GENRES) else GENRES[n],
+                     slug=f'{PREFIX}-{start}-{n}')
+            for n in range(categories)
+        ])
+        category_objects = list(Category.objects.filter(slug__startswith=f'{PREFIX}-{start}-').order_by('id'))
+        category_weights = _zipf_weights(len(category_objects), s=0.8)
+
+        Book.objects.bulk_create([
+            Book(
+                category=rng.choices(category_objects, category_weights)[0],
+                title=_title(rng),
+                author=f'{rng.choice(WORDS).capitalize()} {rng.choice(WORDS).capitalize()}',
+                publisher=rng.choice(publisher_users) if publisher_users and rng.random() < 0.8 else None,
+                description=' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 80))),
+                price=Decimal(rng.randint(99, 1499)),
+                image='',
+                stock=rng.randint(0, 200),
+                is_bestseller=rng.random() < 0.05,
+            )
+            for _ in range(books)
+        ], batch_size=batch_size)
+        new_books = list(Book.objects.filter(category__in=category_objects).order_by('id'))
+        # created_at is auto_now_add; spread it out afterwards
+        for book in new_books:
+            book.created_at = now - datetime.timedelta(days=rng.uniform(0, days * 2))
+        Book.objects.bulk_update(new_books, ['created_at'], batch_size=batch_size)
+        log("%d categories, %d books" % (len(category_objects), len(new_books)))
+
+        # --- orders ---
+        rng.shuffle(new_books)  # popularity rank independent of id
+        book_weights = _zipf_weights(len(new_books))
+        customer_weights = _zipf_weights(len(customers), s=0.7)
+        order_objects, order_lines = [], []
+        for _ in range(orders if customers and new_books else 0):
+            customer = rng.choices(customers, customer_weights)[0]
+            lines = {}
+            for book in rng.choices(new_books, book_weights, k=rng.choice((1, 1, 1, 2, 2, 3, 4))):
+                lines[book.pk] = (book, rng.choice((1, 1, 1, 1, 2, 3)))
+            order_objects.append(Order(
+                user=customer, paid=rng.random() < 0.95,
+                full_name=customer.username, address='1 Synthetic Street', city='Pune', zip_code='411001',
+                total_price=sum(book.price * quantity for book, quantity in lines.values()),
+            ))
+            order_lines.append(lines)
+        Order.objects.bulk_create(order_objects, batch_size=batch_size)
+        if order_objects and not order_objects[0].pk:
+            # Same here; the customers are new, so these are exactly our orders
+            order_objects = list(Order.objects.filter(user__in=customers).order_by('id'))
+        for order in order_objects:
+            order.created_at = now - datetime.timedelta(days=days * rng.random() ** 1.5)
+        Order.objects.bulk_update(order_objects, ['created_at'], batch_size=batch_size)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, book=book, price=book.price, quantity=quantity)
+            for order, lines in zip(order_objects, order_lines)
+            for book, quantity in lines.values()
+        ], batch_size=batch_size)
+        log("%d orders" % len(order_objects))
+
+        # --- reviews (verified buyers only, one per user and book) ---
+        purchases = sorted({
+            (order.user_id, book.pk)
+            for order, lines in zip(order_objects, order_lines) if order.paid
+            for book, _ in lines.values()
+        })
+        review_objects = [
+            Review(
+                book_id=book_id, user_id=user_id,
+                rating=rng.choices((1, 2, 3, 4, 5), (4, 6, 15, 35, 40))[0],
+                comment=' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 30))),
+            )
+            for user_id, book_id in rng.sample(purchases, min(reviews, len(purchases)))
+        ]
+        Review.objects.bulk_create(review_objects, batch_size=batch_size)
+        log("%d reviews" % len(review_objects))
+
+    # --- derived data the signals would normally maintain ---
+    get_search_backend().rebuild(batch_size=batch_size)
+    reconcile_ratings(batch_size=batch_size)
+    rebuild_rollups()
+    _refresh_caches([book.pk for book in new_books], [user.pk for user in publisher_users])
+    log("search index, rating counters and sales rollups rebuilt")
+
+    return {
+        'categories': len(category_objects),
+        'books': len(new_books),
+        'publishers': len(publisher_users),
+        'customers': len(customers),
+        'orders': len(order_objects),
+        'reviews': len(review_objects),
+    }
@@ -0,0 +1,17 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..fragments import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def book_cards(books, variant='card'):
+    """
+    Render a list of books as cards through the fragment cache:
+
+        {% book_cards books %}
+        {% book_cards related_books 'related' %}
+    """
+    return mark_safe(render_cards(books, variant))
@@ -0,0 +1,51 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+# Catalog cards are ~250px wide in a 4-column grid, full width on phones
+CARD_SIZES = '(max-width: 600px) 100vw, (max-width: 1000px) 50vw, 280px'
+
+
+def _srcset(names):
+    return ', '.join(
+        f'{default_storage.url(name)} {width}w'
+        for width, name in sorted(names.items(), key=lambda item: int(item[0]))
+    )
+
+
+@register.simple_tag
+def book_image(book, sizes=CARD_SIZES, alt=None, loading='lazy', fallback_width=640, **attrs):
+    """
+    <picture> with WebP and JPEG srcsets for a book cover, or a plain
+    lazy-loaded <img> of the original while the variants don't exist yet.
+
+        {% book_image book %}
+        {% book_image book sizes="50px" style="width: 50px;" %}
+    """
+    if not book.image:
+        return ''
+
+    alt = book.title if alt is None else alt
+    extra = format_html_join('', ' {}="{}"', attrs.items())
+    variants = book.image_variants or {}
+
+    if variants.get('source') != book.image.name or not variants.get('jpeg'):
+        return format_html(
+            '<img src="{}" alt="{}" loading="{}" decoding="async"{}>',
+            book.image.url, alt, loading, extra,
+        )
+
+    jpeg = variants['jpeg']
+    widths = sorted(int(width) for width in jpeg)
+    fallback = max([width for width in widths if width <= fallback_width] or widths[:1])
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="{}" decoding="async"{}>'
+        '</picture>',
+        _srcset(variants.get('webp', {})), sizes,
+        default_storage.url(jpeg[str(fallback)]), _srcset(jpeg), sizes,
+        variants['width'], variants['height'], alt, loading, extra,
+    )
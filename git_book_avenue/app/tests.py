@@ -1,3 +1,1944 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import io
+import json
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import time
+import zipfile
+from collections import Counter
+from decimal import Decimal
+from importlib.util import find_spec
 
-# Create your tests here.
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, router
+from django.db.models import Count, Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.templatetags.static import static
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from . import (
+    assets, benchmark, cart, catalog_import, exports, fragments, images, read_model,
+    recommendations, replicas, rollups, sampling, synthetic, views,
+)
+from .benchmark import read_urlconf
+from .conditional import ETAG_TIME_BUCKET
+from .metrics import registry, sql_shape
+from .middleware import RequestStats
+from .models import (
+    Book, BookSimilarity, CartItem, Category, DailyBookSales, DailyCategorySales, DailySales, ImportJob, Order,
+    OrderItem, Review, UserProfile,
+)
+from .orders import place_order
+from .page_cache import anonymous_page_cache, bump_tags
+from .publisher_stats import publisher_stats
+from .pagination import InvalidCursor, KeysetPaginator
+from .ratings import reconcile_ratings
+from .templatetags.book_images import book_image
+from .search.backends import DatabaseSearchBackend, SQLiteFTS5Backend, highlight
+
+
+def make_books(category, count):
+    return [
+        Book.objects.create(
+            category=category, title=f'Book {i}', author='Author',
+            description='...', price=100, image='books/cover.jpg',
+        )
+        for i in range(count)
+    ]
+
+
+class RandomSamplingTests(TestCase):
+    # Chi-square critical value for p = 0.001 with 9 degrees of freedom
+    CHI2_CRITICAL_9DF = 27.88
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Fiction', slug='fiction')
+        self.books = make_books(self.category, 10)
+        self.ids = [book.id for book in self.books]
+
+    def chi_square(self, counts, expected):
+        return sum((counts[book_id] - expected) ** 2 / expected for book_id in self.ids)
+
+    def test_sample_ids_is_uniform(self):
+        rng = random.Random(1234)
+        counts = Counter()
+        draws = 6000
+        for _ in range(draws):
+            picked = sampling.sample_ids(self.ids, 3, rng=rng)
+            self.assertEqual(len(set(picked)), 3)
+            counts.update(picked)
+        expected = draws * 3 / len(self.ids)
+        self.assertLess(self.chi_square(counts, expected), self.CHI2_CRITICAL_9DF)
+
+    def test_sample_ids_with_exclusions_is_uniform_over_the_rest(self):
+        rng = random.Random(99)
+        excluded = self.ids[:2]
+        counts = Counter()
+        for _ in range(4000):
+            picked = sampling.sample_ids(self.ids, 4, exclude=excluded, rng=rng)
+            self.assertEqual(len(picked), 4)
+            self.assertFalse(set(picked) & set(excluded))
+            counts.update(picked)
+        expected = 4000 * 4 / 8
+        chi2 = sum((counts[book_id] - expected) ** 2 / expected for book_id in self.ids[2:])
+        self.assertLess(chi2, 24.32)  # p = 0.001, 7 degrees of freedom
+
+    def test_probed_pool_is_uniform(self):
+        # Leave gaps in the id sequence so naive "next id after x" would be biased
+        Book.objects.filter(id__in=self.ids[1:5:2]).delete()
+        self.ids = list(Book.objects.values_list('id', flat=True))
+        rng = random.Random(7)
+        counts = Counter()
+        rounds = 3000
+        for _ in range(rounds):
+            counts.update(sampling._probe_ids(Book.objects.all(), 2, rng))
+        expected = rounds * 2 / len(self.ids)
+        chi2 = sum((counts[book_id] - expected) ** 2 / expected for book_id in self.ids)
+        self.assertLess(chi2, 24.32)  # 8 books -> 7 degrees of freedom
+
+    def test_random_books_uses_the_cached_pool(self):
+        sampling.random_books(4)
+        with self.assertNumQueries(1):
+            books = sampling.random_books(4, exclude=[self.ids[0]])
+        self.assertEqual(len(books), 4)
+        self.assertNotIn(self.ids[0], [book.id for book in books])
+
+    def test_new_books_refresh_the_pool(self):
+        sampling.random_books(4)
+        new_book = make_books(self.category, 1)[0]
+        picked = {book.id for _ in range(50) for book in sampling.random_books(10)}
+        self.assertIn(new_book.id, picked)
+
+
+class ProfileOrderHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='secret')
+        self.client.force_login(self.user)
+        category = Category.objects.create(name='Fiction', slug='fiction')
+        self.books = make_books(category, 3)
+
+    def place_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(user=self.user, paid=True, total_price=300)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, book=book, price=100, quantity=1) for book in self.books
+            ])
+
+    def test_query_count_does_not_grow_with_orders(self):
+        # user, cart badge count (cached, cleared here), profile lookup in
+        # the navbar, one page of orders, their items + books. The session
+        # is a signed cookie, no query.
+        self.place_orders(2)
+        cache.clear()
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(len(response.context['orders']), 2)
+
+        self.place_orders(40)
+        cache.clear()
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(len(response.context['orders']), 10)
+        self.assertTrue(response.context['page'].has_next)
+
+    def test_pages_cover_every_order_once(self):
+        self.place_orders(23)
+        seen = []
+        url = reverse('profile')
+        while url:
+            response = self.client.get(url)
+            seen += [order.id for order in response.context['orders']]
+            page = response.context['page']
+            url = reverse('profile') + '?' + response.context['next_query'] if page.has_next else None
+        self.assertEqual(sorted(seen), sorted(Order.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+
+class KeysetPaginatorTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Fiction', slug='fiction')
+        self.books = make_books(category, 7)
+        # Imports create many books within the same instant: only the id breaks the tie
+        Book.objects.filter(pk__in=[book.pk for book in self.books[1:6]]).update(created_at=self.books[0].created_at)
+        self.paginator = KeysetPaginator(Book.objects.all(), per_page=3)
+        self.expected = list(Book.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def ids(self, page):
+        return [book.id for book in page]
+
+    def test_forward_then_back_through_ties(self):
+        pages = [self.paginator.page()]
+        while pages[-1].has_next:
+            pages.append(self.paginator.page(after=pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum((self.ids(page) for page in pages), []), self.expected)
+        self.assertFalse(pages[0].has_previous)
+
+        # Going back gives the same pages, in the same order
+        back = self.paginator.page(before=pages[2].previous_cursor)
+        self.assertEqual(self.ids(back), self.ids(pages[1]))
+        self.assertTrue(back.has_next)
+        first = self.paginator.page(before=back.previous_cursor)
+        self.assertEqual(self.ids(first), self.ids(pages[0]))
+        self.assertFalse(first.has_previous)
+
+    def test_invalid_cursors(self):
+        def encode(values):
+            return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+        for cursor in ('garbage!', encode([1]), encode(['not-a-date', 1]), encode({'id': 1})):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                self.paginator.page(after=cursor)
+        valid = self.paginator.page().next_cursor
+        self.assertEqual(len(self.paginator.page(after=valid)), 3)
+
+
+@skipUnless(connection.vendor == 'sqlite', "The FTS5 index is SQLite-only")
+class SearchTests(TestCase):
+    def setUp(self):
+        self.fiction = Category.objects.create(name='Fiction', slug='fiction')
+        self.garden = Category.objects.create(name='Gardening', slug='gardening')
+        self.dune = Book.objects.create(
+            category=self.fiction, title='Dune', author='Frank Herbert',
+            description='Politics on a desert planet.', price=100,
+        )
+        self.flowers = Book.objects.create(
+            category=self.garden, title='Desert Flowers', author='Ann Green',
+            description='What grows with little water.', price=100,
+        )
+        self.roses = Book.objects.create(
+            category=self.garden, title='Roses', author='Ann Green',
+            description='Pruning, feeding and desert roses.', price=100,
+        )
+        self.fts = SQLiteFTS5Backend()
+        self.plain = DatabaseSearchBackend()
+
+    def hits(self, backend, query, category=None):
+        return [hit.book_id for hit in backend.search(query, category)]
+
+    def test_fts5_and_icontains_find_the_same_books(self):
+        for query, category in [('desert', None), ('ann green', None), ('desert', self.garden.pk),
+                                ('fiction', None), ('frank water', None), ('', None)]:
+            with self.subTest(query=query, category=category):
+                found = self.hits(self.fts, query, category)
+                self.assertEqual(sorted(found), sorted(self.hits(self.plain, query, category)))
+                self.assertEqual(self.fts.count(query, category), len(found))
+                self.assertEqual(self.plain.count(query, category), len(found))
+
+    def test_fts5_ranks_title_matches_first(self):
+        self.assertEqual(self.hits(self.fts, 'desert')[0], self.flowers.pk)
+        # Prefixes match too, and the snippet marks the match
+        hit = self.fts.search('pru')[0]
+        self.assertEqual(hit.book_id, self.roses.pk)
+        self.assertIn('<mark>Pruning</mark>', highlight(hit.snippet))
+
+    def test_saves_and_deletes_update_the_index(self):
+        self.dune.title = 'Arrakis'
+        self.dune.save()
+        self.assertEqual(self.hits(self.fts, 'arrakis'), [self.dune.pk])
+        self.assertEqual(self.hits(self.fts, 'dune'), [])
+
+        self.garden.name = 'Botany'
+        self.garden.save()
+        self.assertEqual(sorted(self.hits(self.fts, 'botany')), sorted([self.flowers.pk, self.roses.pk]))
+
+        self.roses.delete()
+        self.assertEqual(self.hits(self.fts, 'roses'), [])
+
+    def test_rebuild_restores_a_wiped_index(self):
+        self.fts.clear()
+        self.assertEqual(self.hits(self.fts, 'desert'), [])
+        out = io.StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 3 books.', out.getvalue())
+        self.assertEqual(sorted(self.hits(self.fts, 'desert')), sorted([self.dune.pk, self.flowers.pk, self.roses.pk]))
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Fiction', slug='fiction')
+        self.a, self.b, self.c, self.d = make_books(category, 4)
+        self.users = [User.objects.create_user(username=f'buyer{i}') for i in range(3)]
+
+    def buy(self, user, *books):
+        order = Order.objects.create(user=user, paid=True, total_price=100 * len(books))
+        OrderItem.objects.bulk_create([OrderItem(order=order, book=book, price=100) for book in books])
+
+    def neighbours(self, book, **scores):
+        BookSimilarity.objects.bulk_create([
+            BookSimilarity(book=book, neighbour=getattr(self, name), score=score) for name, score in scores.items()
+        ])
+
+    def test_scores_add_up_over_purchases_and_exclude_owned_books(self):
+        self.buy(self.users[0], self.a, self.b)
+        self.neighbours(self.a, b=0.9, c=0.5, d=0.8)
+        self.neighbours(self.b, c=0.4)
+        books = recommendations.copurchase_recommendations(self.users[0])
+        # c: 0.5 + 0.4 beats d: 0.8; b is already theirs
+        self.assertEqual(books, [self.c, self.d])
+        self.assertAlmostEqual(books[0].recommendation_score, 0.9)
+
+    @skipUnless(find_spec('numpy') and find_spec('scipy'), "build_similarity needs numpy and scipy")
+    def test_build_similarity_is_cosine_over_buyers(self):
+        self.buy(self.users[0], self.a, self.b)
+        self.buy(self.users[1], self.a, self.b)
+        self.buy(self.users[2], self.a, self.c)
+        Order.objects.create(user=self.users[2], paid=False)  # unpaid orders don't count
+        with self.captureOnCommitCallbacks(execute=True):
+            written = recommendations.build_similarity()
+        scores = {(row.book_id, row.neighbour_id): row.score for row in BookSimilarity.objects.all()}
+        self.assertEqual(written, len(scores))
+        self.assertAlmostEqual(scores[self.a.pk, self.b.pk], 2 / (3 * 2) ** 0.5, places=5)
+        self.assertAlmostEqual(scores[self.a.pk, self.c.pk], 1 / 3 ** 0.5, places=5)
+        self.assertEqual(scores[self.a.pk, self.b.pk], scores[self.b.pk, self.a.pk])
+        self.assertNotIn((self.b.pk, self.c.pk), scores)
+
+    def test_cached_recommendations_follow_the_generation(self):
+        user = self.users[0]
+        self.buy(user, self.a)
+        self.neighbours(self.a, c=0.5)
+        self.assertEqual(recommendations.recommended_books_for(user), [self.c])
+
+        # A rebuild changes the table; the cached ids stay until the generation moves
+        BookSimilarity.objects.all().delete()
+        self.neighbours(self.a, d=0.7)
+        self.assertEqual(recommendations.recommended_books_for(user), [self.c])
+        recommendations.bump_generation()
+        self.assertEqual(recommendations.recommended_books_for(user), [self.d])
+
+        # So does a new purchase: d is now owned
+        self.neighbours(self.b, c=0.1)
+        self.buy(user, self.b, self.d)
+        self.assertEqual(recommendations.recommended_books_for(user), [self.c])
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Fiction', slug='fiction')
+        self.book, self.other = make_books(category, 2)
+        self.users = [User.objects.create_user(username=f'reader{i}') for i in range(3)]
+
+    def counters(self, book):
+        book.refresh_from_db()
+        return book.rating_count, book.rating_sum, book.rating_avg
+
+    def test_reviews_keep_the_counters_in_step(self):
+        first = Review.objects.create(book=self.book, user=self.users[0], rating=5)
+        Review.objects.create(book=self.book, user=self.users[1], rating=2)
+        self.assertEqual(self.counters(self.book), (2, 7, 3.5))
+
+        first.rating = 3
+        first.save()
+        self.assertEqual(self.counters(self.book), (2, 5, 2.5))
+
+        # Moved to another book (admin): off one, onto the other
+        first.book = self.other
+        first.save()
+        self.assertEqual(self.counters(self.book), (1, 2, 2.0))
+        self.assertEqual(self.counters(self.other), (1, 3, 3.0))
+
+        first.delete()
+        self.assertEqual(self.counters(self.other), (0, 0, 0.0))
+
+    def test_deleting_from_drifted_counters_stops_at_zero(self):
+        review = Review.objects.create(book=self.book, user=self.users[0], rating=4)
+        Book.objects.filter(pk=self.book.pk).update(rating_count=0, rating_sum=1, rating_avg=0)
+        review.delete()
+        self.assertEqual(self.counters(self.book), (0, 0, 0.0))
+
+    def test_reconcile_fixes_only_drifted_books(self):
+        for user, rating in zip(self.users, (5, 4, 3)):
+            Review.objects.create(book=self.book, user=user, rating=rating)
+        Review.objects.create(book=self.other, user=self.users[0], rating=1)
+        Book.objects.filter(pk=self.book.pk).update(rating_count=1, rating_sum=9, rating_avg=9)
+
+        self.assertEqual([book.pk for book in reconcile_ratings(dry_run=True)], [self.book.pk])
+        self.assertEqual(self.counters(self.book), (1, 9, 9.0))
+        fixed = reconcile_ratings()
+        self.assertEqual([(book.stored_count, book.real_count) for book in fixed], [(1, 3)])
+        self.assertEqual(self.counters(self.book), (3, 12, 4.0))
+        self.assertEqual(list(reconcile_ratings()), [])
+
+
+class CartServiceTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Fiction', slug='fiction')
+        self.books = make_books(category, 3)
+        self.request = RequestFactory().get('/')
+        self.request.session = {}
+        self.request.user = AnonymousUser()
+
+    def test_session_cart_reads_old_and_broken_entries(self):
+        a, b, c = (book.pk for book in self.books)
+        self.request.session['cart'] = {
+            str(a): 2, str(b): {'quantity': 3}, str(c): {'price': '100'}, 'x': 1, '99': 'lots',
+        }
+        basket = cart.Cart(self.request)
+        self.assertEqual(basket.quantities(), {a: 2, b: 3})
+        self.assertEqual(basket.count(), 2)
+        basket.add(a)
+        # Only plain ints are written back
+        self.assertEqual(self.request.session['cart'], {str(a): 3, str(b): 3})
+
+    def test_lines_total_and_retain(self):
+        basket = cart.Cart(self.request)
+        for book in self.books:
+            basket.add(book.pk, 2)
+        Book.objects.filter(pk=self.books[1].pk).update(stock=1)
+        self.books[2].delete()
+
+        with self.assertNumQueries(1):
+            lines = basket.lines()
+            self.assertEqual(basket.lines(), lines)  # resolved once per request
+        self.assertEqual([line.book_id for line in basket.available_lines()], [self.books[0].pk])
+        missing, short = sorted(basket.unavailable_lines(), key=lambda line: line.is_missing, reverse=True)
+        self.assertTrue(missing.is_missing)
+        self.assertTrue(short.is_out_of_stock)
+        self.assertEqual(basket.total(), 200)
+
+        basket.retain([self.books[1].pk])
+        self.assertEqual(basket.quantities(), {self.books[1].pk: 2})
+        basket.clear()
+        self.assertEqual(len(basket), 0)
+
+
+class CheckoutTests(TestCase):
+    SHIPPING = {'full_name': 'Reader', 'address': '1 Main St', 'city': 'Pune', 'zip_code': '411001'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='secret')
+        category = Category.objects.create(name='Fiction', slug='fiction')
+        self.books = make_books(category, 3)
+        self.client.force_login(self.user)
+
+    def stock(self, book):
+        book.refresh_from_db()
+        return book.stock
+
+    def test_the_stock_update_refuses_an_oversell(self):
+        self.client.get(reverse('add_to_cart', args=[self.books[0].pk]))
+        request = RequestFactory().get('/')
+        request.user = self.user
+        basket = cart.Cart(request)
+        basket.lines()
+        # Someone else bought the last copies after this cart was loaded
+        Book.objects.filter(pk=self.books[0].pk).update(stock=0)
+
+        order, failed = place_order(self.user, basket, **self.SHIPPING)
+        self.assertIsNone(order)
+        self.assertEqual([line.book_id for line in failed], [self.books[0].pk])
+        self.assertEqual(self.stock(self.books[0]), 0)
+        self.assertFalse(Order.objects.exists())
+
+    def test_partial_order_keeps_the_unsold_lines_in_the_cart(self):
+        Book.objects.filter(pk=self.books[1].pk).update(stock=1, price=250)
+        for book in self.books[:2]:
+            self.client.get(reverse('add_to_cart', args=[book.pk]))
+            self.client.get(reverse('add_to_cart', args=[book.pk]))
+        self.client.get(reverse('add_to_cart', args=[self.books[2].pk]))
+        self.books[2].delete()
+
+        response = self.client.post(reverse('checkout'), self.SHIPPING)
+        self.assertRedirects(response, reverse('profile'), fetch_redirect_response=False)
+
+        order = Order.objects.get()
+        items = list(order.items.all())
+        self.assertEqual([(item.book_id, item.quantity) for item in items], [(self.books[0].pk, 2)])
+        self.assertEqual(order.total_price, sum(item.price * item.quantity for item in items))
+        self.assertEqual(order.total_price, 200)
+        self.assertEqual(self.stock(self.books[0]), 8)
+        self.assertEqual(self.stock(self.books[1]), 1)
+        # The sold-out book stays for the customer to see; the deleted one goes
+        self.assertEqual(dict(CartItem.objects.values_list('book_id', 'quantity')), {self.books[1].pk: 2})
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader')
+        self.fiction = Category.objects.create(name='Fiction', slug='fiction')
+        self.poetry = Category.objects.create(name='Poetry', slug='poetry')
+        self.novel, self.saga = make_books(self.fiction, 2)
+        self.poems = make_books(self.poetry, 1)[0]
+
+    def order(self, *lines):
+        # lines: (book, price, quantity), recorded like place_order() does
+        order = Order.objects.create(user=self.user, paid=True, total_price=sum(p * q for _, p, q in lines))
+        items = OrderItem.objects.bulk_create([
+            OrderItem(order=order, book=book, price=price, quantity=quantity) for book, price, quantity in lines
+        ])
+        rollups.record_order(order, items)
+        return order
+
+    def snapshot(self):
+        return (
+            sorted(DailySales.objects.values_list('date', 'orders', 'units', 'revenue')),
+            sorted(DailyBookSales.objects.values_list('date', 'book_id', 'orders', 'units', 'revenue')),
+            sorted(DailyCategorySales.objects.values_list('date', 'category_id', 'orders', 'units', 'revenue')),
+        )
+
+    def test_revenue_is_price_times_quantity_per_book_category_and_day(self):
+        self.order((self.novel, Decimal('120.50'), 2), (self.saga, Decimal('80'), 1), (self.poems, Decimal('45'), 3))
+        today = timezone.localdate()
+        self.assertEqual(DailySales.objects.get().revenue, Decimal('456.00'))
+        self.assertEqual(
+            DailyBookSales.objects.get(date=today, book=self.novel).revenue, Decimal('241.00'),
+        )
+        fiction = DailyCategorySales.objects.get(date=today, category=self.fiction)
+        self.assertEqual((fiction.orders, fiction.units, fiction.revenue), (1, 3, Decimal('321.00')))
+
+    def test_a_second_order_the_same_day_adds_to_the_rows(self):
+        self.order((self.novel, Decimal('100'), 1))
+        with CaptureQueriesContext(connection) as queries:
+            self.order((self.novel, Decimal('100'), 2), (self.poems, Decimal('50'), 1))
+        inserts = [q['sql'] for q in queries if q['sql'].startswith('INSERT') and 'daily' in q['sql']]
+        # Only the poetry rows are new; the day and the novel's rows are updated
+        self.assertEqual(len(inserts), 2, inserts)
+        self.assertEqual(DailySales.objects.values_list('orders', 'units', 'revenue').get(), (2, 4, Decimal('350.00')))
+        self.assertEqual(DailyBookSales.objects.get(book=self.novel).orders, 2)
+
+    def test_rebuild_matches_the_incremental_totals(self):
+        self.order((self.novel, Decimal('100'), 1), (self.poems, Decimal('30'), 2))
+        self.order((self.saga, Decimal('60'), 4))
+        Order.objects.create(user=self.user, paid=False, total_price=10)
+        incremental = self.snapshot()
+        DailyCategorySales.objects.all().delete()
+        DailySales.objects.update(revenue=0)
+
+        self.assertEqual(rollups.rebuild_rollups(), 1)
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_dashboard_range_is_capped(self):
+        staff = User.objects.create_user(username='manager', is_staff=True)
+        self.client.force_login(staff)
+        url = reverse('manager_dashboard')
+        response = self.client.get(url, {'start': '1900-01-01'})
+        self.assertEqual(len(response.context['series']), views.DASHBOARD_MAX_DAYS)
+        self.assertEqual(response.context['end'], timezone.localdate())
+        for params in ({'end': '9999-12-31'}, {'start': '9999-12-31'}, {'end': '0001-01-01'}, {'start': 'soon'}):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(len(response.context['series']), views.DASHBOARD_MAX_DAYS)
+
+
+class PublisherStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.publisher = User.objects.create_user(username='publisher')
+        self.customer = User.objects.create_user(username='customer')
+        category = Category.objects.create(name='Fiction', slug='fiction')
+        self.books = make_books(category, 3)
+        Book.objects.filter(pk__in=[book.pk for book in self.books]).update(publisher=self.publisher)
+
+    def buy(self, book, quantity):
+        request = RequestFactory().get('/')
+        request.user, request.session = AnonymousUser(), {}
+        basket = cart.Cart(request)
+        basket.add(book.pk, quantity)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.customer, basket)
+
+    def test_cache_holds_numbers_not_books(self):
+        self.buy(self.books[0], 2)
+        stats = publisher_stats(self.publisher)
+        self.assertEqual((stats['total_books'], stats['total_sales'], stats['total_revenue']), (3, 2, 200))
+        self.assertEqual([book.units_sold for book in stats['books']], [0, 0, 2])
+
+        version = cache.get(f'pubstats:version:{self.publisher.pk}')
+        cached = cache.get(f'pubstats:{self.publisher.pk}:{version}:None:None')
+        self.assertEqual(cached['sales'], {self.books[0].pk: (2, 200)})
+        self.assertNotIn(b'store.models', pickle.dumps(cached))
+        # Warm: only the book list itself
+        with self.assertNumQueries(1):
+            publisher_stats(self.publisher)
+
+    def test_orders_books_and_reviews_invalidate(self):
+        publisher_stats(self.publisher)
+        self.buy(self.books[1], 3)
+        self.assertEqual(publisher_stats(self.publisher)['total_sales'], 3)
+
+        Review.objects.create(book=self.books[1], user=self.customer, rating=4)
+        self.assertEqual(publisher_stats(self.publisher)['overall_rating'], 4.0)
+
+        self.books[1].delete()
+        stats = publisher_stats(self.publisher)
+        self.assertEqual((stats['total_books'], stats['total_sales']), (2, 0))
+
+    def test_date_window(self):
+        self.buy(self.books[0], 1)
+        Order.objects.update(created_at=timezone.now() - datetime.timedelta(days=10))
+        self.buy(self.books[0], 2)
+        today = timezone.localdate()
+        self.assertEqual(publisher_stats(self.publisher, start=today)['total_sales'], 2)
+        self.assertEqual(publisher_stats(self.publisher, end=today - datetime.timedelta(days=5))['total_sales'], 1)
+        self.assertEqual(publisher_stats(self.publisher)['total_sales'], 3)
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Fiction', slug='fiction')
+        self.books = make_books(self.category, 3)
+        self.reader = User.objects.create_user(username='reader')
+
+    def render(self, books, variant='card'):
+        with mock.patch.object(fragments, 'render_to_string', wraps=fragments.render_to_string) as render:
+            html = fragments.render_cards([Book.objects.get(pk=book.pk) for book in books], variant)
+        return html, render.call_count
+
+    def test_cards_are_rendered_once(self):
+        html, rendered = self.render(self.books)
+        self.assertEqual(rendered, 3)
+        self.assertEqual(self.render(self.books), (html, 0))
+        # Each variant is cached separately, and keeps the order it was given
+        _, rendered = self.render(self.books[::-1], 'related')
+        self.assertEqual(rendered, 3)
+        html, rendered = self.render(self.books[::-1])
+        self.assertEqual(rendered, 0)
+        self.assertLess(html.index('Book 2'), html.index('Book 0'))
+
+    def test_book_changes_retire_the_card(self):
+        self.render(self.books)
+        book = self.books[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            book.title = 'Renamed'
+            book.price = 321
+            book.save()
+            # Until the save commits, the old card is what others can see
+            self.assertEqual(self.render(self.books)[1], 0)
+        html, rendered = self.render(self.books)
+        self.assertEqual(rendered, 1)
+        self.assertIn('Renamed', html)
+        self.assertIn('321', html)
+        self.assertNotIn('Book 1', html)
+
+    def test_reviews_retire_the_card(self):
+        book = self.books[0]
+        html, _ = self.render([book])
+        self.assertNotIn('card-rating', html)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review = Review.objects.create(book=book, user=self.reader, rating=4, comment='Fine')
+        html, rendered = self.render([book])
+        self.assertEqual(rendered, 1)
+        self.assertIn('★ 4.0 <span>(1)</span>', html)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review.delete()
+        html, rendered = self.render([book])
+        self.assertEqual(rendered, 1)
+        self.assertNotIn('card-rating', html)
+
+    def test_new_release_badge_expires_with_time(self):
+        book = self.books[0]
+        html, _ = self.render([book])
+        self.assertIn('New Release', html)
+        # Aged without an update: no signal, but the key changes with is_new
+        Book.objects.filter(pk=book.pk).update(created_at=timezone.now() - datetime.timedelta(days=4))
+        html, rendered = self.render([book])
+        self.assertEqual(rendered, 1)
+        self.assertNotIn('New Release', html)
+
+    def test_search_snippets_are_never_cached(self):
+        book = Book.objects.get(pk=self.books[0].pk)
+        book.search_snippet = 'a [match] here'
+        for _ in range(2):
+            with mock.patch.object(fragments, 'render_to_string', wraps=fragments.render_to_string) as render:
+                html = fragments.render_cards([book])
+            self.assertEqual(render.call_count, 1)
+            self.assertIn('a [match] here', html)
+        # ...and don't leave a snippet in the shared card
+        html, _ = self.render([book])
+        self.assertNotIn('search-snippet', html)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.calls = 0
+
+        @anonymous_page_cache('books')
+        def view(request):
+            self.calls += 1
+            return HttpResponse(f'page {self.calls}')
+        self.view = view
+
+    def get(self, path='/catalog/', user=None, **params):
+        request = self.factory.get(path, params)
+        request.user = user or AnonymousUser()
+        request.session = {}
+        return request
+
+    def test_hit_miss_and_ignored_params(self):
+        first = self.view(self.get(q='tolkien'))
+        self.assertEqual((first['X-Cache'], first.content), ('MISS', b'page 1'))
+        again = self.view(self.get(q='tolkien', utm_source='mail'))
+        self.assertEqual((again['X-Cache'], again.content), ('HIT', b'page 1'))
+        other = self.view(self.get(q='pratchett'))
+        self.assertEqual((other['X-Cache'], other.content), ('MISS', b'page 2'))
+        self.assertEqual(self.view(self.get('/elsewhere/', q='tolkien'))['X-Cache'], 'MISS')
+
+    def test_logged_in_and_flash_messages_bypass(self):
+        user = User.objects.create_user(username='reader')
+        for _ in range(2):
+            self.assertEqual(self.view(self.get(user=user))['X-Cache'], 'BYPASS')
+        request = self.get()
+        request._messages = ["Added to cart"]
+        self.assertEqual(self.view(request)['X-Cache'], 'BYPASS')
+        # ...and neither filled the cache for anonymous visitors
+        self.assertEqual(self.view(self.get())['X-Cache'], 'MISS')
+        self.assertEqual(self.calls, 4)
+
+        post = self.factory.post('/catalog/')
+        post.user, post.session = AnonymousUser(), {}
+        self.assertEqual(self.view(post)['X-Cache'], 'BYPASS')
+
+    def test_uncacheable_responses_bypass(self):
+        @anonymous_page_cache('books')
+        def view(request):
+            response = HttpResponse('personal')
+            response.set_cookie('seen', '1')
+            return response
+        for _ in range(2):
+            self.assertEqual(view(self.get())['X-Cache'], 'BYPASS')
+
+    def test_tag_bumps_retire_pages(self):
+        self.view(self.get())
+        bump_tags('reviews')
+        self.assertEqual(self.view(self.get())['X-Cache'], 'HIT')
+        bump_tags('books')
+        response = self.view(self.get())
+        self.assertEqual((response['X-Cache'], response.content), ('MISS', b'page 2'))
+
+        # Saving a book bumps "books" (signals.py), once it commits
+        category = Category.objects.create(name='Fiction', slug='fiction')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_books(category, 1)
+            self.assertEqual(self.view(self.get())['X-Cache'], 'HIT')
+        self.assertEqual(self.view(self.get())['X-Cache'], 'MISS')
+
+    def test_async_views(self):
+        @anonymous_page_cache('books')
+        async def view(request):
+            self.calls += 1
+            return HttpResponse(f'async {self.calls}')
+        self.assertEqual(async_to_sync(view)(self.get())['X-Cache'], 'MISS')
+        response = async_to_sync(view)(self.get())
+        self.assertEqual((response['X-Cache'], response.content), ('HIT', b'async 1'))
+
+    def test_catalog_page(self):
+        self.assertEqual(self.client.get(reverse('home'))['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(reverse('home'))['X-Cache'], 'HIT')
+        self.client.force_login(User.objects.create_user(username='reader'))
+        self.assertEqual(self.client.get(reverse('home'))['X-Cache'], 'BYPASS')
+
+
+class ReadModelTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        read_model.invalidate_categories()
+        self.category = Category.objects.create(name='Fiction', slug='fiction')
+        self.book = make_books(self.category, 1)[0]
+
+    def test_lru_evicts_least_recently_used(self):
+        lru = read_model.LRUCache('test', 2, 60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        self.assertEqual(lru.get('a'), 1)  # "b" is now the oldest
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+        self.assertEqual(lru.stats(), {'entries': 2, 'hits': 3, 'misses': 1, 'hit_rate': 0.75})
+
+    def test_lru_entries_expire(self):
+        lru = read_model.LRUCache('test', 10, 60)
+        with mock.patch.object(read_model.time, 'monotonic', return_value=1000):
+            lru.set('a', 1)
+        with mock.patch.object(read_model.time, 'monotonic', return_value=1059):
+            self.assertEqual(lru.get('a'), 1)
+        with mock.patch.object(read_model.time, 'monotonic', return_value=1060):
+            self.assertEqual(lru.get('a', 'gone'), 'gone')
+        self.assertEqual(lru.stats()['entries'], 0)
+
+    def test_get_book_is_cached_as_a_copy(self):
+        with self.assertNumQueries(1):
+            book = read_model.get_book(self.book.pk)
+            book.title = 'Scribbled on'
+            again = read_model.get_book(self.book.pk)
+        self.assertEqual(again.title, 'Book 0')
+        self.assertEqual(again.category.slug, 'fiction')
+
+    def test_misses_are_not_cached(self):
+        missing_id = self.book.pk + 1
+        self.assertIsNone(read_model.get_book(missing_id))
+        # Created by another process: no invalidation reaches this one
+        Book.objects.bulk_create([Book(pk=missing_id, category=self.category, title='Late arrival', author='A',
+                                       description='...', price=100, image='books/cover.jpg')])
+        self.assertEqual(read_model.get_book(missing_id).title, 'Late arrival')
+        self.assertEqual(self.client.get(reverse('book_detail', args=[missing_id])).status_code, 200)
+
+    @override_settings(READ_MODEL_SHARED_CACHE=True)
+    def test_misses_are_not_cached_in_the_shared_cache(self):
+        missing_id = self.book.pk + 1
+        self.assertIsNone(read_model.get_book(missing_id))
+        Book.objects.bulk_create([Book(pk=missing_id, category=self.category, title='Late arrival', author='A',
+                                       description='...', price=100, image='books/cover.jpg')])
+        read_model._books.clear()  # a fresh process: only the shared cache
+        self.assertEqual(read_model.get_book(missing_id).title, 'Late arrival')
+        # Hits come from the shared cache after that
+        read_model._books.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(read_model.get_book(missing_id).title, 'Late arrival')
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        # The import scenario uploads files
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        overrides = self.settings(MEDIA_ROOT=media)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        cache.clear()
+        read_model.invalidate_categories()
+
+    def test_generate_keeps_the_derived_data_consistent(self):
+        cache.set('session:unrelated', 'kept')
+        home = self.client.get(reverse('home'))
+        self.assertEqual(home['X-Cache'], 'MISS')
+
+        counts = synthetic.generate(categories=3, books=40, users=15, publishers=2, orders=60, reviews=20, seed=1)
+        self.assertEqual((counts['categories'], counts['books'], counts['publishers'], counts['customers']),
+                         (3, 40, 2, 15))
+        self.assertEqual(Order.objects.count(), counts['orders'])
+        self.assertEqual(Review.objects.count(), counts['reviews'])
+        self.assertTrue(all(username.startswith('synth-') for username in User.objects.values_list('username', flat=True)))
+        # Only buyers review
+        for review in Review.objects.all():
+            self.assertTrue(OrderItem.objects.filter(order__user=review.user_id, order__paid=True, book=review.book_id).exists())
+        # Counters, rollups and the search index were rebuilt
+        for book in Book.objects.annotate(n=Count('reviews')):
+            self.assertEqual(book.rating_count, book.n)
+        self.assertEqual(DailySales.objects.aggregate(n=Sum('orders'))['n'], Order.objects.filter(paid=True).count())
+        title_word = Book.objects.first().title.split()[0].lower()
+        self.assertTrue(catalog_import.search.search_books(title_word))
+
+        # Our own caches are retired, nobody else's
+        self.assertEqual(cache.get('session:unrelated'), 'kept')
+        self.assertEqual(self.client.get(reverse('home'))['X-Cache'], 'MISS')
+        self.assertEqual(len(read_model.categories()), 3)
+
+        # Same seed, same data; and clear() removes all of it
+        again = synthetic.generate(categories=3, books=40, users=15, publishers=2, orders=60, reviews=20, seed=1)
+        self.assertEqual(again, counts)
+        self.client.get(reverse('home'))
+        synthetic.clear()
+        self.assertFalse(Book.objects.exists() or User.objects.exists() or Order.objects.exists())
+        # ...including their sales in the rollups, and the pages showing them
+        self.assertFalse(DailySales.objects.exists())
+        self.assertEqual(self.client.get(reverse('home'))['X-Cache'], 'MISS')
+
+    def test_every_scenario_runs(self):
+        synthetic.generate(**benchmark.dataset_for(100))
+        results = benchmark.run_benchmarks(repeat=1, warmup=0)
+        self.assertGreaterEqual(set(results), {
+            'home', 'import_books', 'import_books_post', 'export_order_items', 'export_daily_sales',
+            'api_book_list', 'api_book_list_fields', 'api_book_detail', 'api_review_list', 'api_category_list',
+        })
+        for name, result in results.items():
+            self.assertTrue(set(result['status']) <= {200, 302}, (name, result['status']))
+        self.assertGreater(results['import_books_post']['max_queries'], 0)
+
+    def test_compare(self):
+        def report(**medians):
+            return {'results': {'200': {
+                name: {'median_ms': median, 'max_queries': queries}
+                for name, (median, queries) in medians.items()
+            }}}
+        old = report(home=(10.0, 5), book_detail=(4.0, 3), gone=(1.0, 1))
+        new = report(home=(5.0, 4), book_detail=(5.0, 3), added=(2.0, 2))
+        self.assertEqual(benchmark.compare(old, new), [
+            "    200  home                        10.00 ->     5.00 ms  ( -50.0%)  queries 5 -> 4",
+            "    200  book_detail                  4.00 ->     5.00 ms  ( +25.0%)  queries 3 -> 3",
+        ])
+        self.assertEqual(benchmark.compare({}, new), [])
+        zero = report(home=(0.0, 1))
+        self.assertIn("(  +0.0%)", benchmark.compare(zero, new)[0])
+
+
+class CartStorageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='secret')
+        category = Category.objects.create(name='Fiction', slug='fiction')
+        self.books = make_books(category, 3)
+
+    def stored(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list('book_id', 'quantity'))
+
+    def test_anonymous_cart_never_touches_the_database(self):
+        with self.assertNumQueries(0):
+            self.client.get(reverse('add_to_cart', args=[self.books[0].pk]))
+            self.client.get(reverse('add_to_cart', args=[self.books[0].pk]))
+            self.client.get(reverse('remove_from_cart', args=[self.books[1].pk]))
+
+    def test_adding_is_a_single_upsert(self):
+        self.client.force_login(self.user)
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('add_to_cart', args=[self.books[0].pk]))
+            writes = [q['sql'] for q in queries if not q['sql'].startswith(('SELECT', 'SAVEPOINT', 'RELEASE'))]
+            self.assertEqual(len(writes), 1, writes)
+            self.assertIn('store_cartitem', writes[0])
+        self.assertEqual(self.stored(), {self.books[0].pk: 2})
+
+        self.client.get(reverse('remove_from_cart', args=[self.books[0].pk]))
+        self.assertEqual(self.stored(), {})
+
+    def test_anonymous_cart_is_merged_on_login(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('add_to_cart', args=[self.books[0].pk]))
+        self.client.logout()
+
+        self.client.get(reverse('add_to_cart', args=[self.books[0].pk]))
+        self.client.get(reverse('add_to_cart', args=[self.books[1].pk]))
+        self.client.login(username='reader', password='secret')
+        self.assertEqual(self.stored(), {self.books[0].pk: 2, self.books[1].pk: 1})
+
+        response = self.client.get(reverse('cart_view'))
+        self.assertEqual(len(response.context['cart_items']), 2)
+        self.assertEqual(response.context['total_price'], 300)
+        self.assertEqual(response.context['cart_count'](), 2)
+
+    def test_badge_count_follows_books_deleted_elsewhere(self):
+        self.client.force_login(self.user)
+        for book in self.books[:2]:
+            self.client.get(reverse('add_to_cart', args=[book.pk]))
+        storage = cart.DatabaseCartStorage(self.user.pk)
+        self.assertEqual(storage.count(), 2)
+        # The CartItem goes with the book, without the cart knowing
+        self.books[0].delete()
+        self.assertEqual(storage.count(), 1)
+
+
+# A 1x1 GIF, for cover images
+TINY_GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+    b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+
+class CatalogImportTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        overrides = self.settings(MEDIA_ROOT=self.media, BOOK_IMAGE_WORKERS=0, BOOK_IMPORT_WORKERS=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        read_model.invalidate_categories()
+
+        self.publisher = User.objects.create_user(username='publisher', password='secret')
+        UserProfile.objects.create(user=self.publisher, is_publisher=True, is_approved=True)
+        self.category = Category.objects.create(name='Fiction', slug='fiction')
+
+    def covers(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('cover.gif', TINY_GIF)
+        return SimpleUploadedFile('covers.zip', archive.getvalue(), content_type='application/zip')
+
+    def upload(self, text, name='books.csv', covers=True):
+        # The import runs once the upload's transaction commits (inline with
+        # BOOK_IMPORT_WORKERS = 0); the redirect shows the finished job
+        self.client.force_login(self.publisher)
+        data = {'file': SimpleUploadedFile(name, text.encode(), content_type='text/csv')}
+        if covers:
+            data['images'] = self.covers()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('import_books'), data)
+        self.assertEqual(response.status_code, 302)
+        return self.client.get(response.url)
+
+    def test_upload_creates_then_updates_by_isbn(self):
+        response = self.upload(
+            'isbn,title,author,category,description,price,stock,image\n'
+            '978-0-14-044913-6,Shadow River,Ann Author,fiction,A tale,199,10,cover.gif\n'
+            ',Silent Garden,Ann Author,fiction,Another,249,3,cover.gif\n'
+            '9780140449136,Shadow River (2nd ed),Ann Author,fiction,A tale,299,8,\n'
+            ',No Cover,Ann Author,fiction,Oops,99,1,\n'
+            ',Bad Row,Ann Author,poetry,Oops,abc,1,cover.gif\n'
+        )
+        result = response.context['job']
+        self.assertEqual((result.status, result.rows, result.created, result.failed), ('done', 5, 2, 2))
+        errors = dict(result.errors)
+        self.assertEqual(sorted(errors), [5, 6])
+        self.assertIn("cover image is required", errors[5])
+        self.assertIn("Unknown category 'poetry'", errors[6])
+
+        book = Book.objects.get(isbn='9780140449136')
+        # The repeated ISBN in the same file: the last row wins
+        self.assertEqual((book.title, book.price, book.publisher), ('Shadow River (2nd ed)', 299, self.publisher))
+        self.assertTrue(book.image.name.startswith('books/cover'))
+        self.assertEqual([b.title for b in catalog_import.search.search_books('garden')], ['Silent Garden'])
+
+        # Same ISBN again: updated in place, image kept
+        response = self.upload(
+            '{"isbn": "9780140449136", "title": "Shadow River", "author": "Ann Author", '
+            '"category": "fiction", "description": "A tale", "price": 150, "stock": 2}\n',
+            name='books.jsonl', covers=False,
+        )
+        self.assertEqual(response.context['job'].updated, 1)
+        book.refresh_from_db()
+        self.assertEqual((book.title, book.price, book.stock), ('Shadow River', 150, 2))
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_publishers_only_update_their_own_books(self):
+        Book.objects.create(category=self.category, title='Theirs', author='X', description='...', price=100,
+                            image='books/cover.jpg', isbn='9780140449136')
+        response = self.upload(
+            'isbn,title,author,category,description,price,stock,image\n'
+            '9780140449136,Mine now,Ann Author,fiction,A tale,1,10,cover.gif\n'
+        )
+        self.assertEqual(response.context['job'].failed, 1)
+        self.assertEqual(Book.objects.get(isbn='9780140449136').title, 'Theirs')
+
+    def test_uploads_are_stored_for_the_job_and_removed_after(self):
+        self.client.force_login(self.publisher)
+        upload = SimpleUploadedFile('books.csv', b'title,author,category,price\n', content_type='text/csv')
+        response = self.client.post(reverse('import_books'), {'file': upload, 'images': self.covers()})
+        job = ImportJob.objects.get()
+        self.assertRedirects(response, reverse('import_books') + f'?job={job.pk}')
+        # Not run yet (it waits for the commit): the page shows it pending
+        self.assertEqual(job.status, 'pending')
+        self.assertTrue(default_storage.exists(job.file) and default_storage.exists(job.images))
+        self.assertContains(self.client.get(response.url), 'Importing')
+
+        catalog_import.run_import(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertIsNotNone(job.finished_at)
+        self.assertFalse(default_storage.exists(job.file) or default_storage.exists(job.images))
+
+        # Only its publisher can look at it
+        self.client.force_login(User.objects.create_user(username='other'))
+        UserProfile.objects.create(user=User.objects.get(username='other'), is_publisher=True, is_approved=True)
+        self.assertEqual(self.client.get(response.url).status_code, 404)
+
+    def test_progress_and_failures_are_recorded_on_the_job(self):
+        rows = ''.join(f',Book {n},Ann Author,fiction,Text,{100 + n},1,cover.gif\n' for n in range(5))
+        with mock.patch.object(catalog_import, 'IMPORT_BATCH_SIZE', 2), \
+                mock.patch.object(catalog_import, '_save_progress', wraps=catalog_import._save_progress) as saved:
+            response = self.upload('isbn,title,author,category,description,price,stock,image\n' + rows)
+        # After each of the 3 batches, then once more when done
+        self.assertEqual(saved.call_count, 4)
+        self.assertEqual(response.context['job'].created, 5)
+
+        response = self.upload('name,price\nOops,1\n')
+        job = response.context['job']
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('CSV header is missing', job.message)
+        self.assertContains(response, 'Import failed')
+
+    def test_bad_archives_are_refused_up_front(self):
+        self.client.force_login(self.publisher)
+        response = self.client.post(reverse('import_books'), {
+            'file': SimpleUploadedFile('books.csv', b'title,author,category,price\n'),
+            'images': SimpleUploadedFile('covers.zip', b'not a zip'),
+        })
+        self.assertFormError(response.context['form'], 'images', "Images must be a zip archive.")
+        self.assertFalse(ImportJob.objects.exists())
+
+    def test_covers_of_a_failed_batch_are_removed(self):
+        source = catalog_import.ImageSource(self.covers())
+        rows = [(2, {'title': 'Doomed', 'author': 'A', 'category': 'fiction', 'description': 'Text',
+                     'price': '10', 'stock': '1', 'image': 'cover.gif'})]
+        with mock.patch.object(catalog_import, '_write_books', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                catalog_import.import_books(rows, publisher=self.publisher, image_source=source)
+        self.assertEqual(os.listdir(os.path.join(self.media, 'books')), [])
+        self.assertFalse(Book.objects.exists())
+
+    def test_only_approved_publishers(self):
+        customer = User.objects.create_user(username='customer')
+        self.client.force_login(customer)
+        self.assertRedirects(self.client.get(reverse('import_books')), reverse('home'))
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        overrides = self.settings(MEDIA_ROOT=self.media, BOOK_IMAGE_WORKERS=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.category = Category.objects.create(name='Fiction', slug='fiction')
+
+    def cover(self, name, size=(800, 1200)):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'navy').save(buffer, 'PNG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def book(self, image):
+        return Book.objects.create(category=self.category, title='Covered', author='A', description='...',
+                                   price=100, image=image)
+
+    def test_generate_variants_never_upscales(self):
+        source = self.cover('books/tall.png')
+        variants = images.generate_variants(source)
+        self.assertEqual((variants['source'], variants['width'], variants['height']), (source, 800, 1200))
+        # The widths below the original, plus the original size for 2x screens
+        self.assertEqual(sorted(variants['jpeg'], key=int), ['160', '320', '640', '800'])
+        self.assertEqual(sorted(variants['webp']), sorted(variants['jpeg']))
+        for name in list(variants['jpeg'].values()) + list(variants['webp'].values()):
+            self.assertTrue(default_storage.exists(name), name)
+        self.assertRegex(variants['jpeg']['320'], r'^variants/books/tall\.png-320\.[0-9a-f]{12}\.jpg$')
+
+    def test_variants_of_same_named_covers_dont_collide(self):
+        first = self.book(self.cover('books/cover.jpg'))
+        second = self.book(self.cover('books/cover.png', (400, 600)))
+        for book in (first, second):
+            self.assertTrue(images.process_book_image(book.pk))
+            book.refresh_from_db()
+        first_names = set(first.image_variants['webp'].values())
+        self.assertFalse(first_names & set(second.image_variants['webp'].values()))
+
+        # Rebuilding one writes new files and only removes its own old ones
+        self.assertTrue(images.process_book_image(first.pk, force=True))
+        first.refresh_from_db()
+        self.assertFalse(first_names & set(first.image_variants['webp'].values()))
+        for name in first_names:
+            self.assertFalse(default_storage.exists(name), name)
+        for name in list(first.image_variants['webp'].values()) + list(second.image_variants['webp'].values()):
+            self.assertTrue(default_storage.exists(name), name)
+
+    def test_unreadable_cover_is_not_queued_again(self):
+        default_storage.save('books/broken.png', ContentFile(b'not an image'))
+        book = self.book('books/broken.png')
+        with self.assertLogs(images.logger, 'WARNING'):
+            self.assertFalse(images.process_book_image(book.pk))
+
+        book.refresh_from_db()
+        self.assertEqual(book.image_variants, {'source': 'books/broken.png', 'failed': True})
+        self.assertFalse(images.needs_variants(book))
+        with mock.patch.object(images, 'generate_variants') as generate, self.captureOnCommitCallbacks(execute=True):
+            book.title = 'Edited'
+            book.save()
+        generate.assert_not_called()
+
+        # A new upload is tried again
+        book.image = self.cover('books/fixed.png', (200, 300))
+        self.assertTrue(images.needs_variants(book))
+        book.save(update_fields=['image'])
+        self.assertTrue(images.process_book_image(book.pk))
+        book.refresh_from_db()
+        self.assertEqual(book.image_variants['source'], book.image.name)
+        self.assertNotIn('failed', book.image_variants)
+
+    def test_book_image_tag(self):
+        book = self.book(self.cover('books/tag.png'))
+        html = book_image(book)
+        # No variants yet: the plain original
+        self.assertTrue(html.startswith('<img src="%s"' % book.image.url), html)
+        self.assertIn('loading="lazy"', html)
+
+        images.process_book_image(book.pk)
+        book.refresh_from_db()
+        html = book_image(book, sizes='50px', style='width: 50px;')
+        self.assertTrue(html.startswith('<picture><source type="image/webp"'), html)
+        self.assertIn(default_storage.url(book.image_variants['jpeg']['640']) + '"', html)
+        self.assertIn(default_storage.url(book.image_variants['webp']['160']) + ' 160w', html)
+        self.assertIn('sizes="50px"', html)
+        self.assertIn('width="800" height="1200"', html)
+        self.assertIn('style="width: 50px;"', html)
+
+        # A failed cover keeps the original too
+        book.image_variants = {'source': book.image.name, 'failed': True}
+        self.assertTrue(book_image(book).startswith('<img src='))
+
+    def test_build_image_variants_command(self):
+        done = self.book(self.cover('books/done.png'))
+        images.process_book_image(done.pk)
+        pending = self.book(self.cover('books/pending.png'))
+        default_storage.save('books/junk.png', ContentFile(b'junk'))
+        self.book('books/junk.png')
+
+        out = io.StringIO()
+        with mock.patch.object(images, 'generate_variants', wraps=images.generate_variants) as generate, \
+                self.assertLogs(images.logger, 'WARNING'):
+            call_command('build_image_variants', workers=1, stdout=out)
+        self.assertEqual(generate.call_count, 2)
+        self.assertIn("Built variants for 1 book(s), 1 skipped", out.getvalue())
+        pending.refresh_from_db()
+        self.assertEqual(pending.image_variants['source'], pending.image.name)
+
+        # Nothing left to do, unless forced
+        out = io.StringIO()
+        call_command('build_image_variants', workers=1, stdout=out)
+        self.assertIn("Resizing 0 image(s)", out.getvalue())
+        out = io.StringIO()
+        with self.assertLogs(images.logger, 'WARNING'):
+            call_command('build_image_variants', '--force', workers=1, stdout=out)
+        self.assertIn("Resizing 3 image(s)", out.getvalue())
+
+    def test_forced_rebuild_swaps_each_book_in_one_step(self):
+        book = self.book(self.cover('books/forced.png'))
+        images.process_book_image(book.pk)
+        book.refresh_from_db()
+        old_variants, old_updated_at = book.image_variants, book.updated_at
+        seen = []
+
+        def generate(source):
+            # While resizing, the book still shows its old variants
+            seen.append(Book.objects.get(pk=book.pk).image_variants)
+            return generate_variants(source)
+
+        generate_variants = images.generate_variants
+        with mock.patch.object(images, 'generate_variants', side_effect=generate), \
+                mock.patch.object(images, 'bump_versions') as bump:
+            call_command('build_image_variants', '--force', workers=1, stdout=io.StringIO())
+        self.assertEqual(seen, [old_variants])
+        book.refresh_from_db()
+        self.assertNotEqual(book.image_variants['webp'], old_variants['webp'])
+        self.assertGreater(book.updated_at, old_updated_at)
+        bump.assert_called_once_with([book.pk])
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='manager', is_staff=True)
+        cls.publisher = User.objects.create_user(username='publisher')
+        UserProfile.objects.create(user=cls.publisher, is_publisher=True, is_approved=True)
+        customer = User.objects.create_user(username='customer')
+        category = Category.objects.create(name='Fiction', slug='fiction')
+        ours, theirs = make_books(category, 2)
+        ours.publisher = cls.publisher
+        ours.save()
+        for days_ago in (40, 1, 0):
+            order = Order.objects.create(user=customer, paid=True, total_price=300, address='1 Main St')
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - datetime.timedelta(days=days_ago))
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, book=ours, price=100, quantity=2),
+                OrderItem(order=order, book=theirs, price=100, quantity=1),
+            ])
+
+    def export(self, user, dataset, **params):
+        self.client.force_login(user)
+        response = self.client.get(reverse('export_data', args=[dataset]), params)
+        if response.status_code != 200:
+            return response, None
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_staff_export_orders_in_a_date_range(self):
+        start = (timezone.localdate() - datetime.timedelta(days=7)).isoformat()
+        response, body = self.export(self.staff, 'orders', start=start)
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0][:3], ['order_id', 'created_at', 'username'])
+        self.assertEqual(len(rows), 3)
+        self.assertIn('attachment; filename="orders-', response['Content-Disposition'])
+
+    def test_publishers_only_see_their_own_books(self):
+        response, body = self.export(self.publisher, 'order_items', format='jsonl')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row['publisher'] for row in rows}, {'publisher'})
+        self.assertEqual(Decimal(rows[0]['line_total']), 200)
+
+        response, _ = self.export(self.publisher, 'orders')
+        self.assertEqual(response.status_code, 403)
+        response, _ = self.export(User.objects.get(username='customer'), 'order_items')
+        self.assertEqual(response.status_code, 403)
+
+    def test_far_off_dates_and_orders_per_publisher(self):
+        response, body = self.export(self.staff, 'order_items', end='9999-12-31')
+        self.assertEqual(len(body.splitlines()), 7)
+        response, body = self.export(self.staff, 'order_items', start='9999-12-31', end='9999-12-31')
+        self.assertEqual(len(body.splitlines()), 1)
+        # An order may hold several publishers' books
+        response, _ = self.export(self.staff, 'orders', publisher='publisher')
+        self.assertEqual(response.status_code, 400)
+        response, body = self.export(self.staff, 'daily_sales', publisher='publisher')
+        self.assertIn('daily_sales-publisher', response['Content-Disposition'])
+
+    def test_csv_cells_are_never_formulas(self):
+        Order.objects.update(full_name='=HYPERLINK("http://evil")', address='@SUM(A1)', city='-2+3', zip_code='+41')
+        _, body = self.export(self.staff, 'orders')
+        row = list(csv.reader(io.StringIO(body)))[1]
+        self.assertEqual(row[3:7], ["'=HYPERLINK(\"http://evil\")", "'@SUM(A1)", "'-2+3", "'+41"])
+        # JSON is data, not a spreadsheet: left alone
+        _, body = self.export(self.staff, 'orders', format='jsonl')
+        self.assertEqual(json.loads(body.splitlines()[0])['city'], '-2+3')
+
+    def test_streams_under_asgi(self):
+        produced = []
+        real_rows = exports.rows
+
+        def rows(*args):
+            for row in real_rows(*args):
+                produced.append(row)
+                yield row
+
+        async def fetch():
+            await self.async_client.aforce_login(self.staff)
+            response = await self.async_client.get(reverse('export_data', args=['order_items']))
+            self.assertTrue(response.is_async)
+            chunks = aiter(response.streaming_content)
+            first = await anext(chunks)
+            # Only the first STREAM_LINES lines were read so far
+            self.assertEqual(len(produced), 2)
+            return [first] + [chunk async for chunk in chunks]
+
+        with mock.patch.object(exports, 'rows', rows), mock.patch.object(exports, 'STREAM_LINES', 2):
+            chunks = async_to_sync(fetch)()
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(len(b''.join(chunks).decode().splitlines()), 7)
+
+    def test_export_is_one_query_whatever_the_size(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('export_data', args=['order_items']))
+        with self.assertNumQueries(1):
+            lines = list(response.streaming_content)
+        self.assertEqual(len(lines), 7)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(TestCase):
+    def route(self, request, write=False):
+        # Which database a @read_from_replica view reads from, and the response
+        @replicas.read_from_replica
+        def view(request):
+            if write:
+                router.db_for_write(Book)
+            return HttpResponse(router.db_for_read(Book))
+
+        token = replicas.start_request(request)
+        response = replicas.finish_request(token, view(request))
+        return response.content.decode(), response
+
+    def test_reads_go_to_a_replica_only_in_marked_get_views(self):
+        factory = RequestFactory()
+        self.assertEqual(self.route(factory.get('/'))[0], 'replica1')
+        self.assertEqual(self.route(factory.post('/'))[0], 'default')
+        self.assertEqual(router.db_for_read(Book), 'default')
+
+    def test_a_write_pins_the_browser_to_the_primary(self):
+        factory = RequestFactory()
+        used, response = self.route(factory.get('/'), write=True)
+        self.assertEqual(used, 'default')
+        self.assertEqual(response.cookies[replicas.PIN_COOKIE]['max-age'], 15)
+
+        pinned = factory.get('/')
+        pinned.COOKIES[replicas.PIN_COOKIE] = '1'
+        used, response = self.route(pinned)
+        self.assertEqual(used, 'default')
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICA_PIN_SECONDS=5)
+    def test_pin_lifetime_comes_from_settings(self):
+        _, response = self.route(RequestFactory().get('/'), write=True)
+        cookie = response.cookies[replicas.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+        self.assertTrue(cookie['httponly'])
+
+    def test_unmarked_views_read_from_the_primary(self):
+        def view(request):
+            return HttpResponse(router.db_for_read(Book))
+
+        token = replicas.start_request(RequestFactory().get('/'))
+        response = replicas.finish_request(token, view(None))
+        self.assertEqual(response.content, b'default')
+        # Reading alone doesn't pin
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+        # Through the middleware, for a page without @read_from_replica
+        self.client.force_login(User.objects.create_user(username='reader'))
+        used = []
+        db_for_read = replicas.PrimaryReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            used.append(db_for_read(router, model, **hints))
+            return used[-1]
+
+        with mock.patch.object(replicas.PrimaryReplicaRouter, 'db_for_read', spy):
+            response = self.client.get(reverse('cart_view'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(used)
+        self.assertEqual(set(used), {'default'})
+
+    def test_adding_to_a_stored_cart_pins(self):
+        # Raw SQL upsert, so it has to ask the router for its connection
+        user = User.objects.create_user(username='reader')
+        book = make_books(Category.objects.create(name='Fiction', slug='fiction'), 1)[0]
+        self.client.force_login(user)
+        response = self.client.post(reverse('add_to_cart', args=[book.pk]))
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+
+
+class StaticAssetTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_css_minifier(self):
+        css = "/* theme */\nnav a.nav-link:hover ,\n.btn {\n    color : var(--primary) ;\n    margin: 0 auto;\n}\n"
+        self.assertEqual(assets.minify_css(css), "nav a.nav-link:hover,.btn{color:var(--primary);margin:0 auto}\n")
+
+    def test_pages_link_the_stylesheet_instead_of_inlining_it(self):
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'href="/static/css/style.css"')
+        self.assertNotContains(response, '<style>')
+
+    def test_build_assets_then_serve_hashed_and_precompressed(self):
+        with override_settings(STATIC_ROOT=self.root):
+            call_command('build_assets', stdout=io.StringIO())
+            url = static('css/style.css')
+            self.assertRegex(url, r'^/static/css/style\.[0-9a-f]{12}\.css$')
+
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertEqual(response['Cache-Control'], assets.IMMUTABLE)
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+            plain = self.client.get(url)
+            self.assertNotIn('Content-Encoding', plain)
+            css = b''.join(plain.streaming_content)
+            self.assertNotIn(b'/*', css)
+            self.assertLess(len(css), 0.9 * os.path.getsize(settings.BASE_DIR / 'static' / 'css' / 'style.css'))
+
+            self.assertEqual(self.client.get('/static/css/style.css')['Cache-Control'], 'public, max-age=3600')
+
+    def test_only_hashed_variants_are_served_immutable(self):
+        names = {
+            'books/cover.jpg': 'public, max-age=3600',
+            'books/cover.0123456789ab.jpg': 'public, max-age=3600',
+            'variants/books/cover.jpg-160.0123456789ab.webp': assets.IMMUTABLE,
+            'variants/books/cover.jpg-160.0123456789ab_Xy3kP0q.webp': assets.IMMUTABLE,
+            'variants/books/cover-160.webp': 'public, max-age=3600',
+        }
+        for name in names:
+            os.makedirs(os.path.dirname(os.path.join(self.root, name)), exist_ok=True)
+            with open(os.path.join(self.root, name), 'wb') as fh:
+                fh.write(TINY_GIF)
+        with override_settings(MEDIA_ROOT=self.root):
+            for name, cache_control in names.items():
+                response = self.client.get('/media/' + name)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Cache-Control'], cache_control, name)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='customer')
+        cls.fiction = Category.objects.create(name='Fiction', slug='fiction')
+        cls.poetry = Category.objects.create(name='Poetry', slug='poetry')
+        cls.books = make_books(cls.fiction, 3)
+        cls.poem = make_books(cls.poetry, 1)[0]
+
+    def setUp(self):
+        cache.clear()
+        read_model.invalidate_categories()
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_revalidation_returns_not_modified(self):
+        url = reverse('book_detail', args=[self.books[0].pk])
+        response = self.client.get(url)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        # Validators are cached with the page: revalidating costs no queries
+        with self.assertNumQueries(0):
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+        self.assertEqual(again['ETag'], response['ETag'])
+        self.assertNotIn('Last-Modified', response)
+
+        with override_settings(ROOT_URLCONF=read_urlconf(use_async=True)):
+            response = async_to_sync(self.async_client.get)(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_the_page(self):
+        home, fiction = reverse('home'), reverse('home') + '?category=fiction'
+        detail = reverse('book_detail', args=[self.books[0].pk])
+        before = {url: self.etag(url) for url in (home, fiction, detail)}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.poem.price = 120
+            self.poem.save()
+        self.assertNotEqual(self.etag(home), before[home])
+        # Nothing on the fiction pages changed
+        self.assertEqual(self.etag(fiction), before[fiction])
+        self.assertEqual(self.etag(detail), before[detail])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(book=self.books[0], user=self.customer, rating=5, comment='Great')
+        self.assertNotEqual(self.etag(detail), before[detail])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[2].delete()
+        self.assertNotEqual(self.etag(fiction), before[fiction])
+
+    def test_if_modified_since_alone_never_gets_a_stale_304(self):
+        # A deleted book doesn't move any updated_at
+        url = reverse('home') + '?category=fiction'
+        response = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[2].delete()
+        later = http_date(time.time() + 60)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=later)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Book 2')
+
+    def test_etag_changes_every_time_bucket(self):
+        # "NEW RELEASE" badges expire without any update
+        url = reverse('book_detail', args=[self.books[0].pk])
+        now = time.time() // ETAG_TIME_BUCKET * ETAG_TIME_BUCKET
+        with mock.patch('store.conditional.time.time', return_value=now + 1):
+            first = self.etag(url)
+        with mock.patch('store.conditional.time.time', return_value=now + ETAG_TIME_BUCKET - 1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first).status_code, 304)
+        with mock.patch('store.conditional.time.time', return_value=now + ETAG_TIME_BUCKET + 1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first).status_code, 200)
+
+    def test_logged_in_pages_are_not_validated(self):
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse('book_detail', args=[self.books[0].pk]), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='customer')
+        cls.fiction = Category.objects.create(name='Fiction', slug='fiction')
+        cls.poetry = Category.objects.create(name='Poetry', slug='poetry')
+        cls.books = make_books(cls.fiction, 5) + make_books(cls.poetry, 2)
+        for n, user in enumerate([cls.customer] + [User.objects.create_user(username=f'reader{i}') for i in range(2)]):
+            Review.objects.create(book=cls.books[0], user=user, rating=3 + n, comment=f'Review {n}')
+
+    def setUp(self):
+        cache.clear()
+        read_model.invalidate_categories()
+
+    def get_json(self, url, status=200, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status, response.content)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response.json()
+
+    def test_cursor_pages_cover_the_catalog_once(self):
+        url, seen = reverse('api_book_list'), []
+        data = self.get_json(url, limit=3, sort='rating')
+        while True:
+            seen += [book['id'] for book in data['results']]
+            if not data['next']:
+                break
+            data = self.client.get(data['next']).json()
+        self.assertEqual(sorted(seen), sorted(book.pk for book in self.books))
+        previous = self.client.get(data['previous']).json()
+        self.assertEqual([book['id'] for book in previous['results']], seen[-4:-1])
+
+        self.assertEqual(len(self.get_json(url, category='poetry')['results']), 2)
+        self.get_json(url, status=404, category='nope')
+        search = self.get_json(url, q='book', category='poetry', fields='id', limit=1)
+        self.assertEqual(len(search['results']), 1)
+        self.assertIn('page=2', search['next'])
+        self.assertEqual(self.get_json(url, status=400, after='garbage'), {'error': 'Invalid cursor'})
+
+    def test_fields_shape_the_query(self):
+        read_model.categories()
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get_json(reverse('api_book_list'), fields='id,title', category='fiction')
+        self.assertEqual(set(data['results'][0]), {'id', 'title'})
+        books_sql = queries[-1]['sql']
+        self.assertNotIn('description', books_sql)
+        self.assertNotIn('store_category', books_sql)
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get_json(reverse('api_book_list'), fields='title,category,price', limit=10)
+        # The category comes from a join, not a query per book
+        self.assertIn('JOIN "store_category"', queries[-1]['sql'])
+        self.assertEqual(data['results'][0]['category']['slug'], 'poetry')
+        self.assertEqual(data['results'][0]['price'], '100.00')
+
+        error = self.get_json(reverse('api_book_list'), status=400, fields='title,secret')
+        self.assertIn('secret', error['error'])
+
+    def test_detail_reviews_and_categories(self):
+        book = self.books[0]
+        data = self.get_json(reverse('api_book_detail', args=[book.pk]))
+        self.assertEqual(data['title'], book.title)
+        self.assertEqual(data['rating'], {'average': 4.0, 'count': 3})
+        self.assertEqual(data['url'], reverse('book_detail', args=[book.pk]))
+        self.get_json(reverse('api_book_detail', args=[0]), status=404)
+
+        reviews = self.get_json(reverse('api_review_list', args=[book.pk]), fields='user,rating', limit=2)
+        self.assertEqual(reviews['results'], [{'user': 'reader1', 'rating': 5}, {'user': 'reader0', 'rating': 4}])
+        self.assertEqual(self.client.get(reviews['next']).json()['results'], [{'user': 'customer', 'rating': 3}])
+
+        categories = self.get_json(reverse('api_category_list'), fields='slug,books')['results']
+        self.assertEqual(categories[0], {'slug': 'fiction', 'books': '/api/v1/books/?category=fiction'})
+        self.assertEqual(self.get_json(reverse('api_category_detail', args=['poetry']))['name'], 'Poetry')
+        self.assertEqual(self.client.post(reverse('api_book_list')).status_code, 405)
+
+    def test_etags(self):
+        url = reverse('api_book_detail', args=[self.books[0].pk])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(book=self.books[0], user=User.objects.create_user(username='late'), rating=1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+# Query budgets for QueryBudgetTests, per view (cold caches)
+BUDGETS = {
+    # Anonymous catalog pages: +1 for the ETag aggregate, cached with the page
+    'home': 6,
+    'home_category': 6,
+    'home_search': 8,
+    'home_books_fragment': 2,
+    'book_detail': 5,
+    'signup': 0,
+    'about': 0,
+    'student_offer': 0,
+    'home_logged_in': 16,  # cold recommendation pools: 2 per purchased category
+    'book_detail_logged_in': 8,
+    'add_to_cart': 4,
+    'remove_from_cart': 4,
+    'cart_view': 4,
+    'checkout': 4,
+    'checkout_post': 38,  # grows with cart lines: stock UPDATE + rollup rows per book
+    'profile': 5,
+    'logout': 4,
+    'publisher_dashboard': 5,  # cached sales figures + the live book list
+    'add_book': 4,
+    'edit_book': 6,
+    'manager_dashboard': 9,
+    'metrics': 1,
+    'import_books': 3,
+    'import_books_post': 3,  # just the job row: the import itself runs in the background
+    'export_order_items': 2,  # one query for every row, however many
+    'export_orders': 2,
+    'export_daily_sales': 3,
+    # JSON API, cold: the ETag aggregate plus one page of rows
+    'api_book_list': 2,
+    'api_book_list_fields': 2,  # ?fields=category,image: the join, not a query per book
+    'api_book_list_category': 3,
+    'api_book_search': 4,
+    'api_book_detail': 2,
+    'api_review_list': 3,
+    'api_category_list': 1,
+}
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Upper bounds on the number of queries every page runs, measured with
+    cold caches so they can't hide an N+1 loop. If a change legitimately
+    needs more queries, raise the budget in the same commit and say why.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.publisher = User.objects.create_user(username='publisher', password='secret')
+        UserProfile.objects.create(user=cls.publisher, is_publisher=True, is_approved=True)
+        cls.customer = User.objects.create_user(username='customer', password='secret')
+        UserProfile.objects.create(user=cls.customer)
+        cls.staff = User.objects.create_user(username='manager', password='secret', is_staff=True)
+        UserProfile.objects.create(user=cls.staff)
+
+        categories = [Category.objects.create(name=f'Genre {i}', slug=f'genre-{i}') for i in range(4)]
+        cls.books = []
+        for category in categories:
+            for book in make_books(category, 15):
+                book.publisher = cls.publisher
+                book.save()
+                cls.books.append(book)
+        cls.category = categories[0]
+        cls.book = cls.books[0]
+
+        buyers = [cls.customer] + [User.objects.create_user(username=f'buyer{i}') for i in range(5)]
+        for n, buyer in enumerate(buyers):
+            for books in (cls.books[n:n + 3], cls.books[n + 20:n + 22]):
+                order = Order.objects.create(user=buyer, paid=True, total_price=100 * len(books))
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, book=book, price=100, quantity=1) for book in books
+                ])
+            Review.objects.create(book=cls.book, user=buyer, rating=1 + n % 5, comment='Good read')
+
+    def assertMaxQueries(self, budget, url, method='get', data=None, status=(200, 302)):
+        cache.clear()
+        read_model.invalidate_categories()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data or {})
+            if response.streaming:
+                # Exports run their query while the body is read
+                b''.join(response.streaming_content)
+        self.assertIn(response.status_code, status, url)
+        self.assertLessEqual(
+            len(queries), budget,
+            "%s %s ran %d queries (budget %d):\n%s" % (
+                method.upper(), url, len(queries), budget,
+                "\n".join(query['sql'] for query in queries),
+            ),
+        )
+        return response
+
+    def test_anonymous_pages(self):
+        self.assertMaxQueries(BUDGETS['home'], reverse('home'))
+        self.assertMaxQueries(BUDGETS['home_category'], reverse('home') + '?category=genre-0')
+        self.assertMaxQueries(BUDGETS['home_search'], reverse('home') + '?q=book')
+        self.assertMaxQueries(BUDGETS['home_books_fragment'], reverse('home_books_fragment'))
+        self.assertMaxQueries(BUDGETS['book_detail'], reverse('book_detail', args=[self.book.pk]))
+        self.assertMaxQueries(BUDGETS['signup'], reverse('signup'))
+        self.assertMaxQueries(BUDGETS['about'], reverse('about'))
+        self.assertMaxQueries(BUDGETS['student_offer'], reverse('student_offer'))
+
+    def test_customer_pages(self):
+        self.client.force_login(self.customer)
+        self.assertMaxQueries(BUDGETS['home_logged_in'], reverse('home'))
+        self.assertMaxQueries(BUDGETS['book_detail_logged_in'], reverse('book_detail', args=[self.book.pk]))
+        for book in self.books[:5]:
+            self.assertMaxQueries(BUDGETS['add_to_cart'], reverse('add_to_cart', args=[book.pk]))
+        self.assertMaxQueries(BUDGETS['remove_from_cart'], reverse('remove_from_cart', args=[self.books[4].pk]))
+        self.assertMaxQueries(BUDGETS['cart_view'], reverse('cart_view'))
+        self.assertMaxQueries(BUDGETS['checkout'], reverse('checkout'))
+        self.assertMaxQueries(BUDGETS['checkout_post'], reverse('checkout'), method='post', data={
+            'full_name': 'Reader', 'address': '1 Main St', 'city': 'Pune', 'zip_code': '411001',
+        })
+        self.assertMaxQueries(BUDGETS['profile'], reverse('profile'))
+        self.assertMaxQueries(BUDGETS['logout'], reverse('logout'))
+
+    def test_publisher_pages(self):
+        self.client.force_login(self.publisher)
+        self.assertMaxQueries(BUDGETS['publisher_dashboard'], reverse('publisher_dashboard'))
+        self.assertMaxQueries(BUDGETS['add_book'], reverse('add_book'))
+        self.assertMaxQueries(BUDGETS['edit_book'], reverse('edit_book', args=[self.book.pk]))
+
+    def test_manager_pages(self):
+        self.client.force_login(self.staff)
+        self.assertMaxQueries(BUDGETS['manager_dashboard'], reverse('manager_dashboard'))
+        self.assertMaxQueries(BUDGETS['metrics'], reverse('metrics'))
+        self.assertMaxQueries(BUDGETS['export_order_items'], reverse('export_data', args=['order_items']))
+        self.assertMaxQueries(BUDGETS['export_orders'], reverse('export_data', args=['orders']))
+
+    def test_publisher_import_and_export(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.client.force_login(self.publisher)
+        self.assertMaxQueries(BUDGETS['import_books'], reverse('import_books'))
+        with self.settings(MEDIA_ROOT=media):
+            upload = SimpleUploadedFile('books.csv', b'isbn,title,author,category,price\n', content_type='text/csv')
+            self.assertMaxQueries(BUDGETS['import_books_post'], reverse('import_books'), method='post',
+                                  data={'file': upload})
+        self.assertMaxQueries(BUDGETS['export_daily_sales'], reverse('export_data', args=['daily_sales']))
+
+    def test_api(self):
+        books = reverse('api_book_list')
+        self.assertMaxQueries(BUDGETS['api_book_list'], books)
+        self.assertMaxQueries(BUDGETS['api_book_list_fields'], books + '?fields=category,image')
+        self.assertMaxQueries(BUDGETS['api_book_list_category'], books + '?category=genre-0&sort=rating')
+        self.assertMaxQueries(BUDGETS['api_book_search'], books + '?q=book')
+        self.assertMaxQueries(BUDGETS['api_book_detail'], reverse('api_book_detail', args=[self.book.pk]))
+        self.assertMaxQueries(BUDGETS['api_review_list'], reverse('api_review_list', args=[self.book.pk]))
+        self.assertMaxQueries(BUDGETS['api_category_list'], reverse('api_category_list'))
+
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN output is SQLite-specific")
+class QueryPlanTests(TestCase):
+    """
+    The hot queries must be answered from an index: no full table scan and
+    no temporary B-tree to sort the result.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.category = Category.objects.create(name='Fiction', slug='fiction')
+        cls.book = make_books(cls.category, 1)[0]
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+        for line in plan.splitlines():
+            self.assertNotRegex(line, r'SCAN store_\w+$', plan)
+            self.assertNotIn('TEMP B-TREE', line, plan)
+
+    def test_category_catalog_page(self):
+        books = Book.objects.filter(category=self.category).order_by('-created_at', '-id')[:25]
+        self.assertUsesIndex(books, 'book_category_created_idx')
+
+    def test_publisher_books(self):
+        books = Book.objects.filter(publisher=self.user).order_by('-created_at')
+        self.assertUsesIndex(books, 'book_publisher_created_idx')
+
+    def test_order_history(self):
+        orders = Order.objects.filter(user=self.user).order_by('-created_at', '-id')[:11]
+        self.assertUsesIndex(orders, 'order_user_created_idx')
+
+    def test_verified_buyer_check(self):
+        purchases = OrderItem.objects.filter(order__user=self.user, order__paid=True, book=self.book)
+        self.assertUsesIndex(purchases, 'orderitem_book_order_idx')
+
+    def test_book_reviews(self):
+        reviews = Review.objects.filter(book=self.book).order_by('-created_at')
+        self.assertUsesIndex(reviews, 'review_book_created_idx')
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        category = Category.objects.create(name='Fiction', slug='fiction')
+        self.books = make_books(category, 3)
+
+    def test_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.force_login(User.objects.create_user(username='customer'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+        with self.settings(METRICS_TOKEN='s3cret'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_bad_tokens_are_refused(self):
+        with self.settings(METRICS_TOKEN='s3cret'):
+            for header in ('Bearer wrong', 'Bearer s3cret\u00e9', 'Bearer \u00fcber', 's3cret'):
+                response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION=header)
+                self.assertEqual(response.status_code, 403, header)
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.get(reverse('book_detail', args=[self.books[0].pk]))
+        self.client.force_login(User.objects.create_user(username='manager', is_staff=True))
+        body = self.client.get(reverse('metrics')).content.decode()
+
+        self.assertIn('bookavenue_requests_total{view="book_detail",method="GET",status="2xx"} 1', body)
+        self.assertIn('bookavenue_request_duration_seconds_count{view="book_detail",method="GET"} 1', body)
+        self.assertIn('bookavenue_request_sql_queries_count{view="book_detail"} 1', body)
+
+    def test_repeated_sql_shapes_are_flagged(self):
+        stats = RequestStats()
+        for n in range(12):
+            # Same statement, different IN () list lengths
+            stats.shapes[sql_shape('SELECT * FROM t WHERE id IN (%s' + ', %s' * (n % 3) + ')')] += 1
+        stats.shapes[sql_shape('SELECT * FROM other')] += 1
+        stats.check_n_plus_one(10)
+        self.assertEqual(stats.n_plus_one, [('SELECT * FROM t WHERE id IN (...)', 12)])
+
+
+class AsyncViewTests(TestCase):
+    """The async read views (used under ASGI) serve the same pages as the sync ones."""
+
+    sync_urls = read_urlconf(use_async=False)
+    async_urls = read_urlconf(use_async=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='customer')
+        category = Category.objects.create(name='Fiction', slug='fiction')
+        cls.books = make_books(category, 6)
+        order = Order.objects.create(user=cls.customer, paid=True, total_price=200)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, book=book, price=100, quantity=1) for book in cls.books[:2]
+        ])
+        Review.objects.create(book=cls.books[0], user=cls.customer, rating=4, comment='Lovely')
+
+    def fetch_both(self, url):
+        cache.clear()
+        with override_settings(ROOT_URLCONF=self.sync_urls):
+            sync = self.client.get(url)
+        cache.clear()
+        with override_settings(ROOT_URLCONF=self.async_urls):
+            self.async_client.cookies.update(self.client.cookies)
+            response = async_to_sync(self.async_client.get)(url)
+        self.assertEqual(response.status_code, sync.status_code, url)
+        return sync, response
+
+    def test_pages_match_the_sync_views(self):
+        sync, response = self.fetch_both(reverse('book_detail', args=[self.books[0].pk]))
+        self.assertEqual(response.content, sync.content)
+        self.assertContains(response, 'Lovely')
+
+        self.client.force_login(self.customer)
+        self.client.get(reverse('add_to_cart', args=[self.books[2].pk]))
+        for url in (reverse('cart_view'), reverse('profile')):
+            sync, response = self.fetch_both(url)
+            self.assertEqual(response.content, sync.content, url)
+
+        sync, response = self.fetch_both(reverse('home'))
+        self.assertContains(response, self.books[-1].title)
+        # Verified buyer: both show the review form
+        for response in self.fetch_both(reverse('book_detail', args=[self.books[1].pk])):
+            self.assertContains(response, 'Leave a Review')
+
+    def test_errors_and_redirects(self):
+        self.fetch_both(reverse('book_detail', args=[0]))
+        sync, response = self.fetch_both(reverse('profile'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_sql_is_recorded_for_async_views(self):
+        url = reverse('book_detail', args=[self.books[0].pk])
+        # Warm read_model first, so both measured runs do the same work
+        self.fetch_both(url)
+        recorded = {}
+        for name, urls in (('sync', self.sync_urls), ('async', self.async_urls)):
+            cache.clear()
+            registry.reset()
+            with override_settings(ROOT_URLCONF=urls):
+                response = async_to_sync(self.async_client.get)(url) if name == 'async' else self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            histogram = registry.queries[('book_detail',)]
+            self.assertEqual(histogram.count, 1)
+            recorded[name] = histogram.sum
+        self.assertGreater(recorded['async'], 0)
+        self.assertEqual(recorded['async'], recorded['sync'])
+
+    def test_async_requests_alone_record_queries(self):
+        # Only the async view this time, with nothing cached: its queries
+        # run on the worker thread's connections and must still be counted
+        cache.clear()
+        read_model.invalidate_categories()
+        registry.reset()
+        with override_settings(ROOT_URLCONF=self.async_urls):
+            for pk in (self.books[0].pk, self.books[1].pk):
+                response = async_to_sync(self.async_client.get)(reverse('book_detail', args=[pk]))
+                self.assertEqual(response.status_code, 200)
+        histogram = registry.queries[('book_detail',)]
+        self.assertEqual(histogram.count, 2)
+        # Neither request landed in the "0 queries" bucket
+        self.assertEqual(histogram.counts[0], 0)
+        self.assertGreaterEqual(histogram.sum, 2)
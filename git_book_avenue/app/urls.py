@@ -1,21 +1,26 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views, async_views
+
+# Under ASGI (ASYNC_VIEWS) the busiest read pages use their async versions
+read_views = async_views if getattr(settings, 'ASYNC_VIEWS', False) else views
 
 urlpatterns = [
-    path('', views.home, name='home'),
-    path('book/<int:pk>/', views.book_detail, name='book_detail'),
+    path('', read_views.home, name='home'),
+    path('books/more/', views.home_books_fragment, name='home_books_fragment'),
+    path('book/<int:pk>/', read_views.book_detail, name='book_detail'),
     path('signup/', views.signup, name='signup'),
     
     # Cart URLs
     path('cart/add/<int:pk>/', views.add_to_cart, name='add_to_cart'),
     path('cart/remove/<int:pk>/', views.remove_from_cart, name='remove_from_cart'),
-    path('cart/', views.cart_view, name='cart_view'),
+    path('cart/', read_views.cart_view, name='cart_view'),
     
     # Checkout
     path('checkout/', views.checkout, name='checkout'),
 
     # ... other urls ...
-    path('profile/', views.profile, name='profile'),
+    path('profile/', read_views.profile, name='profile'),
     
     # ... about paths ...
     path('about/', views.about, name='about'),
@@ -28,6 +33,20 @@ urlpatterns = [
 
     path('add-book/', views.add_book, name='add_book'),
     path('edit-book/<int:book_id>/', views.edit_book, name='edit_book'),
+    path('import-books/', views.import_books, name='import_books'),
     path('publisher-dashboard/', views.publisher_dashboard, name='publisher_dashboard'),
-    path('logout/', views.logout_view, name='logout')
+    path('logout/', views.logout_view, name='logout'),
+
+    # Prometheus scrape endpoint (staff or METRICS_TOKEN only)
+    path('metrics/', views.metrics, name='metrics'),
+
+    # Streaming CSV/JSONL exports for staff and publishers
+    path('export/<slug:dataset>/', views.export_data, name='export_data'),
+
+    # Read-only JSON API over the catalog (api.py)
+    path('api/v1/books/', api.book_list, name='api_book_list'),
+    path('api/v1/books/<int:pk>/', api.book_detail, name='api_book_detail'),
+    path('api/v1/books/<int:pk>/reviews/', api.review_list, name='api_review_list'),
+    path('api/v1/categories/', api.category_list, name='api_category_list'),
+    path('api/v1/categories/<slug:slug>/', api.category_detail, name='api_category_detail'),
 ]
\ No newline at end of file
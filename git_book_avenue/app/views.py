@@ -1,74 +1,137 @@
+import datetime
+import hmac
+
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
+from django.core.paginator import Paginator
+from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Q, Avg, Sum, Count
 from django.contrib.auth.models import User
-from django.db.models import Sum, F
+from django.urls import reverse
+from django.utils import timezone
+from django.db.models import Sum, F, Prefetch
 # --- IMPORTS FROM YOUR APP ---
-from .models import Book, Category, Order, OrderItem, Review, UserProfile
-from .forms import ReviewForm, PublisherSignUpForm, BookForm
+from .models import Book, Category, ImportJob, Order, OrderItem, Review, UserProfile, DailyBookSales, DailyCategorySales
+from .forms import ReviewForm, PublisherSignUpForm, BookForm, BookImportUploadForm
+from .pagination import KeysetPaginator, InvalidCursor, cursor_querystring
+from .search import search_books
+from .recommendations import recommended_books_for
+from .sampling import random_books
+from .cart import Cart
+from .orders import place_order
+from .rollups import date_series
+from .publisher_stats import publisher_stats
+from .conditional import book_state, catalog_books_state, catalog_state, conditional_page
+from .page_cache import anonymous_page_cache
+from .replicas import read_from_replica
+from . import catalog_import, exports, read_model
+from .metrics import registry
 from django.contrib.auth import logout
 from django.shortcuts import redirect
 # --- 1. HOME & BROWSING ---
 
-def home(request):
-    query = request.GET.get('q')
+BOOKS_PER_PAGE = 24
+
+# ?sort=... options for the catalog. Each ends in 'id' so cursors are unique,
+# and each has a matching index on Book.
+CATALOG_ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'rating': ('-rating_avg', '-id'),
+}
+
+def _catalog_filters(request):
+    query = (request.GET.get('q') or '').strip()
     category_slug = request.GET.get('category')
-    
-    books = Book.objects.all()
-    
-    # --- 1. SEARCH & FILTER LOGIC ---
-    if query:
-        books = books.filter(Q(title__icontains=query) | Q(author__icontains=query))
-    
+
+    category = None
     if category_slug:
-        category = get_object_or_404(Category, slug=category_slug)
+        # Resolved from the in-process read model, not a query per request
+        category = read_model.category_by_slug(category_slug)
+        if category is None:
+            raise Http404("No such category")
+
+    return query, category
+
+def _catalog_page(request):
+    # Shared by the full page and the "load more" fragment
+    query, category = _catalog_filters(request)
+
+    if query:
+        # Ranked full-text search: best match first, so it pages by number
+        paginator = Paginator(search_books(query, category=category), BOOKS_PER_PAGE)
+        page = paginator.get_page(request.GET.get('page'))
+        return {
+            'page': page,
+            'books': page.object_list,
+            'next_query': cursor_querystring(request, page=page.next_page_number() if page.has_next() else None),
+            'previous_query': cursor_querystring(request, page=page.previous_page_number() if page.has_previous() else None),
+        }
+
+    books = Book.objects.all()
+    if category:
         books = books.filter(category=category)
 
-    categories = Category.objects.all()
+    ordering = CATALOG_ORDERINGS.get(request.GET.get('sort'), CATALOG_ORDERINGS['newest'])
+    paginator = KeysetPaginator(books, ordering=ordering, per_page=BOOKS_PER_PAGE)
+    try:
+        page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        # Stale or hand-edited link: just start from the top
+        page = paginator.page()
+
+    return {
+        'page': page,
+        'books': page.object_list,
+        'next_query': cursor_querystring(request, after=page.next_cursor),
+        'previous_query': cursor_querystring(request, before=page.previous_cursor),
+    }
+
+@conditional_page(catalog_state, 'books', 'categories', 'reviews')
+@anonymous_page_cache('books', 'categories', 'reviews')
+@read_from_replica
+def home(request):
+    # --- 1. SEARCH & FILTER LOGIC (paginated by cursor) ---
+    catalog = _catalog_page(request)
+
+    categories = read_model.categories()
     
     # --- 2. SMART RECOMMENDATION LOGIC ---
+    # Co-purchase neighbours (precomputed offline, cached per user), falling
+    # back to random picks from the user's favourite categories.
     recommended_books = []
     
     if request.user.is_authenticated:
-        # A. Get all categories the user has purchased from
-        # FIX: We use 'books__' (plural) because that matches your model relationship
-        purchased_categories = Category.objects.filter(
-            books__orderitem__order__user=request.user,
-            books__orderitem__order__paid=True
-        ).distinct()
-        
-        # B. Get IDs of books user has already bought (to exclude them)
-        purchased_book_ids = Book.objects.filter(
-            orderitem__order__user=request.user,
-            orderitem__order__paid=True
-        ).values_list('id', flat=True)
-
-        # C. Loop through each category and get 4 random suggestions
-        for cat in purchased_categories:
-            # Get 4 random books from this category, EXCLUDING bought ones
-            suggestions = Book.objects.filter(category=cat)\
-                                      .exclude(id__in=purchased_book_ids)\
-                                      .order_by('?')[:4]
-            recommended_books.extend(suggestions)
-            
-        # Optional: Shuffle the final mix so genres are mixed together
-        import random
-        random.shuffle(recommended_books)
+        recommended_books = recommended_books_for(request.user)
 
     # --- 3. FALLBACK (If not logged in, just show random 4 at bottom) ---
-    footer_recommendations = Book.objects.order_by('?')[:4]
+    footer_recommendations = random_books(4)
 
     return render(request, 'home.html', {
-        'books': books, 
+        **catalog,
         'categories': categories,
         'recommended_books': recommended_books, 
         'footer_recommendations': footer_recommendations
     })
 
+@conditional_page(catalog_books_state, 'books', 'categories', 'reviews')
+@anonymous_page_cache('books', 'categories', 'reviews')
+@read_from_replica
+def home_books_fragment(request):
+    # "Load more" for infinite scroll: just the next batch of cards, no page chrome
+    return render(request, 'partials/book_grid_page.html', _catalog_page(request))
+
+@conditional_page(book_state, 'books', 'categories', 'reviews')
+@anonymous_page_cache('books', 'categories', 'reviews')
+@read_from_replica
 def book_detail(request, pk):
-    book = get_object_or_404(Book, pk=pk)
+    book = read_model.get_book(pk)
+    if book is None:
+        raise Http404("No such book")
     
     # --- NEW: VERIFIED PURCHASE CHECK ---
     can_review = False
@@ -100,10 +163,9 @@ def book_detail(request, pk):
     else:
         form = ReviewForm()
 
-    # 2. Get Reviews & Average Rating
-    reviews = book.reviews.all().order_by('-created_at')
-    avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or 0
-    avg_rating = round(avg_rating, 1) 
+    # 2. Get Reviews & Average Rating (stored on the book, no aggregate query)
+    reviews = book.reviews.select_related('user').order_by('-created_at')
+    avg_rating = book.average_rating
 
     related_books = Book.objects.filter(category=book.category).exclude(pk=pk)[:4]
 
@@ -181,114 +243,111 @@ def edit_book(request, book_id):
     
     return render(request, 'add_book.html', {'form': form, 'is_edit': True})
 
+@login_required
+def import_books(request):
+    # Approved publishers only, same as the dashboard
+    try:
+        profile = request.user.userprofile
+        if not profile.is_publisher:
+            return redirect('home')
+    except:
+        return redirect('home')
+    if not profile.is_approved:
+        return render(request, 'publisher_pending.html')
+
+    if request.method == 'POST':
+        form = BookImportUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            # Imported in the background (catalog_import.start_import); the
+            # page then shows the job's progress
+            job = catalog_import.start_import(request.user, form.cleaned_data['file'], form.cleaned_data['images'])
+            return redirect(reverse('import_books') + f'?job={job.pk}')
+    else:
+        form = BookImportUploadForm()
+
+    job = None
+    if request.GET.get('job', '').isdigit():
+        job = get_object_or_404(ImportJob, pk=request.GET['job'], publisher=request.user)
+    return render(request, 'import_books.html', {'form': form, 'job': job})
+
 # --- 4. CART LOGIC ---
 
 def add_to_cart(request, pk):
-    cart = request.session.get('cart', {})
-    cart[str(pk)] = cart.get(str(pk), 0) + 1
-    request.session['cart'] = cart
+    Cart(request).add(pk)
     return redirect('cart_view')
 
 def remove_from_cart(request, pk):
-    cart = request.session.get('cart', {})
-    if str(pk) in cart:
-        del cart[str(pk)]
-    request.session['cart'] = cart
+    Cart(request).remove(pk)
     return redirect('cart_view')
 
 def cart_view(request):
-    cart = request.session.get('cart', {})
-    books_in_cart = []
-    total_price = 0
-    
-    for book_id, quantity in cart.items():
-        # Handle dictionary vs int quantity format safely
-        qty = quantity['quantity'] if isinstance(quantity, dict) else quantity
-        
-        try:
-            book = Book.objects.get(id=book_id)
-            total = book.price * qty
-            total_price += total
-            books_in_cart.append({'book': book, 'quantity': qty, 'total_price': total})
-        except Book.DoesNotExist:
-            continue
-            
-    return render(request, 'cart.html', {'cart_items': books_in_cart, 'total_price': total_price})
+    cart = Cart(request)
+    return render(request, 'cart.html', {'cart_items': cart.lines(), 'total_price': cart.total()})
 
 @login_required
 def checkout(request):
-    cart = request.session.get('cart', {})
+    cart = Cart(request)
     if not cart:
         return redirect('cart_view')
 
     # --- 1. POST LOGIC (Processing the Order) ---
     if request.method == 'POST':
-        full_name = request.POST.get('full_name')
-        address = request.POST.get('address')
-        city = request.POST.get('city')
-        zip_code = request.POST.get('zip_code')
-
-        order = Order.objects.create(
-            user=request.user, 
-            paid=True,
-            full_name=full_name,
-            address=address,
-            city=city,
-            zip_code=zip_code
+        order, failed = place_order(
+            request.user,
+            cart,
+            full_name=request.POST.get('full_name', ''),
+            address=request.POST.get('address', ''),
+            city=request.POST.get('city', ''),
+            zip_code=request.POST.get('zip_code', ''),
         )
-        
-        total_price = 0
-        
-        for book_id, item_data in cart.items():
-            try:
-                book = Book.objects.get(id=book_id)
-                quantity = item_data['quantity'] if isinstance(item_data, dict) else item_data
-
-                if book.stock >= quantity:
-                    book.stock -= quantity
-                    book.save()
-                    OrderItem.objects.create(order=order, book=book, price=book.price, quantity=quantity)
-                    total_price += book.price * quantity
-            except Book.DoesNotExist:
-                continue
-
-        order.total_price = total_price
-        order.save()
-        request.session['cart'] = {}
+
+        sold_out = [line for line in failed if not line.is_missing]
+        if order is None:
+            messages.error(request, "Sorry, none of the books in your cart are in stock any more.")
+            return redirect('cart_view')
+
+        # Keep the sold-out books in the cart so the customer can see what happened
+        cart.retain(line.book_id for line in sold_out)
+
+        messages.success(request, f"Order #ORD-{order.id:05d} placed. Thank you!")
+        if sold_out:
+            messages.warning(
+                request,
+                "Not enough stock for: %s. We left %s in your cart."
+                % (', '.join(line.book.title for line in sold_out), 'it' if len(sold_out) == 1 else 'them')
+            )
         return redirect('profile') 
 
     # --- 2. GET LOGIC (Displaying the Page) ---
-    # We must calculate the totals here so the user can see them BEFORE clicking submit
-    cart_items = []
-    total_price = 0
-
-    for book_id, item_data in cart.items():
-        try:
-            book = Book.objects.get(id=book_id)
-            quantity = item_data['quantity'] if isinstance(item_data, dict) else item_data
-            
-            total = book.price * quantity
-            total_price += total
-            
-            cart_items.append({
-                'book': book,
-                'quantity': quantity,
-                'total': total
-            })
-        except Book.DoesNotExist:
-            continue
-
-    # Pass these variables to the template
+    # Same lines and totals as the cart page, so the user sees them BEFORE clicking submit
     context = {
-        'cart_items': cart_items,
-        'total_price': total_price
+        'cart_items': cart.available_lines(),
+        'unavailable_items': cart.unavailable_lines(),
+        'total_price': cart.total()
     }
     return render(request, 'checkout.html', context)
 
+ORDERS_PER_PAGE = 10
+
 @login_required
 def profile(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'profile.html', {'orders': orders})
+    # Items and their books come in one extra query for the whole page,
+    # and the order total is stored on the order itself
+    orders = Order.objects.filter(user=request.user).prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('book'))
+    )
+    paginator = KeysetPaginator(orders, ordering=('-created_at', '-id'), per_page=ORDERS_PER_PAGE)
+    try:
+        page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        page = paginator.page()
+
+    return render(request, 'profile.html', {
+        'orders': page.object_list,
+        'page': page,
+        'next_query': cursor_querystring(request, after=page.next_cursor),
+        'previous_query': cursor_querystring(request, before=page.previous_cursor),
+    })
 
 # --- 5. MISC PAGES ---
 
@@ -301,29 +360,78 @@ def student_offer(request):
         error_message = "Please enter a valid Student ID."
     return render(request, 'student_offer.html', {'error_message': error_message})
 
+DASHBOARD_DEFAULT_DAYS = 30
+# The page has a row and a bar per day; a longer range is cut to this
+DASHBOARD_MAX_DAYS = 366
+
+def _date_param(request, name, default):
+    try:
+        return datetime.date.fromisoformat(request.GET.get(name, ''))
+    except ValueError:
+        return default
+
+def _first_of_days(end, days):
+    # First day of the `days` days ending on `end` (never before 0001-01-01)
+    return datetime.date.fromordinal(max(1, end.toordinal() - days + 1))
+
 @staff_member_required
+@read_from_replica
 def manager_dashboard(request):
-    total_orders = Order.objects.count()
+    # Sales figures come from the daily rollup tables, so the cost grows
+    # with the number of days shown, not with the number of orders
+    today = timezone.localdate()
+    end = _date_param(request, 'end', today)
+    start = _date_param(request, 'start', None)
+    if start is not None and start > end:
+        start, end = end, start
+    # Nothing has sold after today (and date.max + 1 day doesn't exist)
+    end = min(end, today)
+    if start is None:
+        start = _first_of_days(end, DASHBOARD_DEFAULT_DAYS)
+    start = min(max(start, _first_of_days(end, DASHBOARD_MAX_DAYS)), end)
+
+    series = date_series(start, end)
+    peak = max((day['revenue'] for day in series), default=0)
+    for day in series:
+        day['bar_height'] = round(day['revenue'] / peak * 100) if peak else 0
+
+    total_orders = sum(day['orders'] for day in series)
+    total_units = sum(day['units'] for day in series)
+    total_revenue = sum((day['revenue'] for day in series), 0)
     total_users = User.objects.count()
     total_books = Book.objects.count()
     
-    revenue_data = OrderItem.objects.filter(order__paid=True).aggregate(Sum('price'))
-    total_revenue = revenue_data['price__sum'] or 0
-    
-    recent_orders = Order.objects.order_by('-created_at')[:5]
-    popular_books = Book.objects.annotate(num_sold=Count('orderitem')).order_by('-num_sold')[:5]
+    recent_orders = Order.objects.select_related('user').order_by('-created_at')[:5]
+    popular_books = (
+        DailyBookSales.objects.filter(date__range=(start, end))
+        .values('book_id', 'book__title')
+        .annotate(num_sold=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-num_sold')[:5]
+    )
+    category_sales = (
+        DailyCategorySales.objects.filter(date__range=(start, end))
+        .values('category__name')
+        .annotate(units=Sum('units'), revenue=Sum('revenue'), orders=Sum('orders'))
+        .order_by('-revenue')
+    )
 
     context = {
+        'start': start,
+        'end': end,
+        'series': series,
         'total_orders': total_orders,
+        'total_units': total_units,
         'total_users': total_users,
         'total_books': total_books,
         'total_revenue': total_revenue,
         'recent_orders': recent_orders,
         'popular_books': popular_books,
+        'category_sales': category_sales,
     }
     return render(request, 'dashboard.html', context)
 
 @login_required
+@read_from_replica
 def publisher_dashboard(request):
     # 1. Security Check: Must be a publisher
     try:
@@ -337,33 +445,85 @@ def publisher_dashboard(request):
     if not profile.is_approved:
         return render(request, 'publisher_pending.html')
 
-    # 3. Get Publisher's Books
-    my_books = Book.objects.filter(publisher=request.user).order_by('-created_at')
-
-    # 4. Calculate Stats (Revenue & Sales)
-    # We look at OrderItems related to this publisher's books
-    publisher_items = OrderItem.objects.filter(book__publisher=request.user, order__paid=True)
-    
-    total_sales_count = publisher_items.count()
-    
-    # Calculate total revenue (Sum of price * quantity)
-    # Note: We calculate this manually or using aggregation
-    revenue_data = publisher_items.aggregate(total=Sum(F('price') * F('quantity')))
-    total_revenue = revenue_data['total'] or 0
-
-    # 5. Calculate Average Rating across all their books
-    avg_rating_data = Review.objects.filter(book__publisher=request.user).aggregate(Avg('rating'))
-    overall_rating = avg_rating_data['rating__avg'] or 0
-    overall_rating = round(overall_rating, 1)
+    # 3. Per-book sales and ratings, optionally limited to a date window.
+    # Sales come from one annotated query, cached per publisher (see publisher_stats.py)
+    start = _date_param(request, 'start', None)
+    end = _date_param(request, 'end', None)
+    if start and end and start > end:
+        start, end = end, start
+    if end:
+        # Nothing has sold after today (and date.max + 1 day doesn't exist)
+        end = min(end, timezone.localdate())
 
     context = {
-        'books': my_books,
-        'total_revenue': total_revenue,
-        'total_sales': total_sales_count,
-        'overall_rating': overall_rating,
+        **publisher_stats(request.user, start, end),
+        'start': start,
+        'end': end,
     }
     return render(request, 'publisher_dashboard.html', context)
 
 def logout_view(request):
     logout(request)
-    return redirect('home')
\ No newline at end of file
+    return redirect('home')
+
+# --- 6. METRICS (Prometheus) ---
+
+def metrics(request):
+    # Staff can look at it in the browser; a Prometheus scraper sends
+    # "Authorization: Bearer <METRICS_TOKEN>" instead
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.headers.get('Authorization', '')
+    # As bytes: compare_digest() refuses str with non-ASCII characters
+    has_token = bool(token) and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+    if not (request.user.is_staff or has_token):
+        return HttpResponseForbidden()
+
+    read_model_stats = read_model.stats()
+    extra = [
+        ('read_model_hits_total', 'counter', ('region',), "In-process read model hits.",
+         [((region,), data['hits']) for region, data in read_model_stats.items()]),
+        ('read_model_misses_total', 'counter', ('region',), "In-process read model misses.",
+         [((region,), data['misses']) for region, data in read_model_stats.items()]),
+        ('read_model_entries', 'gauge', ('region',), "Entries held by the in-process read model.",
+         [((region,), data['entries']) for region, data in read_model_stats.items()]),
+    ]
+    return HttpResponse(registry.render(extra), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# --- 7. EXPORTS (CSV / JSON Lines) ---
+
+EXPORT_CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson; charset=utf-8'}
+
+@login_required
+def export_data(request, dataset):
+    # Streamed row by row (see exports.py), so any date range is fine.
+    # Staff export everything (or one publisher's books with ?publisher=);
+    # approved publishers only the sales of their own books.
+    if dataset not in exports.DATASETS:
+        raise Http404("No such export")
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in exports.FORMATS:
+        file_format = 'csv'
+    start = _date_param(request, 'start', None)
+    end = _date_param(request, 'end', None)
+
+    if request.user.is_staff:
+        publisher = None
+        if request.GET.get('publisher'):
+            if not exports.DATASETS[dataset]['per_publisher']:
+                return HttpResponseBadRequest("%s can't be limited to one publisher" % dataset)
+            publisher = get_object_or_404(User, username=request.GET['publisher'])
+    else:
+        profile = UserProfile.objects.filter(user=request.user).first()
+        if not (profile and profile.is_publisher and profile.is_approved) or exports.DATASETS[dataset]['staff_only']:
+            return HttpResponseForbidden()
+        publisher = request.user
+
+    lines = exports.export(dataset, file_format, start, end, publisher)
+    if isinstance(request, ASGIRequest):
+        # Keeps streaming under ASGI instead of being read into memory first
+        lines = exports.aiter_export(lines)
+    response = StreamingHttpResponse(lines, content_type=EXPORT_CONTENT_TYPES[file_format])
+    response['Content-Disposition'] = 'attachment; filename="%s"' % exports.filename(
+        dataset, file_format, start, end, publisher,
+    )
+    return response
@@ -0,0 +1,83 @@
+// 1. Banner links: smooth scroll down to the catalog
+function scrollToBooks(e) {
+    e.preventDefault(); // Prevent standard jump
+    const section = document.getElementById('books-target');
+    if (section) {
+        const rect = section.getBoundingClientRect();
+        const offsetPosition = rect.top + window.scrollY - 110;
+
+        window.scrollTo({
+            top: offsetPosition,
+            behavior: 'smooth'
+        });
+    }
+}
+
+document.querySelectorAll('.js-scroll-to-books').forEach(link => {
+    link.addEventListener('click', scrollToBooks);
+});
+
+// 2. Logic for Page Loads (URL Params)
+document.addEventListener("DOMContentLoaded", function() {
+    const urlParams = new URLSearchParams(window.location.search);
+    const section = document.getElementById('books-target');
+
+    if (section) {
+        // SCENARIO A: CATEGORY CLICK / PAGE LINK (Instant Teleport to prevent flash)
+        if (urlParams.has('category') || urlParams.has('after') || urlParams.has('before')) {
+            document.body.style.opacity = '0'; // Hide body briefly
+
+            const rect = section.getBoundingClientRect();
+            const offsetPosition = rect.top + window.scrollY - 110;
+
+            window.scrollTo({
+                top: offsetPosition,
+                behavior: 'auto'
+            });
+
+            setTimeout(() => {
+                document.body.style.opacity = '1'; // Reveal
+            }, 50);
+        }
+        // SCENARIO B: SEARCH QUERY (Smooth Scroll)
+        else if (urlParams.has('q')) {
+            const rect = section.getBoundingClientRect();
+            const offsetPosition = rect.top + window.scrollY - 110;
+
+            window.scrollTo({
+                top: offsetPosition,
+                behavior: 'smooth'
+            });
+        }
+    }
+});
+
+// 3. Infinite scroll: "Next" becomes "Load more" and appends the next batch in place.
+// Without JavaScript the plain link still works as normal pagination.
+// The page and fragment URLs come from data- attributes on the button.
+(function() {
+    const button = document.getElementById('load-more');
+    const grid = document.getElementById('book-grid');
+    if (!button || !grid || !window.fetch) return;
+
+    button.textContent = 'Load more';
+    button.addEventListener('click', function(e) {
+        e.preventDefault();
+        fetch(button.dataset.fragmentUrl + '?' + button.dataset.query)
+            .then(response => response.text())
+            .then(html => {
+                const holder = document.createElement('div');
+                holder.innerHTML = html;
+                const next = holder.querySelector('[data-next-query]');
+                if (next) next.remove();
+                grid.append(...holder.children);
+
+                if (next) {
+                    button.dataset.query = next.dataset.nextQuery;
+                    button.href = button.dataset.pageUrl + '?' + next.dataset.nextQuery;
+                } else {
+                    button.remove();
+                }
+            });
+    });
+})();